@@ -1,9 +1,40 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Coalesce
 from threats.models import Threat
 
 User = get_user_model()
 
+# Time from creation to resolution, for aggregates over resolved alerts
+ALERT_RESOLUTION_TIME = models.ExpressionWrapper(
+    models.F('resolved_at') - models.F('created_at'),
+    output_field=models.DurationField()
+)
+
+class AlertQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the threat and users shown in alert listings"""
+        return self.select_related('threat', 'assigned_to', 'created_by')
+    
+    def with_comment_count(self):
+        """Annotate comment_count with a correlated subquery (no GROUP BY over the joins)"""
+        comment_counts = (
+            AlertComment.objects.filter(alert=models.OuterRef('pk'))
+            .order_by()
+            .values('alert')
+            .annotate(count=models.Count('id'))
+            .values('count')
+        )
+        return self.annotate(
+            comment_count=Coalesce(models.Subquery(comment_counts), 0)
+        )
+    
+    def with_comments(self):
+        """Prefetch comments together with their authors"""
+        return self.prefetch_related(
+            models.Prefetch('comments', queryset=AlertComment.objects.select_related('user'))
+        )
+
 class Alert(models.Model):
     ALERT_TYPES = [
         ('threat_detected', 'Threat Detected'),
@@ -67,6 +98,8 @@ class Alert(models.Model):
         related_name='created_alerts'
     )
     
+    objects = AlertQuerySet.as_manager()
+    
     class Meta:
         db_table = 'alerts'
         indexes = [
@@ -13,6 +13,7 @@ class AlertSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     time_to_acknowledge = serializers.CharField(read_only=True)
     time_to_resolve = serializers.CharField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Alert
@@ -39,6 +40,9 @@ class AlertCommentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['created_at', 'user']
 
+class AlertDetailSerializer(AlertSerializer):
+    comments = AlertCommentSerializer(many=True, read_only=True)
+
 class AlertRuleSerializer(serializers.ModelSerializer):
     auto_assign_to_name = serializers.CharField(source='auto_assign_to.get_full_name', read_only=True)
     
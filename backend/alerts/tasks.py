@@ -5,9 +5,25 @@ import logging
 
 from .models import Alert, AlertRule
 from threats.models import Threat
+from threat_intelligence.instrumentation import instrumented
 
 logger = logging.getLogger(__name__)
 
+def alert_task_priority(risk_score):
+    """Celery priority for alert tasks (Redis: 0 is served first)"""
+    if risk_score >= 9:
+        return 0
+    elif risk_score >= 7:
+        return 3
+    return 6
+
+def queue_threat_alert(threat):
+    """Queue alert creation for a threat, critical threats first"""
+    create_threat_alert.apply_async(
+        args=[threat.id],
+        priority=alert_task_priority(threat.risk_score)
+    )
+
 @shared_task
 def create_threat_alert(threat_id):
     """Create an alert for a high-risk threat"""
@@ -50,21 +66,25 @@ def create_threat_alert(threat_id):
         logger.info(f"Alert {alert.id} created for threat {threat_id}")
         
         # Send notifications
-        send_alert_notifications.delay(alert.id)
+        send_alert_notifications.apply_async(
+            args=[alert.id],
+            priority=alert_task_priority(threat.risk_score)
+        )
         
     except Exception as e:
         logger.error(f"Error creating alert for threat {threat_id}: {str(e)}")
 
 @shared_task
+@instrumented
 def apply_alert_rules(alert):
     """Apply alert rules to determine assignment and actions"""
     try:
-        active_rules = AlertRule.objects.filter(is_active=True)
+        active_rules = AlertRule.objects.filter(is_active=True).select_related('auto_assign_to')
         
         for rule in active_rules:
             if rule.matches_threat(alert.threat):
                 # Auto-assign if specified
-                if rule.auto_assign_to and not alert.assigned_to:
+                if rule.auto_assign_to_id and not alert.assigned_to_id:
                     alert.assigned_to = rule.auto_assign_to
                 
                 # Update priority if rule priority is higher
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from threat_intelligence.testing import (
+    QueryBudgetMixin, create_user, seed_threats, seed_alerts
+)
+from .models import Alert, AlertRule
+from .tasks import create_threat_alert
+from .views import AlertViewSet, AlertCommentViewSet
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class AlertViewQueryCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('analyst')
+        users = [cls.user] + [create_user('viewer') for _ in range(4)]
+        seed_alerts(seed_threats(150), users)
+
+    def get(self, action, **params):
+        view = AlertViewSet.as_view({'get': action})
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        with self.assertQueryBudget('AlertViewSet.list'):
+            response = self.get('list')
+        self.assertEqual(response.data['count'], 150)
+        self.assertEqual(response.data['results'][0]['comment_count'], 2)
+
+    def test_retrieve(self):
+        alert = Alert.objects.first()
+        view = AlertViewSet.as_view({'get': 'retrieve'})
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+
+        with self.assertQueryBudget('AlertViewSet.retrieve'):
+            response = view(request, pk=alert.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['comments']), 2)
+
+    def test_comment_list(self):
+        alert = seed_alerts(seed_threats(1, source='busy-feed'), [self.user], comments_per_alert=60)[0]
+        view = AlertCommentViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+
+        with self.assertQueryBudget('AlertCommentViewSet.list'):
+            response = view(request, alert_pk=alert.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 60)
+
+    def test_dashboard_stats(self):
+        with self.assertQueryBudget('AlertViewSet.dashboard_stats'):
+            response = self.get('dashboard_stats')
+        self.assertEqual(response.data['total_alerts'], 150)
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class CreateThreatAlertQueryCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [create_user('analyst') for _ in range(5)]
+        cls.threat = seed_threats(1, risk_score=9.5, severity=9, threat_type='malware')[0]
+        # Many matching rules, each with an assignee
+        AlertRule.objects.bulk_create([
+            AlertRule(
+                name=f'Rule {n}',
+                threat_type='malware',
+                alert_type='high_risk',
+                priority=(n % 5) + 1,
+                auto_assign_to=users[n % len(users)],
+            )
+            for n in range(50)
+        ])
+
+    @mock.patch('alerts.tasks.send_alert_notifications.apply_async')
+    def test_create_threat_alert(self, apply_async):
+        with self.assertQueryBudget('alerts.tasks.create_threat_alert'):
+            create_threat_alert(self.threat.id)
+
+        alert = Alert.objects.get(threat=self.threat)
+        self.assertIsNotNone(alert.assigned_to_id)
+        self.assertEqual(alert.priority, 5)
+        apply_async.assert_called_once()
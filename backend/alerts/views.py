@@ -3,16 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Avg
+from django.db.models import Count, Avg, Q
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Alert, AlertComment, AlertRule
+from .models import Alert, AlertComment, AlertRule, ALERT_RESOLUTION_TIME
 from .serializers import (
-    AlertSerializer, AlertCreateSerializer, AlertUpdateSerializer,
+    AlertSerializer, AlertDetailSerializer, AlertCreateSerializer, AlertUpdateSerializer,
     AlertCommentSerializer, AlertRuleSerializer, AlertStatsSerializer
 )
 from .filters import AlertFilter
+from threats.exporters import ExportFormatError, export_response
 from accounts.permissions import IsAdminOrAnalyst, CanModifyIncident
 
 class AlertViewSet(viewsets.ModelViewSet):
@@ -26,16 +27,25 @@ class AlertViewSet(viewsets.ModelViewSet):
             return AlertCreateSerializer
         elif self.action in ['update', 'partial_update']:
             return AlertUpdateSerializer
+        elif self.action == 'retrieve':
+            return AlertDetailSerializer
         return AlertSerializer
     
     def get_queryset(self):
         # Users can see alerts assigned to them or created by them
         if self.request.user.role == 'admin':
-            return Alert.objects.all()
+            queryset = Alert.objects.all()
         elif self.request.user.role in ['analyst', 'manager']:
-            return Alert.objects.all()
+            queryset = Alert.objects.all()
         else:
-            return Alert.objects.filter(assigned_to=self.request.user)
+            queryset = Alert.objects.filter(assigned_to=self.request.user)
+        
+        # Load what each action serializes up front, so rows never fetch relations one by one
+        if self.action in ['list', 'my_alerts']:
+            queryset = queryset.with_related().with_comment_count()
+        elif self.action == 'retrieve':
+            queryset = queryset.with_related().with_comment_count().with_comments()
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -45,10 +55,17 @@ class AlertViewSet(viewsets.ModelViewSet):
         """Get dashboard statistics for alerts"""
         queryset = self.get_queryset()
         
-        # Basic counts
-        total_alerts = queryset.count()
-        open_alerts = queryset.filter(status__in=['open', 'acknowledged', 'investigating']).count()
-        high_priority_alerts = queryset.filter(priority__gte=4, status__in=['open', 'acknowledged', 'investigating']).count()
+        open_statuses = ['open', 'acknowledged', 'investigating']
+        last_24h = timezone.now() - timedelta(hours=24)
+        
+        # Basic counts and average resolution time in a single aggregate query
+        counts = queryset.aggregate(
+            total_alerts=Count('id'),
+            open_alerts=Count('id', filter=Q(status__in=open_statuses)),
+            high_priority_alerts=Count('id', filter=Q(priority__gte=4, status__in=open_statuses)),
+            recent_alerts=Count('id', filter=Q(created_at__gte=last_24h)),
+            avg_resolution=Avg(ALERT_RESOLUTION_TIME, filter=Q(resolved_at__isnull=False)),
+        )
         
         # Alerts by status
         alerts_by_status = dict(
@@ -64,27 +81,14 @@ class AlertViewSet(viewsets.ModelViewSet):
             .values_list('priority', 'count')
         )
         
-        # Recent alerts (last 24 hours)
-        last_24h = timezone.now() - timedelta(hours=24)
-        recent_alerts = queryset.filter(created_at__gte=last_24h).count()
-        
         # Average resolution time (in hours)
-        resolved_alerts = queryset.filter(resolved_at__isnull=False)
-        avg_resolution_time = 0
-        if resolved_alerts.exists():
-            avg_time = resolved_alerts.aggregate(
-                avg_time=Avg('resolved_at') - Avg('created_at')
-            )['avg_time']
-            if avg_time:
-                avg_resolution_time = avg_time.total_seconds() / 3600  # Convert to hours
+        avg_resolution = counts.pop('avg_resolution')
+        avg_resolution_time = avg_resolution.total_seconds() / 3600 if avg_resolution else 0
         
         stats = {
-            'total_alerts': total_alerts,
-            'open_alerts': open_alerts,
-            'high_priority_alerts': high_priority_alerts,
+            **counts,
             'alerts_by_status': alerts_by_status,
             'alerts_by_priority': alerts_by_priority,
-            'recent_alerts': recent_alerts,
             'avg_resolution_time': round(avg_resolution_time, 2),
         }
         
@@ -104,6 +108,17 @@ class AlertViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(my_alerts, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all alerts matching the current filters as NDJSON, CSV or Parquet"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        try:
+            return export_response(queryset, export_format, 'alerts')
+        except ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['post'])
     def acknowledge(self, request, pk=None):
         """Acknowledge an alert"""
@@ -162,7 +177,7 @@ class AlertCommentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return AlertComment.objects.filter(alert_id=self.kwargs['alert_pk'])
+        return AlertComment.objects.filter(alert_id=self.kwargs['alert_pk']).select_related('user')
     
     def perform_create(self, serializer):
         serializer.save(
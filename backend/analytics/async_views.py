@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from threats.models import Threat
+from .live import broadcaster, format_sse, redeem_stream_ticket
+from .models import ThreatPrediction
+from .serializers import ThreatPredictionSerializer
+from . import ml_client
+
+logger = logging.getLogger(__name__)
+
+def _authenticate(request):
+    """Resolve the user from the session or a JWT in the Authorization header"""
+    if request.user.is_authenticated:
+        # Session auth needs the same CSRF protection DRF applies
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            check = CSRFCheck(lambda request: None)
+            check.process_request(request)
+            if check.process_view(request, None, (), {}) is not None:
+                return None
+        return request.user
+    
+    jwt_auth = JWTAuthentication()
+    header = jwt_auth.get_header(request)
+    raw_token = jwt_auth.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    
+    try:
+        return jwt_auth.get_user(jwt_auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+async def authenticate(request):
+    return await sync_to_async(_authenticate)(request)
+
+def _authenticate_stream(request):
+    """
+    Like _authenticate, plus the ``ticket`` query parameter.
+
+    EventSource cannot set headers, so browsers using JWTs first POST to
+    /api/analytics/dashboard/live_ticket/ and open the stream with the
+    single-use ticket; the access token itself never appears in a URL.
+    """
+    ticket = request.GET.get('ticket')
+    if not ticket:
+        return _authenticate(request)
+    user_id = redeem_stream_ticket(ticket)
+    if user_id is None:
+        return None
+    return get_user_model().objects.filter(id=user_id, is_active=True).first()
+
+def _unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+async def dashboard_live_stream(request):
+    """
+    Server-sent events stream of threat/alert deltas and dashboard counters.
+
+    Each stream ends after LIVE_UPDATES_MAX_STREAM_SECONDS and the browser
+    reconnects; Django does not stop a streaming response when the client
+    goes away, so this is what releases the subscription of a dropped client.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would be buffered and hold a worker forever
+        return JsonResponse({'detail': 'Live updates require the ASGI server.'}, status=501)
+    
+    try:
+        user = await sync_to_async(_authenticate_stream)(request)
+    except Exception as e:
+        logger.error(f"Live stream authentication failed: {str(e)}")
+        user = None
+    if user is None:
+        return _unauthorized()
+    
+    queue = await broadcaster.subscribe()
+    heartbeat = settings.LIVE_UPDATES_HEARTBEAT
+    
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LIVE_UPDATES_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {settings.LIVE_UPDATES_RETRY_MS}\n\n"
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    # Comment frame keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            broadcaster.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+async def predict_threat_resolution(request):
+    """
+    Async variant of AnalyticsViewSet.predict_threat_resolution.
+
+    The ML call is awaited on a pooled httpx client, so a slow ML service
+    does not hold a worker thread while the prediction is computed.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    if await authenticate(request) is None:
+        return _unauthorized()
+    
+    try:
+        threat_id = json.loads(request.body or b'{}').get('threat_id')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    if not threat_id:
+        return JsonResponse({'error': 'threat_id is required'}, status=400)
+    
+    try:
+        threat = await Threat.objects.aget(id=threat_id)
+        
+        # Check if prediction already exists
+        existing_prediction = await ThreatPrediction.objects.select_related('threat').filter(
+            threat=threat
+        ).afirst()
+        if existing_prediction:
+            return JsonResponse(ThreatPredictionSerializer(existing_prediction).data)
+        
+        ml_result = await ml_client.apredict(ml_client.build_prediction_payload(threat))
+        
+        prediction = await ThreatPrediction.objects.acreate(
+            threat=threat,
+            predicted_resolution_time=ml_result['predicted_resolution_time'],
+            confidence_interval_lower=ml_result['confidence_interval']['lower_bound'],
+            confidence_interval_upper=ml_result['confidence_interval']['upper_bound'],
+            risk_level=ml_result['risk_level'],
+            model_used=ml_result['model_used']
+        )
+        
+        return JsonResponse(ThreatPredictionSerializer(prediction).data)
+        
+    except Threat.DoesNotExist:
+        return JsonResponse({'error': 'Threat not found'}, status=404)
+    except ml_client.MLServiceError as e:
+        logger.error(str(e))
+        return JsonResponse({'error': 'ML model prediction failed'}, status=503)
+    except httpx.HTTPError as e:
+        logger.error(f"ML API request failed: {str(e)}")
+        return JsonResponse({'error': 'ML service unavailable'}, status=503)
+    except Exception as e:
+        logger.error(f"Error in threat prediction: {str(e)}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+
+async def ml_model_health(request):
+    """Async variant of AnalyticsViewSet.ml_health"""
+    if await authenticate(request) is None:
+        return _unauthorized()
+    
+    try:
+        return JsonResponse(await ml_client.ahealth())
+    except (ml_client.MLServiceError, httpx.HTTPError) as e:
+        logger.error(f"ML Model health check error: {str(e)}")
+        return JsonResponse({'error': 'ML service unavailable'}, status=503)
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import secrets
+import time
+from datetime import timedelta
+
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+THREAT_DELTA_FIELDS = [
+    'id', 'title', 'threat_type', 'severity', 'risk_score',
+    'source', 'is_active', 'is_false_positive', 'date_detected',
+]
+ALERT_DELTA_FIELDS = [
+    'id', 'threat_id', 'title', 'alert_type', 'priority',
+    'status', 'assigned_to_id', 'escalated', 'created_at',
+]
+
+_publisher = None
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(
+            settings.LIVE_UPDATES_REDIS_URL,
+            socket_connect_timeout=settings.LIVE_UPDATES_REDIS_TIMEOUT,
+            socket_timeout=settings.LIVE_UPDATES_REDIS_TIMEOUT,
+        )
+    return _publisher
+
+def _ticket_key(ticket):
+    return f'{settings.LIVE_UPDATES_CHANNEL}:ticket:{ticket}'
+
+def issue_stream_ticket(user_id):
+    """Short-lived, single-use ticket that lets EventSource open the stream without a token in the URL"""
+    ticket = secrets.token_urlsafe(32)
+    _get_publisher().set(_ticket_key(ticket), user_id, ex=settings.LIVE_UPDATES_TICKET_TTL)
+    return ticket
+
+def redeem_stream_ticket(ticket):
+    """User id a ticket was issued to, or None; a ticket works once"""
+    user_id = _get_publisher().getdel(_ticket_key(ticket))
+    return int(user_id) if user_id is not None else None
+
+def publish_live_event(event, data):
+    """Publish a dashboard delta to every web process (safe to call from Celery workers)"""
+    if not settings.LIVE_UPDATES_ENABLED:
+        return
+    try:
+        message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+        _get_publisher().publish(settings.LIVE_UPDATES_CHANNEL, message)
+    except Exception as e:
+        logger.error(f"Error publishing live update {event}: {str(e)}")
+
+def serialize_delta(instance, fields):
+    """Pick the fields of a changed row that the dashboard needs"""
+    return {field: getattr(instance, field) for field in fields}
+
+def compute_live_counters():
+    """Dashboard counters computed with one aggregate query per table"""
+    from threats.models import Threat
+    from alerts.models import Alert
+
+    open_statuses = ['open', 'acknowledged', 'investigating']
+    last_24h = timezone.now() - timedelta(hours=24)
+
+    threat_counts = Threat.objects.filter(is_active=True).aggregate(
+        total_threats=Count('id'),
+        active_threats=Count('id', filter=Q(is_false_positive=False)),
+        high_risk_threats=Count('id', filter=Q(is_false_positive=False, risk_score__gte=7)),
+        critical_threats=Count('id', filter=Q(severity__gte=8)),
+        recent_threats=Count('id', filter=Q(created_at__gte=last_24h)),
+    )
+    alert_counts = Alert.objects.aggregate(
+        total_alerts=Count('id'),
+        open_alerts=Count('id', filter=Q(status__in=open_statuses)),
+        high_priority_alerts=Count('id', filter=Q(priority__gte=4, status__in=open_statuses)),
+        recent_alerts=Count('id', filter=Q(created_at__gte=last_24h)),
+    )
+
+    return {**threat_counts, **alert_counts, 'last_update': timezone.now()}
+
+def format_sse(event, data):
+    """Encode one server-sent event frame"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+class LiveUpdateBroadcaster:
+    """
+    Fans dashboard updates out to all SSE subscribers of this process.
+
+    A single producer task listens on the Redis channel and recomputes the
+    counters at most once per LIVE_UPDATES_COUNTER_INTERVAL, so database load
+    does not grow with the number of open dashboards.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._producer = None
+        self._counters = None
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.LIVE_UPDATES_QUEUE_SIZE)
+        self._subscribers.add(queue)
+
+        if self._counters is None:
+            self._counters = await sync_to_async(compute_live_counters)()
+        queue.put_nowait(('counters', self._counters))
+
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _fan_out(self, event, data):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await self._listen()
+            except Exception as e:
+                logger.error(f"Live updates producer error: {str(e)}")
+                await asyncio.sleep(1)
+
+        # Counters go stale while nobody is listening
+        self._counters = None
+
+    async def _listen(self):
+        # Reads block in get_message(timeout=...), so only the connect gets a timeout here
+        client = aioredis.Redis.from_url(
+            settings.LIVE_UPDATES_REDIS_URL, socket_connect_timeout=settings.LIVE_UPDATES_REDIS_TIMEOUT
+        )
+        pubsub = client.pubsub()
+        counters_dirty = False
+        last_refresh = time.monotonic()
+
+        try:
+            await pubsub.subscribe(settings.LIVE_UPDATES_CHANNEL)
+
+            while self._subscribers:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    payload = json.loads(message['data'])
+                    self._fan_out(payload['event'], payload['data'])
+                    counters_dirty = True
+
+                interval = settings.LIVE_UPDATES_COUNTER_INTERVAL
+                if counters_dirty and time.monotonic() - last_refresh >= interval:
+                    self._counters = await sync_to_async(compute_live_counters)()
+                    self._fan_out('counters', self._counters)
+                    counters_dirty = False
+                    last_refresh = time.monotonic()
+        finally:
+            await pubsub.close()
+            await client.close()
+
+broadcaster = LiveUpdateBroadcaster()
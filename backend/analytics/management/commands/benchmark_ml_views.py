@@ -0,0 +1,142 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+WSGI_HEALTH_PATH = '/api/analytics/dashboard/ml_health/'
+ASGI_HEALTH_PATH = '/api/analytics/ml/health/'
+
+def start_slow_ml_stub(delay):
+    """Serve a fake ML API on a free local port that sleeps before answering"""
+
+    class SlowMLHandler(BaseHTTPRequestHandler):
+        def _reply(self, payload):
+            time.sleep(delay)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({'status': 'healthy', 'message': 'stub', 'model_loaded': True})
+
+        def do_POST(self):
+            self._reply({
+                'predicted_resolution_time': 24.0,
+                'confidence_interval': {'lower_bound': 20.0, 'upper_bound': 28.0},
+                'risk_level': 'Medium',
+                'recommendations': [],
+                'model_used': 'Stub',
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowMLHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+    }
+
+class Command(BaseCommand):
+    help = 'Compare WSGI and ASGI throughput of the ML health proxy against a stubbed slow ML backend'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode')
+        parser.add_argument('--delay', type=float, default=0.2, help='Stub ML latency in seconds')
+        parser.add_argument('--wsgi-threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent ASGI requests')
+    
+    def handle(self, *args, **options):
+        server = start_slow_ml_stub(options['delay'])
+        stub_url = f'http://127.0.0.1:{server.server_address[1]}'
+        
+        user, _ = User.objects.get_or_create(
+            email='ml-benchmark@threatintel.local',
+            defaults={'username': 'ml-benchmark', 'role': 'viewer'}
+        )
+        token = str(AccessToken.for_user(user))
+        
+        try:
+            with override_settings(ML_MODEL_API_URL=stub_url, ALLOWED_HOSTS=['*']):
+                results = {
+                    'stub_delay_s': options['delay'],
+                    'wsgi': self._run_wsgi(token, options['requests'], options['wsgi_threads']),
+                    'asgi': asyncio.run(
+                        self._run_asgi(token, options['requests'], options['concurrency'])
+                    ),
+                }
+        finally:
+            server.shutdown()
+        
+        results['asgi_speedup'] = round(
+            results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps'], 2
+        )
+        self.stdout.write(json.dumps(results, indent=2))
+    
+    def _run_wsgi(self, token, total, threads):
+        """Each thread plays one synchronous worker handling requests back to back"""
+        local = threading.local()
+        
+        def one_request(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+            start = time.perf_counter()
+            response = client.get(WSGI_HEALTH_PATH)
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(one_request, range(total)))
+        return summarize(latencies, time.perf_counter() - start)
+    
+    async def _run_asgi(self, token, total, concurrency):
+        """All requests share one event loop, capped at the given concurrency"""
+        from threat_intelligence.asgi import application
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=application)
+        
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url='http://testserver',
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=settings.ML_MODEL_TIMEOUT,
+        ) as client:
+            async def one_request():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(ASGI_HEALTH_PATH)
+                    assert response.status_code == 200, response.text
+                    return time.perf_counter() - start
+            
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(one_request() for _ in range(total)))
+        return summarize(latencies, time.perf_counter() - start)
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from threats.models import Threat
+from alerts.models import Alert
+from .live import publish_live_event, serialize_delta, THREAT_DELTA_FIELDS, ALERT_DELTA_FIELDS
+
+@receiver(post_save, sender=Threat)
+def threat_saved(sender, instance, created, **kwargs):
+    """Push threat changes to live dashboards once the transaction commits"""
+    event = 'threat_created' if created else 'threat_updated'
+    data = serialize_delta(instance, THREAT_DELTA_FIELDS)
+    transaction.on_commit(lambda: publish_live_event(event, data))
+
+@receiver(post_delete, sender=Threat)
+def threat_deleted(sender, instance, **kwargs):
+    data = {'id': instance.id}
+    transaction.on_commit(lambda: publish_live_event('threat_deleted', data))
+
+@receiver(post_save, sender=Alert)
+def alert_saved(sender, instance, created, **kwargs):
+    """Push alert changes to live dashboards once the transaction commits"""
+    event = 'alert_created' if created else 'alert_updated'
+    data = serialize_delta(instance, ALERT_DELTA_FIELDS)
+    transaction.on_commit(lambda: publish_live_event(event, data))
+
+@receiver(post_delete, sender=Alert)
+def alert_deleted(sender, instance, **kwargs):
+    data = {'id': instance.id}
+    transaction.on_commit(lambda: publish_live_event('alert_deleted', data))
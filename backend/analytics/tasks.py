@@ -1,13 +1,16 @@
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Count, Avg
-from datetime import date, timedelta
+from django.db.models import Count, Avg, F, Q
+from datetime import date, datetime, timedelta
 import logging
 import requests
 
 from .models import DashboardMetrics, MLModelMetrics
+from . import ml_client
 from threats.models import Threat
-from alerts.models import Alert
+from alerts.models import Alert, ALERT_RESOLUTION_TIME
+from incidents.models import Incident
 
 logger = logging.getLogger(__name__)
 
@@ -25,36 +28,29 @@ def update_daily_metrics():
         
         alerts_today = Alert.objects.filter(created_at__date=today)
         
-        total_threats = threats_today.count()
-        critical_threats = threats_today.filter(severity__gte=8).count()
-        high_threats = threats_today.filter(severity__in=[6, 7]).count()
-        medium_threats = threats_today.filter(severity__in=[4, 5]).count()
-        low_threats = threats_today.filter(severity__lte=3).count()
-        
-        resolved_threats = alerts_today.filter(status='resolved').count()
-        false_positives = threats_today.filter(is_false_positive=True).count()
+        threat_counts = threats_today.aggregate(
+            total_threats=Count('id'),
+            critical_threats=Count('id', filter=Q(severity__gte=8)),
+            high_threats=Count('id', filter=Q(severity__in=[6, 7])),
+            medium_threats=Count('id', filter=Q(severity__in=[4, 5])),
+            low_threats=Count('id', filter=Q(severity__lte=3)),
+            false_positives=Count('id', filter=Q(is_false_positive=True)),
+        )
         
-        # Calculate average resolution time
-        resolved_alerts = alerts_today.filter(resolved_at__isnull=False)
-        avg_resolution_time = 0
-        if resolved_alerts.exists():
-            avg_time = resolved_alerts.aggregate(
-                avg_time=Avg('resolved_at') - Avg('created_at')
-            )['avg_time']
-            if avg_time:
-                avg_resolution_time = avg_time.total_seconds() / 3600
+        # Resolved alerts and average resolution time
+        alert_counts = alerts_today.aggregate(
+            resolved_threats=Count('id', filter=Q(status='resolved')),
+            avg_resolution=Avg(ALERT_RESOLUTION_TIME, filter=Q(resolved_at__isnull=False)),
+        )
+        avg_resolution = alert_counts.pop('avg_resolution')
+        avg_resolution_time = avg_resolution.total_seconds() / 3600 if avg_resolution else 0
         
         # Update or create metrics
         metrics, created = DashboardMetrics.objects.update_or_create(
             date=today,
             defaults={
-                'total_threats': total_threats,
-                'critical_threats': critical_threats,
-                'high_threats': high_threats,
-                'medium_threats': medium_threats,
-                'low_threats': low_threats,
-                'resolved_threats': resolved_threats,
-                'false_positives': false_positives,
+                **threat_counts,
+                **alert_counts,
                 'avg_resolution_time': avg_resolution_time,
             }
         )
@@ -69,22 +65,82 @@ def update_daily_metrics():
 def check_ml_model_health():
     """Check ML model API health and update metrics"""
     try:
-        ml_api_url = "http://localhost:8000/health"
-        response = requests.get(ml_api_url, timeout=5)
+        health_data = ml_client.health()
+        logger.info(f"ML Model health check: {health_data}")
+        
+        # You could store health metrics here
+        # For now, just log the status
         
-        if response.status_code == 200:
-            health_data = response.json()
-            logger.info(f"ML Model health check: {health_data}")
-            
-            # You could store health metrics here
-            # For now, just log the status
-            
-        else:
-            logger.warning(f"ML Model health check failed: {response.status_code}")
-            
+    except ml_client.MLServiceError as e:
+        logger.warning(str(e))
     except requests.RequestException as e:
         logger.error(f"ML Model health check error: {str(e)}")
 
+def _training_row(source, record, threat_type, affected_users=None):
+    """Features the ML API would be sent for this record, labeled with its resolution time"""
+    row = ml_client.build_feature_payload(threat_type, record.created_at.year)
+    if affected_users:
+        row['affected_users'] = affected_users
+    row.update({
+        'resolution_time_hours': (record.resolved_at - record.created_at).total_seconds() / 3600,
+        'source': source,
+        'record_id': record.pk,
+        'resolved_at': record.resolved_at.isoformat(),
+    })
+    return row
+
+def _resolved_since(queryset, watermark):
+    """Resolved records after the ML service's (resolved_at, id) watermark, oldest first"""
+    queryset = queryset.filter(resolved_at__isnull=False, resolved_at__gte=F('created_at'))
+    if watermark:
+        resolved_at, record_id = datetime.fromisoformat(watermark[0]), watermark[1]
+        queryset = queryset.filter(Q(resolved_at__gt=resolved_at) | Q(resolved_at=resolved_at, pk__gt=record_id))
+    return queryset.select_related('threat').order_by('resolved_at', 'pk')
+
+@shared_task
+def export_training_data():
+    """Append newly resolved alerts and incidents to the ML training data, then retrain"""
+    try:
+        watermarks = ml_client.training_data_state().get('watermarks', {})
+        sources = {
+            'alert': (
+                _resolved_since(Alert.objects.all(), watermarks.get('alert')),
+                lambda alert: _training_row('alert', alert, alert.threat.threat_type),
+            ),
+            'incident': (
+                _resolved_since(Incident.objects.all(), watermarks.get('incident')),
+                lambda incident: _training_row(
+                    'incident', incident,
+                    incident.threat.threat_type if incident.threat_id else incident.category,
+                    incident.affected_users,
+                ),
+            ),
+        }
+        
+        # One server-side cursor per source, posted in batches as rows stream in
+        batch_size = settings.ML_TRAINING_EXPORT_BATCH
+        appended = {}
+        for source, (queryset, to_row) in sources.items():
+            appended[source] = 0
+            batch = []
+            for record in queryset.iterator(chunk_size=batch_size):
+                batch.append(to_row(record))
+                if len(batch) >= batch_size:
+                    appended[source] += ml_client.append_training_rows(batch)
+                    batch = []
+            if batch:
+                appended[source] += ml_client.append_training_rows(batch)
+        
+        logger.info(f"Exported training rows: {appended}")
+        if settings.ML_RETRAIN_AFTER_EXPORT and any(appended.values()):
+            ml_client.trigger_retrain()
+        return appended
+        
+    except ml_client.MLServiceError as e:
+        logger.warning(str(e))
+    except requests.RequestException as e:
+        logger.error(f"Training data export error: {str(e)}")
+
 @shared_task
 def cleanup_old_metrics():
     """Clean up old dashboard metrics (keep last 90 days)"""
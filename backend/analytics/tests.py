@@ -0,0 +1,150 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from threat_intelligence.testing import (
+    QueryBudgetMixin, create_user, seed_threats, seed_alerts
+)
+from alerts.models import Alert
+from incidents.models import Incident
+from threats.models import ThreatFeed
+from . import ml_client
+from .async_views import _authenticate_stream
+from .models import DashboardMetrics
+from .tasks import export_training_data, update_daily_metrics
+from .views import AnalyticsViewSet
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class AnalyticsQueryCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('manager')
+        users = [cls.user] + [create_user('analyst') for _ in range(3)]
+        for n in range(5):
+            ThreatFeed.objects.create(name=f'feed-{n}', url=f'https://example.invalid/{n}', feed_type='cve')
+            seed_alerts(seed_threats(60, source=f'feed-{n}', seed=n), users, seed=n)
+
+    def test_dashboard_stats(self):
+        view = AnalyticsViewSet.as_view({'get': 'dashboard_stats'})
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+
+        with self.assertQueryBudget('AnalyticsViewSet.dashboard_stats'):
+            response = view(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_threats'], 300)
+        self.assertEqual(len(response.data['threat_trend']), 7)
+        self.assertEqual(response.data['active_feeds'], 5)
+
+    def test_update_daily_metrics(self):
+        with self.assertQueryBudget('analytics.tasks.update_daily_metrics'):
+            update_daily_metrics()
+
+        metrics = DashboardMetrics.objects.get(date=timezone.now().date())
+        self.assertEqual(metrics.total_threats, 300)
+
+@override_settings(LIVE_UPDATES_ENABLED=False, ML_TRAINING_EXPORT_BATCH=20)
+@mock.patch('analytics.tasks.ml_client.trigger_retrain')
+@mock.patch('analytics.tasks.ml_client.append_training_rows', side_effect=len)
+@mock.patch('analytics.tasks.ml_client.training_data_state')
+class ExportTrainingDataTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [create_user('analyst') for _ in range(3)]
+        seed_alerts(seed_threats(100), users)
+        # Every resolved alert took six hours
+        for alert in Alert.objects.filter(resolved_at__isnull=False):
+            Alert.objects.filter(pk=alert.pk).update(created_at=alert.resolved_at - timedelta(hours=6))
+        cls.resolved_alerts = Alert.objects.filter(resolved_at__isnull=False).count()
+        
+        now = timezone.now()
+        cls.incident = Incident.objects.create(
+            title='Phishing wave', description='Credential phishing', category='phishing',
+            affected_users=250, resolved_at=now + timedelta(hours=30),
+        )
+        Incident.objects.create(title='Open incident', description='Still open', category='malware')
+
+    def test_exports_resolved_records_in_batches(self, state, append, retrain):
+        state.return_value = {'watermarks': {}}
+        
+        with self.assertQueryBudget('analytics.tasks.export_training_data'):
+            appended = export_training_data()
+        
+        self.assertEqual(appended, {'alert': self.resolved_alerts, 'incident': 1})
+        rows = [row for call in append.call_args_list for row in call.args[0]]
+        self.assertTrue(all(len(call.args[0]) <= 20 for call in append.call_args_list))
+        alert_rows = [row for row in rows if row['source'] == 'alert']
+        self.assertEqual(len(alert_rows), self.resolved_alerts)
+        self.assertTrue(all(abs(row['resolution_time_hours'] - 6) < 1e-6 for row in alert_rows))
+        
+        incident_row = next(row for row in rows if row['source'] == 'incident')
+        self.assertEqual(incident_row['attack_type'], 'Phishing')
+        self.assertEqual(incident_row['affected_users'], 250)
+        self.assertAlmostEqual(incident_row['resolution_time_hours'], 30, places=2)
+        retrain.assert_called_once()
+
+    def test_skips_rows_before_watermark(self, state, append, retrain):
+        last = Alert.objects.filter(resolved_at__isnull=False).order_by('resolved_at', 'pk').last()
+        state.return_value = {'watermarks': {
+            'alert': [last.resolved_at.isoformat(), last.pk],
+            'incident': [self.incident.resolved_at.isoformat(), self.incident.pk],
+        }}
+        
+        self.assertEqual(export_training_data(), {'alert': 0, 'incident': 0})
+        append.assert_not_called()
+        retrain.assert_not_called()
+
+class FakeRedis:
+    """The two commands stream tickets use, in memory"""
+    
+    def __init__(self):
+        self.values = {}
+    
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value).encode()
+    
+    def getdel(self, key):
+        return self.values.pop(key, None)
+
+class LiveStreamTicketTests(TestCase):
+    def setUp(self):
+        self.user = create_user('analyst')
+        patcher = mock.patch('analytics.live._get_publisher', return_value=FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def issue_ticket(self):
+        view = AnalyticsViewSet.as_view({'post': 'live_ticket'})
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data['ticket']
+    
+    def test_ticket_authenticates_the_stream_once(self):
+        ticket = self.issue_ticket()
+        request = APIRequestFactory().get('/', {'ticket': ticket})
+        self.assertEqual(_authenticate_stream(request), self.user)
+        self.assertIsNone(_authenticate_stream(APIRequestFactory().get('/', {'ticket': ticket})))
+    
+    def test_access_token_in_query_string_is_ignored(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        
+        request = APIRequestFactory().get('/', {'token': str(AccessToken.for_user(self.user))})
+        request.user = mock.Mock(is_authenticated=False)
+        self.assertIsNone(_authenticate_stream(request))
+
+class AsyncClientPerLoopTests(SimpleTestCase):
+    def test_clients_of_closed_loops_are_dropped(self):
+        async def client_for_this_loop():
+            return ml_client._get_async_client()
+        
+        clients = [asyncio.run(client_for_this_loop()) for _ in range(3)]
+        self.assertEqual(len({id(client) for client in clients}), 3)
+        # Only the last loop's client is left; the earlier loops were closed by asyncio.run
+        self.assertEqual(list(ml_client._async_clients.values()), clients[-1:])
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import AnalyticsViewSet, ThreatPredictionViewSet, MLModelMetricsViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'dashboard', AnalyticsViewSet, basename='analytics')
@@ -8,5 +9,9 @@ router.register(r'predictions', ThreatPredictionViewSet)
 router.register(r'model-metrics', MLModelMetricsViewSet)
 
 urlpatterns = [
+    path('live/', async_views.dashboard_live_stream, name='dashboard-live-stream'),
+    # Async (ASGI) variants of the ML-backed actions
+    path('ml/predict/', async_views.predict_threat_resolution, name='ml-predict-async'),
+    path('ml/health/', async_views.ml_model_health, name='ml-health-async'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -2,7 +2,9 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.db.models import Count, Avg, Q
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta, date
 import requests
@@ -14,8 +16,10 @@ from .serializers import (
     DashboardMetricsSerializer, DashboardStatsSerializer
 )
 from threats.models import Threat
-from alerts.models import Alert
+from alerts.models import Alert, ALERT_RESOLUTION_TIME
 from accounts.permissions import IsAdminOrAnalyst
+from . import ml_client
+from .live import issue_stream_ticket
 
 logger = logging.getLogger(__name__)
 
@@ -33,39 +37,39 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
             
             # Threat statistics
             threats_qs = Threat.objects.filter(is_active=True)
-            total_threats = threats_qs.count()
-            critical_threats = threats_qs.filter(severity__gte=8).count()
-            high_threats = threats_qs.filter(severity__in=[6, 7]).count()
-            medium_threats = threats_qs.filter(severity__in=[4, 5]).count()
-            low_threats = threats_qs.filter(severity__lte=3).count()
-            
-            # Alert statistics
-            alerts_qs = Alert.objects.all()
-            resolved_threats = alerts_qs.filter(status='resolved').count()
-            false_positives = threats_qs.filter(is_false_positive=True).count()
+            threat_counts = threats_qs.aggregate(
+                total_threats=Count('id'),
+                critical_threats=Count('id', filter=Q(severity__gte=8)),
+                high_threats=Count('id', filter=Q(severity__in=[6, 7])),
+                medium_threats=Count('id', filter=Q(severity__in=[4, 5])),
+                low_threats=Count('id', filter=Q(severity__lte=3)),
+                false_positives=Count('id', filter=Q(is_false_positive=True)),
+            )
             
-            # Average resolution time
-            resolved_alerts = alerts_qs.filter(resolved_at__isnull=False)
-            avg_resolution_time = 0
-            if resolved_alerts.exists():
-                avg_time = resolved_alerts.aggregate(
-                    avg_time=Avg('resolved_at') - Avg('created_at')
-                )['avg_time']
-                if avg_time:
-                    avg_resolution_time = avg_time.total_seconds() / 3600
+            # Alert statistics and average resolution time
+            alert_counts = Alert.objects.aggregate(
+                resolved_threats=Count('id', filter=Q(status='resolved')),
+                avg_resolution=Avg(ALERT_RESOLUTION_TIME, filter=Q(resolved_at__isnull=False)),
+            )
+            avg_resolution = alert_counts.pop('avg_resolution')
+            avg_resolution_time = avg_resolution.total_seconds() / 3600 if avg_resolution else 0
             
-            # Trend data (last 7 days)
+            # Trend data (last 7 days) from one grouped query
             last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-            threat_trend = []
-            for day in last_7_days:
-                day_threats = Threat.objects.filter(
-                    created_at__date=day,
-                    is_active=True
-                ).count()
-                threat_trend.append({
+            daily_counts = dict(
+                threats_qs.filter(created_at__date__gte=last_7_days[0])
+                .annotate(day=TruncDate('created_at'))
+                .values('day')
+                .annotate(count=Count('id'))
+                .values_list('day', 'count')
+            )
+            threat_trend = [
+                {
                     'date': day.strftime('%Y-%m-%d'),
-                    'threats': day_threats
-                })
+                    'threats': daily_counts.get(day, 0)
+                }
+                for day in last_7_days
+            ]
             
             # Threat types distribution
             threat_types = dict(
@@ -97,13 +101,8 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
             active_feeds = ThreatFeed.objects.filter(is_active=True).count()
             
             stats = {
-                'total_threats': total_threats,
-                'critical_threats': critical_threats,
-                'high_threats': high_threats,
-                'medium_threats': medium_threats,
-                'low_threats': low_threats,
-                'resolved_threats': resolved_threats,
-                'false_positives': false_positives,
+                **threat_counts,
+                **alert_counts,
                 'avg_resolution_time': round(avg_resolution_time, 2),
                 'threat_trend': threat_trend,
                 'threat_types_distribution': threat_types,
@@ -124,6 +123,16 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'])
+    def live_ticket(self, request):
+        """Single-use ticket for opening the live updates stream (EventSource cannot send headers)"""
+        try:
+            ticket = issue_stream_ticket(request.user.id)
+        except Exception as e:
+            logger.error(f"Error issuing live stream ticket: {str(e)}")
+            return Response({'error': 'Live updates unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'ticket': ticket, 'expires_in': settings.LIVE_UPDATES_TICKET_TTL})
+    
     @action(detail=False, methods=['post'])
     def predict_threat_resolution(self, request):
         """Get ML prediction for threat resolution time"""
@@ -145,50 +154,32 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data)
             
             # Call ML model API
-            ml_api_url = "http://localhost:8000/predict"  # ML model API
-            
-            # Prepare data for ML model
-            ml_request_data = {
-                "country": "USA",  # Default or extract from threat data
-                "year": timezone.now().year,
-                "attack_type": self._map_threat_type_to_ml(threat.threat_type),
-                "target_industry": "IT",  # Default or extract from context
-                "financial_loss": 10.0,  # Estimate based on severity
-                "affected_users": 1000,  # Estimate based on scope
-                "attack_source": "Unknown",
-                "vulnerability_type": "Unpatched Software",
-                "defense_mechanism": "AI-based Detection"
-            }
-            
-            # Make prediction request
-            response = requests.post(ml_api_url, json=ml_request_data, timeout=10)
+            ml_result = ml_client.predict(ml_client.build_prediction_payload(threat))
+            
+            # Store prediction in database
+            prediction = ThreatPrediction.objects.create(
+                threat=threat,
+                predicted_resolution_time=ml_result['predicted_resolution_time'],
+                confidence_interval_lower=ml_result['confidence_interval']['lower_bound'],
+                confidence_interval_upper=ml_result['confidence_interval']['upper_bound'],
+                risk_level=ml_result['risk_level'],
+                model_used=ml_result['model_used']
+            )
             
-            if response.status_code == 200:
-                ml_result = response.json()
-                
-                # Store prediction in database
-                prediction = ThreatPrediction.objects.create(
-                    threat=threat,
-                    predicted_resolution_time=ml_result['predicted_resolution_time'],
-                    confidence_interval_lower=ml_result['confidence_interval']['lower_bound'],
-                    confidence_interval_upper=ml_result['confidence_interval']['upper_bound'],
-                    risk_level=ml_result['risk_level'],
-                    model_used=ml_result['model_used']
-                )
-                
-                serializer = ThreatPredictionSerializer(prediction)
-                return Response(serializer.data)
-            else:
-                return Response(
-                    {'error': 'ML model prediction failed'}, 
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
+            serializer = ThreatPredictionSerializer(prediction)
+            return Response(serializer.data)
                 
         except Threat.DoesNotExist:
             return Response(
                 {'error': 'Threat not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        except ml_client.MLServiceError as e:
+            logger.error(str(e))
+            return Response(
+                {'error': 'ML model prediction failed'}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except requests.RequestException as e:
             logger.error(f"ML API request failed: {str(e)}")
             return Response(
@@ -202,18 +193,17 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    def _map_threat_type_to_ml(self, threat_type):
-        """Map Django threat types to ML model expected types"""
-        mapping = {
-            'malware': 'Malware',
-            'phishing': 'Phishing',
-            'ransomware': 'Ransomware',
-            'ddos': 'DDoS',
-            'vulnerability': 'SQL Injection',  # Default mapping
-            'apt': 'Malware',
-            'other': 'Malware'
-        }
-        return mapping.get(threat_type, 'Malware')
+    @action(detail=False, methods=['get'])
+    def ml_health(self, request):
+        """Proxy the ML model API health check"""
+        try:
+            return Response(ml_client.health())
+        except (ml_client.MLServiceError, requests.RequestException) as e:
+            logger.error(f"ML Model health check error: {str(e)}")
+            return Response(
+                {'error': 'ML service unavailable'}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
 class ThreatPredictionViewSet(viewsets.ModelViewSet):
     queryset = ThreatPrediction.objects.all()
@@ -1,9 +1,35 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Coalesce
 from threats.models import Threat
 
 User = get_user_model()
 
+class IncidentQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the threat and users shown in incident listings"""
+        return self.select_related('threat', 'assigned_to', 'created_by')
+    
+    def with_comment_count(self):
+        """Annotate comment_count with a correlated subquery (no GROUP BY over the joins)"""
+        comment_counts = (
+            IncidentComment.objects.filter(incident=models.OuterRef('pk'))
+            .order_by()
+            .values('incident')
+            .annotate(count=models.Count('id'))
+            .values('count')
+        )
+        return self.annotate(
+            comment_count=Coalesce(models.Subquery(comment_counts), 0)
+        )
+    
+    def with_activity(self):
+        """Prefetch comments and timeline events together with their users"""
+        return self.prefetch_related(
+            models.Prefetch('comments', queryset=IncidentComment.objects.select_related('user')),
+            models.Prefetch('timeline', queryset=IncidentTimeline.objects.select_related('user')),
+        )
+
 class Incident(models.Model):
     STATUS_CHOICES = [
         ('new', 'New'),
@@ -92,6 +118,8 @@ class Incident(models.Model):
     sla_due_date = models.DateTimeField(null=True, blank=True)
     sla_breached = models.BooleanField(default=False)
     
+    objects = IncidentQuerySet.as_manager()
+    
     class Meta:
         db_table = 'incidents'
         indexes = [
@@ -13,6 +13,17 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Per-task query/time metrics via task_prerun/task_postrun
+from . import instrumentation  # noqa: E402,F401
+
+# Run one worker per queue, sized for its workload:
+#   celery -A threat_intelligence worker -Q alerts -c 4 --prefetch-multiplier 1 -n alerts@%h
+#   celery -A threat_intelligence worker -Q ai -c 8 --prefetch-multiplier 4 -n ai@%h
+#   celery -A threat_intelligence worker -Q ingest -c 2 --prefetch-multiplier 1 -n ingest@%h
+#   celery -A threat_intelligence worker -Q analytics,default -c 1 -n analytics@%h
+# Alert workers never consume ingestion or AI messages, so time-to-alert stays
+# bounded by the alerts queue depth even during large feed imports.
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+Hot-path instrumentation for views and Celery tasks.
+
+Every request and task gets a Collector that records wall time, SQL query
+count and time, and time spent in external HTTP calls.
+Results are aggregated per view action / task / @instrumented function name, exported at
+/api/metrics/ in the Prometheus text format, checked against QUERY_BUDGETS
+and, above SLOW_REQUEST_THRESHOLD_MS, logged together with the captured SQL.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('instrumentation_collector', default=None)
+
+class Collector:
+    """Measurements for one request or task"""
+
+    def __init__(self, kind, name=None, capture_sql=False):
+        self.kind = kind
+        self.name = name
+        self.capture_sql = capture_sql
+        self.queries = 0
+        self.query_time = 0.0
+        self.http_calls = 0
+        self.http_time = 0.0
+        self.statements = []
+        self.started = time.perf_counter()
+        self.wall_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.query_time += elapsed
+            if self.capture_sql and len(self.statements) < settings.INSTRUMENTATION_MAX_CAPTURED_SQL:
+                self.statements.append((elapsed, sql))
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+class MetricsStore:
+    """Process-wide aggregates keyed by (kind, name)"""
+
+    FIELDS = ('calls', 'wall_time', 'queries', 'query_time', 'http_calls',
+              'http_time', 'budget_exceeded')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, collector, budget_exceeded=False):
+        key = (collector.kind, collector.name or 'unknown')
+        with self._lock:
+            stats = self._stats.setdefault(key, dict.fromkeys(self.FIELDS, 0) | {'max_queries': 0})
+            stats['calls'] += 1
+            stats['wall_time'] += collector.wall_time
+            stats['queries'] += collector.queries
+            stats['query_time'] += collector.query_time
+            stats['http_calls'] += collector.http_calls
+            stats['http_time'] += collector.http_time
+            stats['budget_exceeded'] += int(budget_exceeded)
+            stats['max_queries'] = max(stats['max_queries'], collector.queries)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+store = MetricsStore()
+
+def current_collector():
+    return _current.get()
+
+@contextmanager
+def collect(kind, name=None, capture_sql=None):
+    """Instrument a block of code running on the current thread"""
+    if capture_sql is None:
+        capture_sql = settings.SLOW_REQUEST_THRESHOLD_MS > 0
+    collector = Collector(kind, name, capture_sql)
+    token = _current.set(collector)
+    try:
+        with connection.execute_wrapper(collector):
+            yield collector
+    finally:
+        _current.reset(token)
+        collector.finish()
+        _finalize(collector)
+
+def instrumented(func):
+    """Collect metrics for a helper that is called directly rather than as a task"""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with collect('function', name):
+            return func(*args, **kwargs)
+    return wrapper
+
+def _finalize(collector):
+    budget = query_budget(collector.name)
+    budget_exceeded = budget is not None and collector.queries > budget
+    store.record(collector, budget_exceeded)
+
+    if budget_exceeded:
+        logger.warning(
+            f"Query budget exceeded for {collector.kind} {collector.name}: "
+            f"{collector.queries} queries (budget {budget})"
+        )
+
+    threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+    if threshold and collector.wall_time * 1000 >= threshold:
+        sql = '\n'.join(
+            f"  [{elapsed * 1000:.1f} ms] {statement}" for elapsed, statement in collector.statements
+        )
+        logger.warning(
+            f"Slow {collector.kind} {collector.name}: {collector.wall_time * 1000:.1f} ms, "
+            f"{collector.queries} queries ({collector.query_time * 1000:.1f} ms), "
+            f"external HTTP {collector.http_time * 1000:.1f} ms\n{sql}"
+        )
+
+def query_budget(name):
+    """Configured maximum number of queries for a view action or task, if any"""
+    return settings.QUERY_BUDGETS.get(name)
+
+@contextmanager
+def track_http():
+    """Attribute the time spent in an outgoing HTTP call to the current request/task"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector = _current.get()
+        if collector is not None:
+            collector.http_calls += 1
+            collector.http_time += time.perf_counter() - started
+
+def view_name(request, view_func):
+    """'ViewSet.action' for DRF viewsets, dotted function path otherwise"""
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if cls is not None and actions:
+        return f"{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+    if cls is not None:
+        return cls.__name__
+    return f"{view_func.__module__}.{view_func.__name__}"
+
+class InstrumentationMiddleware:
+    """Records per-view metrics; async views only get wall and HTTP time"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect('view') as collector:
+            request._instrumentation = collector
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        collector = Collector('view', capture_sql=False)
+        request._instrumentation = collector
+        token = _current.set(collector)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            collector.finish()
+            _finalize(collector)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        collector = getattr(request, '_instrumentation', None)
+        if collector is not None:
+            collector.name = view_name(request, view_func)
+        return None
+
+# Celery tasks: one collector per running task id
+_task_collectors = {}
+
+@task_prerun.connect
+def _start_task_collection(task_id=None, task=None, **kwargs):
+    cm = collect('task', task.name)
+    cm.__enter__()
+    _task_collectors[task_id] = cm
+
+@task_postrun.connect
+def _finish_task_collection(task_id=None, **kwargs):
+    cm = _task_collectors.pop(task_id, None)
+    if cm is not None:
+        cm.__exit__(None, None, None)
+
+def _prometheus_lines():
+    metrics = [
+        ('calls', 'threat_intel_calls_total', 'counter', 'Requests or task runs'),
+        ('wall_time', 'threat_intel_wall_seconds_total', 'counter', 'Wall time'),
+        ('queries', 'threat_intel_db_queries_total', 'counter', 'SQL queries executed'),
+        ('query_time', 'threat_intel_db_query_seconds_total', 'counter', 'Time spent in SQL'),
+        ('max_queries', 'threat_intel_db_queries_max', 'gauge', 'Most queries in a single call'),
+        ('http_calls', 'threat_intel_external_http_calls_total', 'counter', 'Outgoing HTTP calls'),
+        ('http_time', 'threat_intel_external_http_seconds_total', 'counter', 'Time spent in outgoing HTTP'),
+        ('budget_exceeded', 'threat_intel_query_budget_exceeded_total', 'counter',
+         'Calls that ran more queries than their QUERY_BUDGETS entry'),
+    ]
+    snapshot = store.snapshot()
+    for field, metric, metric_type, help_text in metrics:
+        yield f"# HELP {metric} {help_text}"
+        yield f"# TYPE {metric} {metric_type}"
+        for (kind, name), stats in sorted(snapshot.items()):
+            yield f'{metric}{{kind="{kind}",name="{name}"}} {stats[field]}'
+
+    yield "# HELP threat_intel_db_query_budget Configured query budget"
+    yield "# TYPE threat_intel_db_query_budget gauge"
+    for name, budget in sorted(settings.QUERY_BUDGETS.items()):
+        yield f'threat_intel_db_query_budget{{name="{name}"}} {budget}'
+
+def metrics_view(request):
+    """Prometheus endpoint; open to staff users or the configured scrape token"""
+    token = settings.INSTRUMENTATION_METRICS_TOKEN
+    authorized = (
+        getattr(request, 'user', None) is not None and request.user.is_staff
+    ) or (token and request.headers.get('Authorization') == f'Bearer {token}')
+    if not authorized:
+        return HttpResponse(status=403)
+
+    body = '\n'.join(_prometheus_lines()) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,8 @@
+import math
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +53,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'threat_intelligence.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,6 +84,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'threat_intelligence.wsgi.application'
+ASGI_APPLICATION = 'threat_intelligence.asgi.application'
 
 # Database
 DATABASES = {
@@ -204,11 +208,59 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Celery queue topology: feed ingestion, AI scoring, alerting and analytics
+# each get their own queue so a large feed import cannot delay alert creation
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('default'),
+    Queue('ingest'),
+    Queue('ai'),
+    Queue('alerts'),
+    Queue('analytics'),
+)
+CELERY_TASK_ROUTES = {
+    'threats.tasks.fetch_*': {'queue': 'ingest'},
+    'threats.tasks.ingest_*': {'queue': 'ingest'},
+    'threats.tasks.process_threat*_with_ai': {'queue': 'ai'},
+    'alerts.tasks.*': {'queue': 'alerts'},
+    'analytics.tasks.*': {'queue': 'analytics'},
+}
+
+# Fetch one message at a time and acknowledge after completion so long AI or
+# ingestion tasks never sit prefetched behind a busy worker process
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+
+# Redis priority support (0 is the highest priority); used to put critical
+# threat alerts ahead of routine ones on the alerts queue
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+
+# Live dashboard updates (server-sent events, requires the ASGI server)
+LIVE_UPDATES_ENABLED = config('LIVE_UPDATES_ENABLED', default=True, cast=bool)
+LIVE_UPDATES_REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+LIVE_UPDATES_CHANNEL = 'threat_intelligence:live_updates'
+LIVE_UPDATES_COUNTER_INTERVAL = config('LIVE_UPDATES_COUNTER_INTERVAL', default=2, cast=float)  # seconds
+LIVE_UPDATES_HEARTBEAT = 15  # seconds
+LIVE_UPDATES_RETRY_MS = 5000
+# Streams end after this long and the browser reconnects after LIVE_UPDATES_RETRY_MS.
+# Django does not notice disconnected clients while streaming, so this bounds leaked subscribers.
+LIVE_UPDATES_MAX_STREAM_SECONDS = config('LIVE_UPDATES_MAX_STREAM_SECONDS', default=300, cast=int)
+LIVE_UPDATES_QUEUE_SIZE = 500
+# Publishes run in request and task code paths, so an unreachable Redis must fail fast
+LIVE_UPDATES_REDIS_TIMEOUT = config('LIVE_UPDATES_REDIS_TIMEOUT', default=0.5, cast=float)  # seconds
+# Single-use tickets authenticate the stream, so access tokens never appear in URLs or access logs
+LIVE_UPDATES_TICKET_TTL = 30  # seconds
+
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
     'fetch-threat-feeds': {
         'task': 'threats.tasks.fetch_threat_feeds',
-        'schedule': timedelta(minutes=30),  # Run every 30 minutes
+        'schedule': timedelta(minutes=1),  # Cheap indexed check; each feed keeps its own interval
     },
     'update-daily-metrics': {
         'task': 'analytics.tasks.update_daily_metrics',
@@ -218,6 +270,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'analytics.tasks.check_ml_model_health',
         'schedule': timedelta(minutes=5),  # Check every 5 minutes
     },
+    'export-training-data': {
+        'task': 'analytics.tasks.export_training_data',
+        'schedule': timedelta(hours=1),
+    },
 }
 
 # Logging
@@ -251,6 +307,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'threat_intelligence': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -259,6 +320,60 @@ THREAT_ALERT_THRESHOLD = config('THREAT_ALERT_THRESHOLD', default=7, cast=int)
 CVE_API_URL = 'https://cve.circl.lu/api/last'
 MALWARE_FEED_URL = 'https://bazaar.abuse.ch/export/json/recent/'
 
+# Feed fetching: all due feeds are downloaded concurrently by one task
+FEED_FETCH_MAX_CONNECTIONS = config('FEED_FETCH_MAX_CONNECTIONS', default=20, cast=int)
+FEED_FETCH_PER_HOST_CONCURRENCY = config('FEED_FETCH_PER_HOST_CONCURRENCY', default=2, cast=int)
+FEED_FETCH_PER_HOST_RATE = config('FEED_FETCH_PER_HOST_RATE', default=1.0, cast=float)  # requests/second
+FEED_FETCH_TIMEOUT = config('FEED_FETCH_TIMEOUT', default=30, cast=int)
+FEED_INGEST_CHUNK_SIZE = config('FEED_INGEST_CHUNK_SIZE', default=500, cast=int)
+# Rows per INSERT; 50 threats stay under SQLite's 999 bind parameters, so the
+# batch is the same on every database
+FEED_INGEST_BATCH_SIZE = config('FEED_INGEST_BATCH_SIZE', default=50, cast=int)
+FEED_FETCH_JITTER = config('FEED_FETCH_JITTER', default=0.1, cast=float)  # +/- fraction of fetch_interval
+
+# Bulk ingestion settings
+THREAT_BULK_MAX_ITEMS = config('THREAT_BULK_MAX_ITEMS', default=5000, cast=int)
+AI_PROCESSING_BATCH_SIZE = config('AI_PROCESSING_BATCH_SIZE', default=100, cast=int)
+
+# Bulk export settings (rows fetched per server-side cursor round trip)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
 # ML Model API Settings
 ML_MODEL_API_URL = config('ML_MODEL_API_URL', default='http://localhost:8000')
-ML_MODEL_TIMEOUT = config('ML_MODEL_TIMEOUT', default=10, cast=int)
\ No newline at end of file
+ML_MODEL_TIMEOUT = config('ML_MODEL_TIMEOUT', default=10, cast=int)
+ML_MODEL_MAX_CONNECTIONS = config('ML_MODEL_MAX_CONNECTIONS', default=100, cast=int)
+ML_MODEL_ADMIN_TOKEN = config('ML_MODEL_ADMIN_TOKEN', default='')  # MODEL_ADMIN_TOKEN of the ML API
+
+# Training data export (resolved alerts/incidents -> ML service, then retrain)
+ML_TRAINING_EXPORT_BATCH = config('ML_TRAINING_EXPORT_BATCH', default=1000, cast=int)
+ML_RETRAIN_AFTER_EXPORT = config('ML_RETRAIN_AFTER_EXPORT', default=True, cast=bool)
+
+# Instrumentation (per view action / task metrics at /api/metrics/)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=0, cast=int)  # 0 disables slow logs
+INSTRUMENTATION_MAX_CAPTURED_SQL = config('INSTRUMENTATION_MAX_CAPTURED_SQL', default=50, cast=int)
+INSTRUMENTATION_METRICS_TOKEN = config('INSTRUMENTATION_METRICS_TOKEN', default='')
+
+# Maximum SQL queries per call, independent of row counts. Exceeding a budget
+# is logged and counted in the metrics; tests assert the same numbers.
+QUERY_BUDGETS = {
+    'ThreatViewSet.list': 3,
+    'ThreatViewSet.high_risk': 3,
+    'ThreatViewSet.dashboard_stats': 4,
+    'AlertViewSet.list': 3,
+    'AlertViewSet.retrieve': 3,
+    'AlertCommentViewSet.list': 3,
+    'AlertViewSet.dashboard_stats': 4,
+    'AnalyticsViewSet.dashboard_stats': 8,
+    # One SELECT streamed through a cursor, whatever the row count
+    'ThreatViewSet.export': 1,
+    # The transaction around the write and one statement per 500 rows
+    'ThreatViewSet.bulk_create': 3,
+    'ThreatViewSet.bulk_update': 3,
+    # Duplicate lookup, the transaction around the insert and one INSERT per batch
+    'threats.tasks.process_cve_feed': 3 + math.ceil(FEED_INGEST_CHUNK_SIZE / FEED_INGEST_BATCH_SIZE),
+    'threats.tasks.process_malware_feed': 3 + math.ceil(FEED_INGEST_CHUNK_SIZE / FEED_INGEST_BATCH_SIZE),
+    'alerts.tasks.create_threat_alert': 6,
+    'alerts.tasks.apply_alert_rules': 3,
+    'analytics.tasks.update_daily_metrics': 9,
+    'analytics.tasks.export_training_data': 2,
+}
@@ -0,0 +1,96 @@
+"""
+Test helpers: query budget assertions and realistic seed data
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .instrumentation import query_budget
+
+User = get_user_model()
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting the QUERY_BUDGETS entries from settings"""
+
+    @contextmanager
+    def assertQueryBudget(self, name, budget=None):
+        if budget is None:
+            budget = query_budget(name)
+        if budget is None:
+            self.fail(f"No QUERY_BUDGETS entry for {name}")
+
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f"{number}. {query['sql']}"
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(f"{name} ran {executed} queries, budget is {budget}:\n{queries}")
+
+def create_user(role='analyst', email=None):
+    email = email or f"{role}-{User.objects.count()}@threatintel.local"
+    return User.objects.create_user(
+        username=email.split('@')[0], email=email, password='test-password', role=role
+    )
+
+def seed_threats(count, source='seed-feed', seed=0, **overrides):
+    """Bulk-insert threats with a realistic spread of types, severities and ages"""
+    from threats.models import Threat
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    threat_types = [choice for choice, _ in Threat.THREAT_TYPES]
+    threats = []
+    for n in range(count):
+        fields = {
+            'source': source,
+            'threat_type': rng.choice(threat_types),
+            'severity': rng.randint(1, 10),
+            'title': f'Seeded threat {n}',
+            'description': f'Seeded threat {n} for query count tests',
+            'date_detected': now - timedelta(hours=rng.randint(0, 24 * 14)),
+            'risk_score': round(rng.uniform(0, 10), 1),
+            'external_id': f'{source}-{n}',
+            'is_false_positive': rng.random() < 0.1,
+        }
+        fields.update(overrides)
+        threats.append(Threat(**fields))
+    return Threat.objects.bulk_create(threats)
+
+def seed_alerts(threats, users, comments_per_alert=2, seed=0):
+    """One alert per threat, spread over statuses and assignees, with comments"""
+    from alerts.models import Alert, AlertComment
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    statuses = [choice for choice, _ in Alert.STATUS_CHOICES]
+    alerts = []
+    for threat in threats:
+        status = rng.choice(statuses)
+        alerts.append(Alert(
+            threat=threat,
+            alert_type='threat_detected',
+            title=f'Alert for {threat.title}',
+            description=threat.description,
+            priority=rng.randint(1, 5),
+            status=status,
+            assigned_to=rng.choice(users + [None]),
+            created_by=rng.choice(users),
+            resolved_at=now if status == 'resolved' else None,
+        ))
+    alerts = Alert.objects.bulk_create(alerts)
+
+    AlertComment.objects.bulk_create([
+        AlertComment(alert=alert, user=rng.choice(users), comment=f'Comment {n}')
+        for alert in alerts
+        for n in range(comments_per_alert)
+    ])
+    return alerts
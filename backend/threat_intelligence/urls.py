@@ -6,6 +6,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .instrumentation import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Threat Intelligence API",
@@ -26,6 +28,7 @@ urlpatterns = [
     path('api/alerts/', include('alerts.urls')),
     path('api/incidents/', include('incidents.urls')),
     path('api/analytics/', include('analytics.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
     
     # API Documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
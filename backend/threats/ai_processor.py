@@ -1,9 +1,76 @@
 import logging
 import re
+from types import MappingProxyType
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+BASE_SUGGESTIONS = {
+    'apt': (
+        "Immediately isolate potentially affected systems",
+        "Conduct forensic analysis to determine scope of compromise",
+        "Review network logs for lateral movement indicators",
+        "Update all security controls and monitoring rules",
+        "Consider engaging external incident response team",
+    ),
+    'ransomware': (
+        "Immediately disconnect affected systems from network",
+        "Do not pay ransom - contact law enforcement",
+        "Assess backup integrity and restoration capabilities",
+        "Implement network segmentation to prevent spread",
+        "Notify relevant stakeholders and regulatory bodies",
+    ),
+    'malware': (
+        "Quarantine infected systems immediately",
+        "Run full antimalware scans on all endpoints",
+        "Update signature databases and security patches",
+        "Monitor network traffic for command and control activity",
+        "Review email security and web filtering policies",
+    ),
+    'vulnerability': (
+        "Apply security patches immediately if available",
+        "Implement temporary mitigations if patches unavailable",
+        "Scan infrastructure for vulnerable systems",
+        "Update vulnerability management procedures",
+        "Monitor for exploitation attempts",
+    ),
+    'phishing': (
+        "Block malicious domains and email addresses",
+        "Educate users about the specific phishing campaign",
+        "Review and update email security controls",
+        "Monitor for credential compromise indicators",
+        "Implement additional authentication controls",
+    ),
+    # Any other classification
+    'generic': (
+        "Assess potential impact on organizational assets",
+        "Implement appropriate security controls",
+        "Monitor for related threat activity",
+        "Update security policies and procedures",
+        "Document lessons learned",
+    ),
+}
+
+SEVERITY_PREFIXES = {
+    'critical': ("URGENT: This is a critical threat requiring immediate attention",),
+    'high': ("HIGH PRIORITY: Address this threat within 24 hours",),
+    'standard': (),
+}
+
+def severity_band(severity) -> str:
+    if severity >= 8:
+        return 'critical'
+    if severity >= 6:
+        return 'high'
+    return 'standard'
+
+# Rendered suggestion text for every (classification, severity band), built once at import
+RESPONSE_SUGGESTIONS = MappingProxyType({
+    (classification, band): "\n".join(f"• {suggestion}" for suggestion in prefix + suggestions)
+    for classification, suggestions in BASE_SUGGESTIONS.items()
+    for band, prefix in SEVERITY_PREFIXES.items()
+})
+
 class ThreatAIProcessor:
     """
     AI-powered threat analysis processor.
@@ -115,56 +182,5 @@ class ThreatAIProcessor:
     
     def _generate_response_suggestion(self, threat, classification: str) -> str:
         """Generate incident response suggestion"""
-        base_suggestions = {
-            'apt': [
-                "Immediately isolate potentially affected systems",
-                "Conduct forensic analysis to determine scope of compromise",
-                "Review network logs for lateral movement indicators",
-                "Update all security controls and monitoring rules",
-                "Consider engaging external incident response team"
-            ],
-            'ransomware': [
-                "Immediately disconnect affected systems from network",
-                "Do not pay ransom - contact law enforcement",
-                "Assess backup integrity and restoration capabilities",
-                "Implement network segmentation to prevent spread",
-                "Notify relevant stakeholders and regulatory bodies"
-            ],
-            'malware': [
-                "Quarantine infected systems immediately",
-                "Run full antimalware scans on all endpoints",
-                "Update signature databases and security patches",
-                "Monitor network traffic for command and control activity",
-                "Review email security and web filtering policies"
-            ],
-            'vulnerability': [
-                "Apply security patches immediately if available",
-                "Implement temporary mitigations if patches unavailable",
-                "Scan infrastructure for vulnerable systems",
-                "Update vulnerability management procedures",
-                "Monitor for exploitation attempts"
-            ],
-            'phishing': [
-                "Block malicious domains and email addresses",
-                "Educate users about the specific phishing campaign",
-                "Review and update email security controls",
-                "Monitor for credential compromise indicators",
-                "Implement additional authentication controls"
-            ]
-        }
-        
-        suggestions = base_suggestions.get(classification, [
-            "Assess potential impact on organizational assets",
-            "Implement appropriate security controls",
-            "Monitor for related threat activity",
-            "Update security policies and procedures",
-            "Document lessons learned"
-        ])
-        
-        # Add severity-based suggestions
-        if threat.severity >= 8:
-            suggestions.insert(0, "URGENT: This is a critical threat requiring immediate attention")
-        elif threat.severity >= 6:
-            suggestions.insert(0, "HIGH PRIORITY: Address this threat within 24 hours")
-        
-        return "\n".join(f"• {suggestion}" for suggestion in suggestions)
\ No newline at end of file
+        band = severity_band(threat.severity)
+        return RESPONSE_SUGGESTIONS.get((classification, band)) or RESPONSE_SUGGESTIONS[('generic', band)]
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+class ExportFormatError(ValueError):
+    """Raised when an export format is unknown or its dependencies are missing"""
+
+def get_export_fields(model):
+    """Return the column names exported for a model (FKs as raw ids)"""
+    return [field.attname for field in model._meta.concrete_fields]
+
+def iter_export_rows(queryset, fields, chunk_size=None):
+    """Yield plain dict rows from a server-side cursor without building model instances"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+def _encode_cell(value):
+    """Flatten JSON fields for tabular formats"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+def stream_ndjson(rows, fields, model):
+    """Yield one JSON document per row"""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+def stream_csv(rows, fields, model):
+    """Yield CSV text, one header line followed by one line per row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: _encode_cell(value) for key, value in row.items()})
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be drained between row groups"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _parquet_schema(model, fields):
+    """Derive a fixed Arrow schema from the model so every row group matches"""
+    import pyarrow as pa
+
+    arrow_types = {
+        'AutoField': pa.int64(),
+        'BigAutoField': pa.int64(),
+        'IntegerField': pa.int64(),
+        'BigIntegerField': pa.int64(),
+        'PositiveIntegerField': pa.int64(),
+        'ForeignKey': pa.int64(),
+        'OneToOneField': pa.int64(),
+        'FloatField': pa.float64(),
+        'BooleanField': pa.bool_(),
+        'DateTimeField': pa.timestamp('us', tz='UTC'),
+        'DateField': pa.date32(),
+    }
+    columns = {field.attname: field for field in model._meta.concrete_fields}
+    return pa.schema([
+        (name, arrow_types.get(columns[name].get_internal_type(), pa.string()))
+        for name in fields
+    ])
+
+def stream_parquet(rows, fields, model, row_group_size=None):
+    """Yield a Parquet file one row group at a time"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError('Parquet export requires the pyarrow package')
+
+    row_group_size = row_group_size or settings.EXPORT_CHUNK_SIZE
+    schema = _parquet_schema(model, fields)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write_batch(batch):
+        columns = {field: [_encode_cell(row[field]) for row in batch] for field in fields}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            write_batch(batch)
+            batch = []
+            yield sink.drain()
+
+    if batch:
+        write_batch(batch)
+    writer.close()
+    yield sink.drain()
+
+_STREAMERS = {
+    'ndjson': stream_ndjson,
+    'csv': stream_csv,
+    'parquet': stream_parquet,
+}
+
+def stream_export(queryset, export_format, chunk_size=None):
+    """Return a generator producing the export of a queryset in the given format"""
+    if export_format not in _STREAMERS:
+        raise ExportFormatError(
+            f"Unsupported export format '{export_format}'. "
+            f"Choose one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportFormatError('Parquet export requires the pyarrow package')
+
+    fields = get_export_fields(queryset.model)
+    rows = iter_export_rows(queryset, fields, chunk_size)
+    return _STREAMERS[export_format](rows, fields, queryset.model)
+
+def export_response(queryset, export_format, filename_prefix):
+    """Build a StreamingHttpResponse for a queryset export"""
+    content = stream_export(queryset, export_format)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename_prefix}-{timestamp}.{export_format}"'
+    )
+    return response
@@ -0,0 +1,263 @@
+import json
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from celery import current_app
+from celery.signals import task_prerun, task_postrun
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from threats import tasks as threat_tasks
+from threats.models import Threat, ThreatFeed
+from alerts.models import Alert
+
+CVE_SUMMARIES = [
+    'Remote code execution in web management interface',
+    'SQL injection in login form allows authentication bypass',
+    'Cross-site scripting in search results page',
+    'Buffer overflow in network service leads to privilege escalation',
+    'Information disclosure through verbose error messages',
+    'Denial of service via crafted packets',
+    'Misconfiguration exposes administrative endpoint',
+]
+MALWARE_SIGNATURES = ['Trojan.Agent', 'Ransomware.Lock', 'Backdoor.Remote', 'Adware.Generic', 'Worm.Net', '']
+MALWARE_FILE_TYPES = ['exe', 'dll', 'doc', 'zip', 'elf']
+
+def generate_cve_feed(size, seed=0):
+    """CVE items shaped like the cve.circl.lu feed consumed by process_cve_feed"""
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    return [
+        {
+            'id': f'CVE-BENCH-{run_id}-{n:07d}',
+            'summary': f'{rng.choice(CVE_SUMMARIES)} (synthetic item {n})',
+            'Published': '2024-01-01T00:00:00',
+            'cvss': round(rng.uniform(0, 10), 1),
+            'references': [f'https://example.invalid/advisory/{run_id}/{n}'],
+        }
+        for n in range(size)
+    ]
+
+def generate_malware_feed(size, seed=0):
+    """Malware items shaped like the MalwareBazaar export consumed by process_malware_feed"""
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    return {
+        'query_status': 'ok',
+        'data': [
+            {
+                'sha256_hash': f'{run_id}{n:056x}',
+                'md5_hash': f'{n:032x}',
+                'file_name': f'sample_{n}.{rng.choice(MALWARE_FILE_TYPES)}',
+                'file_type': rng.choice(MALWARE_FILE_TYPES),
+                'first_seen': '2024-01-01 00:00:00',
+                'signature': rng.choice(MALWARE_SIGNATURES),
+                'tags': ['benchmark', rng.choice(['trojan', 'ransomware', 'stealer'])],
+            }
+            for n in range(size)
+        ],
+    }
+
+FEED_GENERATORS = {
+    'cve': generate_cve_feed,
+    'malware': generate_malware_feed,
+}
+
+def start_feed_server(payloads):
+    """Serve pre-encoded feed payloads from a local HTTP server on a free port"""
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = payloads.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StageTimer:
+    """Exclusive wall time per pipeline stage, from Celery task signals and wrapped calls"""
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+
+    def start(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def stop(self):
+        name, started, child_time = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        stage = self.stages.setdefault(name, {'calls': 0, 'total_s': 0.0})
+        stage['calls'] += 1
+        stage['total_s'] += elapsed - child_time
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            self.start(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stop()
+        return timed
+
+    def report(self):
+        return {
+            name: {
+                'calls': stage['calls'],
+                'total_s': round(stage['total_s'], 4),
+                'mean_ms': round(stage['total_s'] / stage['calls'] * 1000, 3),
+            }
+            for name, stage in self.stages.items()
+        }
+
+class QueryCounter:
+    """Counts and times SQL statements without keeping them in memory"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.total_s += time.perf_counter() - started
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the feed ingestion chain (fetch -> ingest -> AI -> alerts) '
+        'against synthetic feeds served locally, with Celery in eager mode'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000],
+                            help='Items per synthetic feed, e.g. --sizes 1000 10000 100000')
+        parser.add_argument('--feed-types', nargs='+', choices=FEED_GENERATORS.keys(),
+                            default=list(FEED_GENERATORS.keys()))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Write JSON results to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated threats and alerts')
+
+    def handle(self, *args, **options):
+        results = {
+            'benchmark': 'ingestion',
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'runs': [],
+        }
+
+        conf = current_app.conf
+        previous_eager = conf.task_always_eager
+        conf.task_always_eager = True
+        try:
+            with override_settings(LIVE_UPDATES_ENABLED=False):
+                for feed_type in options['feed_types']:
+                    for size in options['sizes']:
+                        self.stderr.write(f"Benchmarking {feed_type} feed with {size} items...")
+                        run = self._run(feed_type, size, options['seed'], options['keep'])
+                        results['runs'].append(run)
+                        self.stderr.write(
+                            f"  {run['items_per_sec']} items/s, "
+                            f"{run['queries_per_item']} queries/item"
+                        )
+        finally:
+            conf.task_always_eager = previous_eager
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def _run(self, feed_type, size, seed, keep):
+        generation_started = time.perf_counter()
+        body = json.dumps(FEED_GENERATORS[feed_type](size, seed)).encode()
+        generation_s = time.perf_counter() - generation_started
+
+        server = start_feed_server({f'/{feed_type}': body})
+        feed = ThreatFeed.objects.create(
+            name=f'benchmark-{feed_type}-{size}-{uuid.uuid4().hex[:8]}',
+            url=f'http://127.0.0.1:{server.server_address[1]}/{feed_type}',
+            feed_type=feed_type,
+        )
+
+        timer = StageTimer()
+        counter = QueryCounter()
+
+        def on_prerun(task=None, **kwargs):
+            timer.start(task.name.rsplit('.', 1)[-1])
+
+        def on_postrun(**kwargs):
+            timer.stop()
+
+        task_prerun.connect(on_prerun, weak=False)
+        task_postrun.connect(on_postrun, weak=False)
+        try:
+            with mock.patch.object(threat_tasks, 'fetch_feeds', timer.wrap('download', threat_tasks.fetch_feeds)), \
+                    connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                threat_tasks.fetch_single_threat_feed.delay(feed.id)
+                elapsed = time.perf_counter() - started
+        finally:
+            task_prerun.disconnect(on_prerun)
+            task_postrun.disconnect(on_postrun)
+            server.shutdown()
+
+        threats = Threat.objects.filter(source=feed.name)
+        threats_created = threats.count()
+        alerts_created = Alert.objects.filter(threat__source=feed.name).count()
+
+        if not keep:
+            threats.delete()
+            feed.delete()
+
+        return {
+            'feed_type': feed_type,
+            'items': size,
+            'payload_bytes': len(body),
+            'generation_s': round(generation_s, 3),
+            'wall_time_s': round(elapsed, 3),
+            'items_per_sec': round(size / elapsed, 1) if elapsed else None,
+            'threats_created': threats_created,
+            'alerts_created': alerts_created,
+            'queries': counter.count,
+            'query_time_s': round(counter.total_s, 3),
+            'queries_per_item': round(counter.count / size, 2) if size else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': timer.report(),
+        }
@@ -0,0 +1,59 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from threats.exporters import EXPORT_FORMATS, ExportFormatError, stream_export
+from threats.filters import ThreatFilter
+from threats.models import Threat
+from alerts.filters import AlertFilter
+from alerts.models import Alert
+
+EXPORT_TARGETS = {
+    'threats': (Threat, ThreatFilter),
+    'alerts': (Alert, AlertFilter),
+}
+
+class Command(BaseCommand):
+    help = 'Stream threats or alerts to a file as NDJSON, CSV or Parquet'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=EXPORT_TARGETS.keys())
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS.keys(), default='ndjson')
+        parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per cursor round trip')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help='Filter parameter as accepted by the API, e.g. --filter severity_min=7 (repeatable)'
+        )
+    
+    def handle(self, *args, **options):
+        model, filterset_class = EXPORT_TARGETS[options['target']]
+        
+        params = QueryDict(mutable=True)
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Invalid filter '{item}', expected NAME=VALUE")
+            params.appendlist(name, value)
+        
+        filterset = filterset_class(params, queryset=model.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(f"Invalid filters: {dict(filterset.errors)}")
+        
+        try:
+            chunks = stream_export(filterset.qs, options['export_format'], options['chunk_size'])
+        except ExportFormatError as e:
+            raise CommandError(str(e))
+        
+        binary = options['export_format'] == 'parquet'
+        if options['output']:
+            mode = 'wb' if binary else 'w'
+            with open(options['output'], mode) as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['target']} to {options['output']}"))
+        else:
+            output = sys.stdout.buffer if binary else sys.stdout
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
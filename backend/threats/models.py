@@ -1,5 +1,9 @@
+import random
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -93,12 +97,33 @@ class ThreatFeed(models.Model):
     is_active = models.BooleanField(default=True)
     api_key = models.CharField(max_length=500, blank=True)
     last_fetched = models.DateTimeField(null=True, blank=True)
+    next_fetch_at = models.DateTimeField(null=True, blank=True)  # null means due now
     fetch_interval = models.IntegerField(default=30)  # minutes
     total_threats_imported = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'threat_feeds'
+        indexes = [
+            models.Index(fields=['is_active', 'next_fetch_at']),
+        ]
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+    
+    def schedule_next_fetch(self, now=None):
+        """
+        Set next_fetch_at one interval ahead, jittered so feeds drift apart.
+        
+        A feed's first schedule lands anywhere within the interval, so feeds
+        created together (all due on the first beat) spread out instead of
+        staying clustered within the jitter.
+        """
+        now = now or timezone.now()
+        if self.next_fetch_at is None:
+            factor = random.random()
+        else:
+            jitter = settings.FEED_FETCH_JITTER
+            factor = random.uniform(1 - jitter, 1 + jitter)
+        self.next_fetch_at = now + timedelta(minutes=self.fetch_interval * factor)
+        return self.next_fetch_at
\ No newline at end of file
@@ -26,11 +26,21 @@ class ThreatUpdateSerializer(serializers.ModelSerializer):
                  'indicators_of_compromise', 'references', 'tags', 
                  'is_active', 'is_false_positive']
 
+class ThreatBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    is_active = serializers.BooleanField(required=False)
+    is_false_positive = serializers.BooleanField(required=False)
+    
+    def validate(self, attrs):
+        if 'is_active' not in attrs and 'is_false_positive' not in attrs:
+            raise serializers.ValidationError("Provide is_active and/or is_false_positive")
+        return attrs
+
 class ThreatFeedSerializer(serializers.ModelSerializer):
     class Meta:
         model = ThreatFeed
         fields = '__all__'
-        read_only_fields = ['created_at', 'last_fetched', 'total_threats_imported']
+        read_only_fields = ['created_at', 'last_fetched', 'next_fetch_at', 'total_threats_imported']
 
 class ThreatStatsSerializer(serializers.Serializer):
     total_threats = serializers.IntegerField()
@@ -38,4 +48,4 @@ class ThreatStatsSerializer(serializers.Serializer):
     high_risk_threats = serializers.IntegerField()
     threats_by_type = serializers.DictField()
     threats_by_severity = serializers.DictField()
-    recent_threats = serializers.ListField()
\ No newline at end of file
+    recent_threats = serializers.IntegerField()
\ No newline at end of file
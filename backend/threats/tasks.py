@@ -1,29 +1,42 @@
-import requests
 import logging
 from celery import shared_task
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 from django.conf import settings
 from datetime import datetime, timedelta
 from .models import Threat, ThreatFeed
 from .ai_processor import ThreatAIProcessor
+from .feed_fetcher import fetch_feeds, extract_feed_items
+from threat_intelligence.instrumentation import instrumented
+from analytics.live import publish_live_event
 
 logger = logging.getLogger(__name__)
 
 @shared_task
 def fetch_threat_feeds():
-    """Fetch all active threat feeds"""
-    active_feeds = ThreatFeed.objects.filter(is_active=True)
+    """Fetch all active threat feeds that are due, concurrently"""
+    now = timezone.now()
     
-    for feed in active_feeds:
-        # Check if it's time to fetch this feed
-        if feed.last_fetched:
-            time_since_last_fetch = timezone.now() - feed.last_fetched
-            if time_since_last_fetch.total_seconds() < feed.fetch_interval * 60:
-                continue
-        
-        fetch_single_threat_feed.delay(feed.id)
+    # Claim due feeds by pushing their next_fetch_at forward before fetching.
+    # Each claim is a conditional UPDATE on the value we read, so of two
+    # overlapping scheduler runs only one updates the row; row locks
+    # (select_for_update) are not available on SQLite.
+    candidates = list(
+        ThreatFeed.objects.filter(is_active=True)
+        .filter(Q(next_fetch_at__isnull=True) | Q(next_fetch_at__lte=now))
+        .order_by('next_fetch_at')
+    )
+    due_feeds = []
+    for feed in candidates:
+        previous = feed.next_fetch_at
+        unchanged = Q(next_fetch_at__isnull=True) if previous is None else Q(next_fetch_at=previous)
+        feed.schedule_next_fetch(now)
+        if ThreatFeed.objects.filter(unchanged, id=feed.id).update(next_fetch_at=feed.next_fetch_at):
+            due_feeds.append(feed)
     
-    logger.info(f"Triggered fetch for {active_feeds.count()} threat feeds")
+    fetch_and_dispatch_feeds(due_feeds)
+    logger.info(f"Fetched {len(due_feeds)} due threat feeds")
 
 @shared_task
 def fetch_single_threat_feed(feed_id):
@@ -31,49 +44,65 @@ def fetch_single_threat_feed(feed_id):
     try:
         feed = ThreatFeed.objects.get(id=feed_id)
         logger.info(f"Fetching threat feed: {feed.name}")
+        fetch_and_dispatch_feeds([feed])
+        
+    except Exception as e:
+        logger.error(f"Error fetching threat feed {feed_id}: {str(e)}")
+
+def fetch_and_dispatch_feeds(feeds):
+    """Download feeds concurrently and hand each one's items to the ingest queue in chunks as it arrives"""
+    if not feeds:
+        return
+    
+    chunk_size = settings.FEED_INGEST_CHUNK_SIZE
+    
+    def dispatch(feed, data, error):
+        if error is not None:
+            logger.error(f"Error fetching threat feed {feed.name}: {str(error)}")
+            return
         
-        # Prepare headers
-        headers = {'User-Agent': 'ThreatIntel-Dashboard/1.0'}
-        if feed.api_key:
-            headers['Authorization'] = f'Bearer {feed.api_key}'
+        items = extract_feed_items(feed.feed_type, data)
+        for start in range(0, len(items), chunk_size):
+            ingest_feed_chunk.delay(feed.id, items[start:start + chunk_size])
         
-        # Fetch data
-        response = requests.get(feed.url, headers=headers, timeout=30)
-        response.raise_for_status()
+        # Update feed metadata
+        ThreatFeed.objects.filter(id=feed.id).update(last_fetched=timezone.now())
+        logger.info(f"Queued {len(items)} items from {feed.name} for ingestion")
+    
+    fetch_feeds(feeds, dispatch)
+
+@shared_task
+def ingest_feed_chunk(feed_id, items):
+    """Create threats from one chunk of a fetched feed"""
+    try:
+        feed = ThreatFeed.objects.get(id=feed_id)
         
         # Process based on feed type
         if feed.feed_type == 'cve':
-            threats_created = process_cve_feed(response.json(), feed)
+            threats_created = process_cve_feed(items, feed)
         elif feed.feed_type == 'malware':
-            threats_created = process_malware_feed(response.json(), feed)
+            threats_created = process_malware_feed({'data': items}, feed)
         else:
-            threats_created = process_generic_feed(response.json(), feed)
+            threats_created = process_generic_feed(items, feed)
         
-        # Update feed metadata
-        feed.last_fetched = timezone.now()
-        feed.total_threats_imported += threats_created
-        feed.save()
+        # Chunks of one feed may run in parallel, so increment in the database
+        ThreatFeed.objects.filter(id=feed_id).update(
+            total_threats_imported=F('total_threats_imported') + threats_created
+        )
         
         logger.info(f"Successfully processed {threats_created} threats from {feed.name}")
         
     except Exception as e:
-        logger.error(f"Error fetching threat feed {feed_id}: {str(e)}")
+        logger.error(f"Error ingesting chunk of threat feed {feed_id}: {str(e)}")
 
+@instrumented
 def process_cve_feed(data, feed):
     """Process CVE feed data"""
-    threats_created = 0
+    threats = []
     
     for item in data:
         try:
-            # Check if threat already exists
-            if Threat.objects.filter(
-                external_id=item.get('id'),
-                source=feed.name
-            ).exists():
-                continue
-            
-            # Create threat
-            threat = Threat.objects.create(
+            threats.append(Threat(
                 source=feed.name,
                 threat_type='vulnerability',
                 title=item.get('summary', 'CVE Vulnerability')[:500],
@@ -83,32 +112,21 @@ def process_cve_feed(data, feed):
                 date_detected=parse_cve_date(item.get('Published')),
                 severity=calculate_cve_severity(item.get('cvss', 0)),
                 references=item.get('references', []),
-            )
-            
-            # Process with AI
-            process_threat_with_ai.delay(threat.id)
-            threats_created += 1
+            ))
             
         except Exception as e:
             logger.error(f"Error processing CVE item: {str(e)}")
     
-    return threats_created
+    return create_feed_threats(threats, feed)
 
+@instrumented
 def process_malware_feed(data, feed):
     """Process malware feed data"""
-    threats_created = 0
+    threats = []
     
     for item in data.get('data', []):
         try:
-            # Check if threat already exists
-            if Threat.objects.filter(
-                external_id=item.get('sha256_hash'),
-                source=feed.name
-            ).exists():
-                continue
-            
-            # Create threat
-            threat = Threat.objects.create(
+            threats.append(Threat(
                 source=feed.name,
                 threat_type='malware',
                 title=f"Malware: {item.get('file_name', 'Unknown')}",
@@ -121,16 +139,59 @@ def process_malware_feed(data, feed):
                     {'type': 'md5', 'value': item.get('md5_hash')},
                 ],
                 tags=item.get('tags', []),
-            )
-            
-            # Process with AI
-            process_threat_with_ai.delay(threat.id)
-            threats_created += 1
+            ))
             
         except Exception as e:
             logger.error(f"Error processing malware item: {str(e)}")
     
-    return threats_created
+    return create_feed_threats(threats, feed)
+
+def create_feed_threats(threats, feed):
+    """Insert feed threats not seen before with one lookup and batched bulk inserts"""
+    # Items without an identifier cannot be deduplicated (and external_id is not nullable)
+    identified = [threat for threat in threats if threat.external_id]
+    if len(identified) < len(threats):
+        logger.warning(f"Skipped {len(threats) - len(identified)} items without an id from {feed.name}")
+    
+    # Skip threats already imported from this feed, and duplicates within the chunk
+    external_ids = {threat.external_id for threat in identified}
+    seen = set(
+        Threat.objects.filter(source=feed.name, external_id__in=external_ids)
+        .values_list('external_id', flat=True)
+    )
+    new_threats = []
+    for threat in identified:
+        if threat.external_id in seen:
+            continue
+        seen.add(threat.external_id)
+        new_threats.append(threat)
+    
+    if not new_threats:
+        return 0
+    
+    try:
+        with transaction.atomic():
+            created = Threat.objects.bulk_create(new_threats, batch_size=settings.FEED_INGEST_BATCH_SIZE)
+    except DatabaseError as e:
+        # One bad row fails the whole insert; retry row by row so only that row is lost
+        logger.warning(f"Bulk insert from {feed.name} failed, inserting row by row: {str(e)}")
+        created = []
+        for threat in new_threats:
+            threat.pk = None
+            try:
+                with transaction.atomic():
+                    threat.save(force_insert=True)
+                created.append(threat)
+            except DatabaseError as row_error:
+                logger.error(f"Error creating threat {threat.external_id} from {feed.name}: {str(row_error)}")
+    
+    created_ids = [threat.id for threat in created if threat.id is not None]
+    
+    # Process with AI in batches; bulk_create skips post_save, so notify live dashboards
+    enqueue_ai_processing(created_ids)
+    publish_live_event('threats_bulk_created', {'ids': created_ids})
+    
+    return len(created)
 
 def process_generic_feed(data, feed):
     """Process generic threat feed data"""
@@ -148,25 +209,59 @@ def process_threat_with_ai(threat_id):
         threat = Threat.objects.get(id=threat_id)
         processor = ThreatAIProcessor()
         
-        # Generate AI analysis
-        ai_result = processor.analyze_threat(threat)
-        
-        # Update threat with AI results
-        threat.risk_score = ai_result.get('risk_score', 0)
-        threat.ai_classification = ai_result.get('classification', '')
-        threat.incident_response_suggestion = ai_result.get('response_suggestion', '')
+        apply_ai_analysis(threat, processor)
         threat.save()
         
         # Check if alert should be triggered
         if threat.should_trigger_alert(settings.THREAT_ALERT_THRESHOLD):
-            from alerts.tasks import create_threat_alert
-            create_threat_alert.delay(threat.id)
+            from alerts.tasks import queue_threat_alert
+            queue_threat_alert(threat)
         
         logger.info(f"AI processing completed for threat {threat_id}")
         
     except Exception as e:
         logger.error(f"Error processing threat {threat_id} with AI: {str(e)}")
 
+@shared_task
+def process_threats_with_ai(threat_ids):
+    """Process a batch of threats with AI, saving the results in one bulk update"""
+    try:
+        threats = list(Threat.objects.filter(id__in=threat_ids))
+        processor = ThreatAIProcessor()
+        
+        for threat in threats:
+            apply_ai_analysis(threat, processor)
+        
+        Threat.objects.bulk_update(
+            threats,
+            ['risk_score', 'ai_classification', 'incident_response_suggestion', 'updated_at']
+        )
+        
+        from alerts.tasks import queue_threat_alert
+        for threat in threats:
+            if threat.should_trigger_alert(settings.THREAT_ALERT_THRESHOLD):
+                queue_threat_alert(threat)
+        
+        logger.info(f"AI processing completed for {len(threats)} threats")
+        
+    except Exception as e:
+        logger.error(f"Error processing threat batch with AI: {str(e)}")
+
+def apply_ai_analysis(threat, processor):
+    """Copy the AI analysis results onto a threat without saving it"""
+    ai_result = processor.analyze_threat(threat)
+    
+    threat.risk_score = ai_result.get('risk_score', 0)
+    threat.ai_classification = ai_result.get('classification', '')
+    threat.incident_response_suggestion = ai_result.get('response_suggestion', '')
+    threat.updated_at = timezone.now()
+
+def enqueue_ai_processing(threat_ids):
+    """Queue AI processing for many threats as batched tasks"""
+    batch_size = settings.AI_PROCESSING_BATCH_SIZE
+    for start in range(0, len(threat_ids), batch_size):
+        process_threats_with_ai.delay(threat_ids[start:start + batch_size])
+
 # Helper functions
 def parse_cve_date(date_string):
     """Parse CVE date string to datetime"""
@@ -0,0 +1,418 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from threat_intelligence.testing import QueryBudgetMixin, create_user, seed_threats
+from .ai_processor import ThreatAIProcessor
+from .models import Threat, ThreatFeed
+from .exporters import ExportFormatError, get_export_fields, stream_export
+from .feed_fetcher import AsyncFeedFetcher
+from .tasks import fetch_and_dispatch_feeds, fetch_threat_feeds, process_cve_feed, process_malware_feed
+from .views import ThreatViewSet
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class ThreatViewQueryCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('analyst')
+        seed_threats(250)
+
+    def get(self, action, **params):
+        view = ThreatViewSet.as_view({'get': action})
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        with self.assertQueryBudget('ThreatViewSet.list'):
+            response = self.get('list')
+        self.assertEqual(response.data['count'], 250)
+
+    def test_list_with_filters_and_ordering(self):
+        with self.assertQueryBudget('ThreatViewSet.list'):
+            self.get('list', threat_type='malware', ordering='-created_at')
+
+    def test_list_later_page(self):
+        with self.assertQueryBudget('ThreatViewSet.list'):
+            self.get('list', page=5)
+
+    def test_high_risk(self):
+        with self.assertQueryBudget('ThreatViewSet.high_risk'):
+            self.get('high_risk')
+
+    def test_dashboard_stats(self):
+        with self.assertQueryBudget('ThreatViewSet.dashboard_stats'):
+            response = self.get('dashboard_stats')
+        self.assertEqual(response.data['total_threats'], 250)
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class FeedIngestionQueryCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cve_feed = ThreatFeed.objects.create(
+            name='cve-feed', url='https://example.invalid/cve', feed_type='cve'
+        )
+        cls.malware_feed = ThreatFeed.objects.create(
+            name='malware-feed', url='https://example.invalid/malware', feed_type='malware'
+        )
+        # Previously imported items, so half of each chunk is a duplicate
+        seed_threats(300, source=cls.cve_feed.name)
+        seed_threats(300, source=cls.malware_feed.name)
+
+    def half_new_chunk(self):
+        """Positions of one full ingest chunk, half of which were already imported"""
+        chunk = settings.FEED_INGEST_CHUNK_SIZE
+        return 300 - chunk // 2, chunk
+
+    def cve_items(self, start, count):
+        return [
+            {
+                'id': f'{self.cve_feed.name}-{n}',
+                'summary': f'CVE summary {n}',
+                'Published': '2024-01-01T00:00:00',
+                'cvss': n % 10,
+                'references': [],
+            }
+            for n in range(start, start + count)
+        ]
+
+    def malware_items(self, start, count):
+        return [
+            {
+                'sha256_hash': f'{self.malware_feed.name}-{n}',
+                'md5_hash': f'{n:032x}',
+                'file_name': f'sample_{n}.exe',
+                'file_type': 'exe',
+                'first_seen': '2024-01-01 00:00:00',
+                'signature': 'Trojan.Agent',
+                'tags': [],
+            }
+            for n in range(start, start + count)
+        ]
+
+    @mock.patch('threats.tasks.process_threats_with_ai.delay')
+    def test_process_cve_feed(self, delay):
+        start, count = self.half_new_chunk()
+        items = self.cve_items(start, count)
+        with self.assertQueryBudget('threats.tasks.process_cve_feed'):
+            created = process_cve_feed(items, self.cve_feed)
+
+        self.assertEqual(created, start + count - 300)
+        self.assertEqual(Threat.objects.filter(source=self.cve_feed.name).count(), start + count)
+        delay.assert_called()
+
+    @mock.patch('threats.tasks.process_threats_with_ai.delay')
+    def test_process_malware_feed(self, delay):
+        start, count = self.half_new_chunk()
+        items = self.malware_items(start, count)
+        with self.assertQueryBudget('threats.tasks.process_malware_feed'):
+            created = process_malware_feed({'data': items}, self.malware_feed)
+
+        self.assertEqual(created, start + count - 300)
+        delay.assert_called()
+
+    @mock.patch('threats.tasks.process_threats_with_ai.delay')
+    def test_duplicates_within_a_chunk_are_created_once(self, delay):
+        items = self.cve_items(400, 10) * 2
+        created = process_cve_feed(items, self.cve_feed)
+        self.assertEqual(created, 10)
+
+    @mock.patch('threats.tasks.process_threats_with_ai.delay')
+    def test_items_without_an_id_are_skipped(self, delay):
+        items = self.cve_items(400, 10)
+        del items[3]['id']
+        created = process_cve_feed(items, self.cve_feed)
+        self.assertEqual(created, 9)
+
+    @mock.patch('threats.tasks.process_threats_with_ai.delay')
+    def test_failed_bulk_insert_falls_back_to_row_inserts(self, delay):
+        items = self.cve_items(400, 10)
+        with mock.patch.object(Threat.objects, 'bulk_create', side_effect=IntegrityError('bad row')):
+            created = process_cve_feed(items, self.cve_feed)
+        self.assertEqual(created, 10)
+        self.assertTrue(Threat.objects.filter(source=self.cve_feed.name, external_id='cve-feed-409').exists())
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class ThreatExportTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('analyst')
+        seed_threats(250, tags=['seeded'])
+
+    def export(self, **params):
+        view = ThreatViewSet.as_view({'get': 'export'})
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def consume(self, response):
+        self.assertEqual(response.status_code, 200)
+        with self.assertQueryBudget('ThreatViewSet.export'):
+            chunks = list(response.streaming_content)
+        return chunks
+
+    def test_ndjson(self):
+        response = self.export(threat_type='malware')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(self.consume(response)).decode().splitlines()]
+        self.assertEqual(len(rows), Threat.objects.filter(threat_type='malware').count())
+        self.assertEqual(list(rows[0]), get_export_fields(Threat))
+        self.assertTrue(all(row['threat_type'] == 'malware' for row in rows))
+        self.assertEqual(rows[0]['tags'], ['seeded'])
+
+    def test_csv(self):
+        response = self.export(export_format='csv')
+        self.assertIn('.csv"', response['Content-Disposition'])
+        reader = csv.DictReader(io.StringIO(b''.join(self.consume(response)).decode()))
+        rows = list(reader)
+        self.assertEqual(reader.fieldnames, get_export_fields(Threat))
+        self.assertEqual(len(rows), 250)
+        # JSON fields are flattened to JSON text in tabular formats
+        self.assertEqual(json.loads(rows[0]['tags']), ['seeded'])
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        response = self.export(export_format='parquet', severity_min=7)
+        table = pq.read_table(io.BytesIO(b''.join(self.consume(response))))
+        self.assertEqual(table.num_rows, Threat.objects.filter(severity__gte=7).count())
+        self.assertEqual(table.schema.names, get_export_fields(Threat))
+        self.assertEqual(str(table.schema.field('severity').type), 'int64')
+
+    @override_settings(EXPORT_CHUNK_SIZE=40)
+    def test_rows_are_fetched_in_chunks(self):
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=QuerySet.iterator) as iterator:
+            chunks = self.consume(self.export())
+        iterator.assert_called_once_with(mock.ANY, chunk_size=40)
+        self.assertEqual(len(b''.join(chunks).splitlines()), 250)
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+    @override_settings(EXPORT_CHUNK_SIZE=40)
+    def test_parquet_is_streamed_one_row_group_at_a_time(self):
+        import pyarrow.parquet as pq
+
+        chunks = self.consume(self.export(export_format='parquet'))
+        # Six full row groups flushed as they fill, then the last one with the footer
+        self.assertEqual(len(chunks), 7)
+        parquet_file = pq.ParquetFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 7)
+        self.assertEqual(parquet_file.metadata.num_rows, 250)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertNumQueries(0):
+            response = self.export(export_format='xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('xlsx', response.data['error'])
+
+        with self.assertRaises(ExportFormatError):
+            stream_export(Threat.objects.all(), 'xml')
+
+    def test_parquet_without_pyarrow_is_rejected(self):
+        with mock.patch.dict(sys.modules, {'pyarrow': None}):
+            response = self.export(export_format='parquet')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pyarrow', response.data['error'])
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'threats.csv')
+            call_command(
+                'export_threat_data', 'threats', '--format', 'csv', '--output', path,
+                '--chunk-size', '25', '--filter', 'threat_type=phishing', stderr=io.StringIO()
+            )
+            with open(path, newline='') as output:
+                rows = list(csv.DictReader(output))
+        self.assertEqual(len(rows), Threat.objects.filter(threat_type='phishing').count())
+
+        with self.assertRaises(CommandError):
+            call_command('export_threat_data', 'threats', '--filter', 'severity_min')
+
+@override_settings(LIVE_UPDATES_ENABLED=False)
+class ThreatBulkEndpointTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('analyst')
+
+    def payload(self, n, **overrides):
+        item = {
+            'source': 'bulk-api',
+            'threat_type': 'phishing',
+            'severity': 6,
+            'title': f'Bulk threat {n}',
+            'description': f'Bulk threat {n} submitted through the API',
+            'date_detected': timezone.now().isoformat(),
+            'external_id': f'bulk-api-{n}',
+            'tags': ['bulk'],
+        }
+        item.update(overrides)
+        return item
+
+    def post(self, action, data, user=None, **kwargs):
+        view = ThreatViewSet.as_view({'post': action})
+        request = APIRequestFactory().post('/', data, **kwargs)
+        force_authenticate(request, user=user or self.user)
+        return view(request)
+
+    def bulk_create(self, data, **kwargs):
+        with mock.patch('threats.views.enqueue_ai_processing') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertQueryBudget('ThreatViewSet.bulk_create'):
+                    response = self.post('bulk_create', data, **kwargs)
+                # AI processing waits for the commit, so workers can see the rows
+                enqueue.assert_not_called()
+        return response, enqueue
+
+    def test_json_array(self):
+        response, enqueue = self.bulk_create([self.payload(n) for n in range(3)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(sorted(ids), sorted(Threat.objects.filter(source='bulk-api').values_list('id', flat=True)))
+        enqueue.assert_called_once_with(ids)
+
+    def test_wrapped_threats_object(self):
+        response, enqueue = self.bulk_create({'threats': [self.payload(n) for n in range(2)]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 1])
+        self.assertEqual(Threat.objects.get(external_id='bulk-api-1').tags, ['bulk'])
+        enqueue.assert_called_once()
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(self.payload(n)) for n in range(4)) + '\n\n'
+        response, enqueue = self.bulk_create(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(Threat.objects.filter(source='bulk-api').count(), 4)
+
+    def test_invalid_ndjson_line_is_rejected(self):
+        body = json.dumps(self.payload(0)) + '\n{"title": \n'
+        response = self.post('bulk_create', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid JSON on line 2')
+        self.assertFalse(Threat.objects.exists())
+
+    def test_errors_are_reported_per_index(self):
+        items = [self.payload(0), self.payload(1, severity='high'), self.payload(2), {'title': 'No source'}]
+        response, enqueue = self.bulk_create(items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 2])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertIn('severity', response.data['errors'][0]['errors'])
+        self.assertIn('source', response.data['errors'][1]['errors'])
+        enqueue.assert_called_once_with([result['id'] for result in response.data['results']])
+
+    def test_nothing_valid_is_a_bad_request(self):
+        response, _ = self.bulk_create([{'title': 'No source'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['created'], response.data['failed']), (0, 1))
+        self.assertFalse(Threat.objects.exists())
+
+    def test_payload_must_be_a_list(self):
+        response = self.post('bulk_create', self.payload(0), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(THREAT_BULK_MAX_ITEMS=2)
+    def test_item_limit(self):
+        response = self.post('bulk_create', [self.payload(n) for n in range(3)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Threat.objects.exists())
+
+    def test_viewers_cannot_bulk_create(self):
+        response = self.post('bulk_create', [self.payload(0)], user=create_user('viewer'), format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_update(self):
+        threats = seed_threats(5, source='bulk-api', is_false_positive=False)
+        ids = [threat.id for threat in threats[:3]]
+        with mock.patch('threats.views.publish_live_event') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertQueryBudget('ThreatViewSet.bulk_update'):
+                    response = self.post('bulk_update', {'ids': ids, 'is_false_positive': True}, format='json')
+                publish.assert_not_called()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            sorted(Threat.objects.filter(is_false_positive=True).values_list('id', flat=True)), sorted(ids)
+        )
+        event, data = publish.call_args.args
+        self.assertEqual(event, 'threats_bulk_updated')
+        self.assertEqual(data['ids'], ids)
+        self.assertIs(data['changes']['is_false_positive'], True)
+
+    def test_bulk_update_needs_a_change(self):
+        response = self.post('bulk_update', {'ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class ResponseSuggestionTests(SimpleTestCase):
+    def test_suggestions_are_shared_prerendered_text(self):
+        processor = ThreatAIProcessor()
+        critical = processor._generate_response_suggestion(Threat(severity=9), 'ransomware')
+        self.assertTrue(critical.startswith("• URGENT: This is a critical threat requiring immediate attention\n"))
+        self.assertIn("• Do not pay ransom - contact law enforcement", critical)
+        self.assertIs(critical, processor._generate_response_suggestion(Threat(severity=8), 'ransomware'))
+
+    def test_unknown_classification_uses_generic_suggestions(self):
+        processor = ThreatAIProcessor()
+        suggestion = processor._generate_response_suggestion(Threat(severity=6), 'unknown')
+        self.assertEqual(suggestion, processor._generate_response_suggestion(Threat(severity=7), 'generic'))
+        self.assertTrue(suggestion.startswith("• HIGH PRIORITY: Address this threat within 24 hours\n"))
+
+class FeedSchedulingTests(TestCase):
+    def setUp(self):
+        self.feeds = [
+            ThreatFeed.objects.create(
+                name=f'feed-{n}', url=f'https://example.invalid/{n}', feed_type='cve', fetch_interval=60
+            )
+            for n in range(20)
+        ]
+
+    def test_first_schedule_spreads_over_the_interval(self):
+        now = timezone.now()
+        offsets = [feed.schedule_next_fetch(now) - now for feed in self.feeds]
+        self.assertTrue(all(timedelta(0) <= offset < timedelta(minutes=60) for offset in offsets))
+        # Not clustered within the +/-10% jitter around one interval
+        self.assertTrue(any(offset < timedelta(minutes=54) for offset in offsets))
+
+    @mock.patch('threats.tasks.fetch_and_dispatch_feeds')
+    def test_due_feeds_are_claimed_once(self, dispatch):
+        fetch_threat_feeds()
+        fetch_threat_feeds()
+        self.assertEqual(len(dispatch.call_args_list[0].args[0]), 20)
+        self.assertEqual(dispatch.call_args_list[1].args[0], [])
+
+    @mock.patch('threats.tasks.ingest_feed_chunk.delay')
+    def test_fast_feed_is_queued_before_a_slow_one_finishes(self, ingest):
+        slow, fast = self.feeds[:2]
+        queued_while_slow_pending = []
+
+        async def fake_fetch(fetcher, client, feed):
+            if feed == slow:
+                await asyncio.sleep(0.5)
+                queued_while_slow_pending.append(ingest.call_count)
+            return feed, [{'id': f'CVE-{feed.id}'}], None
+
+        with mock.patch.object(AsyncFeedFetcher, '_fetch', fake_fetch):
+            fetch_and_dispatch_feeds([slow, fast])
+
+        self.assertEqual([call.args[0] for call in ingest.call_args_list], [fast.id, slow.id])
+        self.assertEqual(queued_while_slow_pending, [1])
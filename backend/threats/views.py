@@ -3,18 +3,23 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
+import json
 
 from .models import Threat, ThreatFeed
 from .serializers import (
     ThreatSerializer, ThreatCreateSerializer, ThreatUpdateSerializer,
-    ThreatFeedSerializer, ThreatStatsSerializer
+    ThreatBulkUpdateSerializer, ThreatFeedSerializer, ThreatStatsSerializer
 )
 from .filters import ThreatFilter
+from .exporters import ExportFormatError, export_response
 from accounts.permissions import IsAdminOrAnalyst
-from .tasks import process_threat_with_ai
+from analytics.live import publish_live_event
+from .tasks import process_threat_with_ai, enqueue_ai_processing
 
 class ThreatViewSet(viewsets.ModelViewSet):
     queryset = Threat.objects.all()
@@ -33,7 +38,7 @@ class ThreatViewSet(viewsets.ModelViewSet):
         return ThreatSerializer
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk_create', 'bulk_update']:
             return [IsAuthenticated(), IsAdminOrAnalyst()]
         return [IsAuthenticated()]
     
@@ -42,6 +47,96 @@ class ThreatViewSet(viewsets.ModelViewSet):
         # Trigger AI processing asynchronously
         process_threat_with_ai.delay(threat.id)
     
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        """Create many threats from a JSON array or NDJSON body in one insert"""
+        try:
+            items = self._parse_bulk_payload(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_items = settings.THREAT_BULK_MAX_ITEMS
+        if len(items) > max_items:
+            return Response(
+                {'error': f'At most {max_items} threats can be created per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Validate every item, keeping track of its position in the payload
+        threats = []
+        positions = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = ThreatCreateSerializer(data=item)
+            if serializer.is_valid():
+                threats.append(Threat(**serializer.validated_data))
+                positions.append(index)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        with transaction.atomic():
+            created = Threat.objects.bulk_create(threats, batch_size=500)
+            # Trigger AI processing in batches once the rows are visible to workers
+            created_ids = [threat.id for threat in created if threat.id is not None]
+            transaction.on_commit(lambda: enqueue_ai_processing(created_ids))
+            # bulk_create skips post_save, so notify live dashboards explicitly
+            transaction.on_commit(
+                lambda: publish_live_event('threats_bulk_created', {'ids': created_ids})
+            )
+        
+        results = [
+            {'index': index, 'id': threat.id}
+            for index, threat in zip(positions, created)
+        ]
+        
+        return Response(
+            {
+                'created': len(created),
+                'failed': len(errors),
+                'results': results,
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        """Set is_active/is_false_positive on many threats with one UPDATE"""
+        serializer = ThreatBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        changes = dict(serializer.validated_data)
+        ids = changes.pop('ids')
+        # QuerySet.update() skips auto_now, so bump updated_at explicitly
+        changes['updated_at'] = timezone.now()
+        
+        with transaction.atomic():
+            updated = self.get_queryset().filter(id__in=ids).update(**changes)
+            transaction.on_commit(
+                lambda: publish_live_event('threats_bulk_updated', {'ids': ids, 'changes': changes})
+            )
+        return Response({'updated': updated})
+    
+    def _parse_bulk_payload(self, request):
+        """Return the list of threat payloads from a JSON array or NDJSON body"""
+        if request.content_type.startswith('application/x-ndjson'):
+            items = []
+            for line_number, line in enumerate(request.body.decode('utf-8').splitlines(), 1):
+                if not line.strip():
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    raise ValueError(f'Invalid JSON on line {line_number}')
+            return items
+        
+        data = request.data
+        if isinstance(data, dict) and 'threats' in data:
+            data = data['threats']
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array of threats')
+        return data
+    
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         """Get dashboard statistics for threats"""
@@ -49,17 +144,13 @@ class ThreatViewSet(viewsets.ModelViewSet):
         last_24h = now - timedelta(hours=24)
         last_7d = now - timedelta(days=7)
         
-        # Basic counts
-        total_threats = Threat.objects.filter(is_active=True).count()
-        active_threats = Threat.objects.filter(
-            is_active=True, 
-            is_false_positive=False
-        ).count()
-        high_risk_threats = Threat.objects.filter(
-            is_active=True,
-            is_false_positive=False,
-            risk_score__gte=7
-        ).count()
+        # Basic counts in a single aggregate query
+        counts = Threat.objects.filter(is_active=True).aggregate(
+            total_threats=Count('id'),
+            active_threats=Count('id', filter=Q(is_false_positive=False)),
+            high_risk_threats=Count('id', filter=Q(is_false_positive=False, risk_score__gte=7)),
+            recent_threats=Count('id', filter=Q(created_at__gte=last_24h)),
+        )
         
         # Threats by type
         threats_by_type = dict(
@@ -77,19 +168,10 @@ class ThreatViewSet(viewsets.ModelViewSet):
             .values_list('severity', 'count')
         )
         
-        # Recent threats (last 24 hours)
-        recent_threats = Threat.objects.filter(
-            created_at__gte=last_24h,
-            is_active=True
-        ).count()
-        
         stats = {
-            'total_threats': total_threats,
-            'active_threats': active_threats,
-            'high_risk_threats': high_risk_threats,
+            **counts,
             'threats_by_type': threats_by_type,
             'threats_by_severity': threats_by_severity,
-            'recent_threats': recent_threats,
         }
         
         serializer = ThreatStatsSerializer(stats)
@@ -112,6 +194,17 @@ class ThreatViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(high_risk_threats, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all threats matching the current filters as NDJSON, CSV or Parquet"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        try:
+            return export_response(queryset, export_format, 'threats')
+        except ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['post'])
     def mark_false_positive(self, request, pk=None):
         """Mark a threat as false positive"""
@@ -132,10 +225,21 @@ class ThreatFeedViewSet(viewsets.ModelViewSet):
     serializer_class = ThreatFeedSerializer
     permission_classes = [IsAuthenticated, IsAdminOrAnalyst]
     
+    def perform_update(self, serializer):
+        previous_interval = serializer.instance.fetch_interval
+        feed = serializer.save()
+        # Re-plan the next fetch when the interval changes
+        if feed.fetch_interval != previous_interval:
+            feed.schedule_next_fetch(feed.last_fetched)
+            feed.save(update_fields=['next_fetch_at'])
+    
     @action(detail=True, methods=['post'])
     def fetch_now(self, request, pk=None):
         """Manually trigger feed fetch"""
         feed = self.get_object()
+        # The manual fetch counts as this interval's fetch
+        feed.schedule_next_fetch()
+        feed.save(update_fields=['next_fetch_at'])
         from .tasks import fetch_single_threat_feed
         fetch_single_threat_feed.delay(feed.id)
         return Response({'message': f'Feed {feed.name} fetch triggered'})
\ No newline at end of file
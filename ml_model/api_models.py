@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
 class CountryEnum(str, Enum):
@@ -76,14 +77,46 @@ class ThreatPredictionRequest(BaseModel):
             }
         }
 
+def request_to_record(request: ThreatPredictionRequest) -> Dict:
+    """Convert API request to dictionary format expected by preprocessor"""
+    return {
+        'Country': request.country.value,
+        'Year': request.year,
+        'Attack Type': request.attack_type.value,
+        'Target Industry': request.target_industry.value,
+        'Financial Loss (in Million $)': request.financial_loss,
+        'Number of Affected Users': request.affected_users,
+        'Attack Source': request.attack_source.value,
+        'Security Vulnerability Type': request.vulnerability_type.value,
+        'Defense Mechanism Used': request.defense_mechanism.value
+    }
+
 class ThreatPredictionResponse(BaseModel):
     predicted_resolution_time: float = Field(..., description="Predicted incident resolution time in hours")
     confidence_interval: dict = Field(..., description="95% confidence interval for the prediction")
     risk_level: str = Field(..., description="Risk level based on predicted resolution time")
-    recommendations: list = Field(..., description="Recommended actions based on the threat profile")
+    recommendations: Tuple[str, ...] = Field(..., description="Recommended actions based on the threat profile")
     model_used: str = Field(..., description="Name of the ML model used for prediction")
 
+class BatchPredictionRequest(BaseModel):
+    items: List[ThreatPredictionRequest] = Field(..., min_length=1, max_length=1000, description="Threats to predict in one call")
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[ThreatPredictionResponse] = Field(..., description="Predictions in the same order as the request items")
+
+class ModelReloadRequest(BaseModel):
+    version: Optional[str] = Field(None, description="Registry version to load; defaults to the registry's current version")
+
 class HealthResponse(BaseModel):
     status: str
     message: str
-    model_loaded: bool
\ No newline at end of file
+    model_loaded: bool
+
+class TrainingRow(ThreatPredictionRequest):
+    resolution_time_hours: float = Field(..., ge=0, description="Observed resolution time (resolved_at - created_at) in hours")
+    source: str = Field(..., description="Kind of record the row was exported from, e.g. alert or incident")
+    record_id: int = Field(..., description="Primary key of the record in the source system")
+    resolved_at: datetime = Field(..., description="When the record was resolved (UTC)")
+
+class TrainingDataRequest(BaseModel):
+    rows: List[TrainingRow] = Field(..., min_length=1, max_length=5000, description="Labeled rows to append")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Load-test and latency benchmark for the threat prediction API
+
+Drives the FastAPI app in-process (ASGI transport) or a running server over
+HTTP, then micro-benchmarks preprocessing and model inference on their own.
+Exits with status 1 if the service's inference path is slower than the
+estimator's own predict by more than --max-slowdown.
+
+    python benchmark_api.py --mode inprocess --requests 2000 --concurrency 32
+    python benchmark_api.py --mode http --url http://localhost:8000 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import httpx
+import joblib
+
+from api_models import (
+    CountryEnum, AttackTypeEnum, TargetIndustryEnum, AttackSourceEnum,
+    VulnerabilityTypeEnum, DefenseMechanismEnum, request_to_record
+)
+
+def generate_request(rng):
+    """Random prediction payload drawn from the enum spaces in api_models.py"""
+    return {
+        "country": rng.choice(list(CountryEnum)).value,
+        "year": rng.randint(2015, 2030),
+        "attack_type": rng.choice(list(AttackTypeEnum)).value,
+        "target_industry": rng.choice(list(TargetIndustryEnum)).value,
+        "financial_loss": round(rng.uniform(0.5, 100.0), 2),
+        "affected_users": rng.randint(0, 1_000_000),
+        "attack_source": rng.choice(list(AttackSourceEnum)).value,
+        "vulnerability_type": rng.choice(list(VulnerabilityTypeEnum)).value,
+        "defense_mechanism": rng.choice(list(DefenseMechanismEnum)).value,
+    }
+
+def summarize(latencies, elapsed, items_per_request=1):
+    """Latency percentiles (ms) and throughput for one scenario"""
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+    else:
+        quantiles = latencies * 99
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "throughput_items_per_s": round(len(latencies) * items_per_request / elapsed, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
+
+async def run_load(client, path, payloads, concurrency, items_per_request=1):
+    """Send every payload to path with at most `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one_request(payload):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors += 1
+            return elapsed
+
+    # Warm up connection pools and lazy initialisation
+    await one_request(payloads[0])
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one_request(payload) for payload in payloads))
+    result = summarize(latencies, time.perf_counter() - start, items_per_request)
+    result["errors"] = errors
+    return result
+
+async def run_api_benchmarks(client, args, rng):
+    results = {}
+
+    single_payloads = [generate_request(rng) for _ in range(args.requests)]
+    results["predict"] = await run_load(client, "/predict", single_payloads, args.concurrency)
+
+    batch_payloads = [
+        {"items": [generate_request(rng) for _ in range(args.batch_size)]}
+        for _ in range(max(1, args.requests // args.batch_size))
+    ]
+    probe = await client.post("/predict/batch", json=batch_payloads[0])
+    if probe.status_code == 404:
+        results["predict_batch"] = None
+    else:
+        results["predict_batch"] = await run_load(
+            client, "/predict/batch", batch_payloads, args.concurrency, args.batch_size
+        )
+        results["predict_batch"]["batch_size"] = args.batch_size
+
+    return results
+
+def time_call(func, repeat):
+    """Per-call latency percentiles of a synchronous function"""
+    func()  # warm-up
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call_start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+def run_micro_benchmarks(service, args, rng):
+    """Time preprocessing and model inference without the HTTP stack"""
+    from api_models import ThreatPredictionRequest
+
+    single = ThreatPredictionRequest(**generate_request(rng))
+    single_record = request_to_record(single)
+    batch_records = [
+        request_to_record(ThreatPredictionRequest(**generate_request(rng)))
+        for _ in range(args.batch_size)
+    ]
+    X_single = service.preprocessor.transform_new_data(single_record)
+    X_batch = service.preprocessor.transform_new_data(batch_records)
+
+    loaded = service._active
+    # The service drops the estimator when compiled arrays serve; load it for the baseline
+    estimator = loaded.model if loaded.model is not None else joblib.load(loaded.source)
+    results = {
+        "transform_new_data_single": time_call(
+            lambda: service.preprocessor.transform_new_data(single_record), args.micro_repeat
+        ),
+        "transform_new_data_batch": time_call(
+            lambda: service.preprocessor.transform_new_data(batch_records), args.micro_repeat
+        ),
+        "model_predict_single": time_call(lambda: estimator.predict(X_single), args.micro_repeat),
+        "model_predict_batch": time_call(lambda: estimator.predict(X_batch), args.micro_repeat),
+        # Whatever path the service serves with (compiled arrays or the estimator)
+        "inference_single": time_call(lambda: loaded.predict(X_single), args.micro_repeat),
+        "inference_batch": time_call(lambda: loaded.predict(X_batch), args.micro_repeat),
+        "service_predict_single": time_call(lambda: service.predict(single), args.micro_repeat),
+        # Point estimate plus bounds on the served path
+        "interval_batch": time_call(lambda: loaded.predict_with_interval(X_batch), args.micro_repeat),
+    }
+    results["interval_batch"]["interval_method"] = loaded.interval_method
+    for size in ("single", "batch"):
+        results[f"inference_{size}"]["vs_model_predict"] = round(
+            results[f"inference_{size}"]["mean_ms"] / results[f"model_predict_{size}"]["mean_ms"], 3
+        )
+
+    # Compiled arrays are timed even when not served, to show whether enabling them would pay off
+    from compiled_trees import compile_ensemble
+    compiled = loaded.compiled if loaded.compiled is not None else compile_ensemble(estimator)
+    if compiled is not None:
+        results["compiled_predict_single"] = time_call(lambda: compiled.predict(X_single), args.micro_repeat)
+        results["compiled_predict_batch"] = time_call(lambda: compiled.predict(X_batch), args.micro_repeat)
+        results["compiled_predict_batch"]["batch_size"] = args.batch_size
+        for size in ("single", "batch"):
+            results[f"compiled_predict_{size}"]["vs_model_predict"] = round(
+                results[f"compiled_predict_{size}"]["mean_ms"] / results[f"model_predict_{size}"]["mean_ms"], 3
+            )
+        if compiled.has_interval:
+            results["compiled_interval_batch"] = time_call(
+                lambda: compiled.predict_with_interval(X_batch), args.micro_repeat
+            )
+    # Interval cost relative to a plain model.predict of the same batch
+    for name in ("interval_batch", "compiled_interval_batch"):
+        if name in results:
+            results[name]["overhead_vs_model_predict"] = round(
+                results[name]["mean_ms"] / results["model_predict_batch"]["mean_ms"], 3
+            )
+    for name in ("transform_new_data_batch", "model_predict_batch", "inference_batch",
+                 "interval_batch", "compiled_interval_batch"):
+        if name in results:
+            results[name]["batch_size"] = args.batch_size
+    return results
+
+def find_regressions(micro, max_slowdown):
+    """Inference scenarios where the served path is slower than model.predict beyond max_slowdown"""
+    regressions = []
+    for size in ("single", "batch"):
+        served, baseline = micro[f"inference_{size}"], micro[f"model_predict_{size}"]
+        if served["vs_model_predict"] > 1 + max_slowdown:
+            regressions.append(f"inference_{size}: {served['mean_ms']} ms vs model.predict {baseline['mean_ms']} ms")
+    return regressions
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    report = {
+        "benchmark": "ml_api",
+        "mode": args.mode,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+
+    if args.mode == "inprocess":
+        import main
+        from prediction_service import ThreatPredictionService
+
+        # ASGITransport does not run the lifespan handler, so load the model here
+        service = ThreatPredictionService()
+        main.prediction_service = service
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://benchmark")
+    else:
+        service = None
+        limits = httpx.Limits(max_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+
+    async with client:
+        report["api"] = await run_api_benchmarks(client, args, rng)
+
+    if args.micro:
+        if service is None:
+            from prediction_service import ThreatPredictionService
+            service = ThreatPredictionService()
+        # Measure the uncached path
+        service.cache_size = 0
+        service._cache.clear()
+        if service.is_loaded:
+            report["micro"] = run_micro_benchmarks(service, args, rng)
+            report["regressions"] = find_regressions(report["micro"], args.max_slowdown)
+
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server URL for --mode http")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--micro-repeat", type=int, default=500)
+    parser.add_argument("--no-micro", dest="micro", action="store_false",
+                        help="Skip the preprocessing/inference micro-benchmarks")
+    parser.add_argument("--max-slowdown", type=float, default=0.1,
+                        help="Allowed relative slowdown of the served inference path against model.predict")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(output)
+    if report.get("regressions"):
+        print("Inference regressions against model.predict:\n" + "\n".join(report["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the threat prediction API
+
+Starts fresh server processes and measures how long each takes to import the
+app, to answer /health (status "warming") and to finish loading the model.
+It also lists the heavy libraries that importing the app pulls in, which
+should never include plotting or training code.
+
+With --workers, it also starts `uvicorn --workers N` for each N, with and
+without compiled inference, and sums the resident (RSS) and proportional
+(PSS, shared pages split between processes) memory of the server's
+processes once the model is loaded (Linux only).
+
+    python benchmark_startup.py --runs 5
+    python benchmark_startup.py --workers 1 2 4 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("numpy", "pandas", "sklearn", "xgboost", "joblib", "matplotlib", "seaborn", "model_training")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import():
+    """Seconds to import the app in a fresh interpreter, and the heavy modules it loaded"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE % (HEAVY_MODULES,)],
+        check=True, capture_output=True, text=True, cwd=APP_DIR
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_server(timeout):
+    """Seconds from process launch to the first /health answer and to a loaded model"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env={**os.environ, "MODEL_WATCH_INTERVAL": "0"}, cwd=APP_DIR
+    )
+    result = {"first_response_s": None, "ready_s": None, "first_status": None, "final_status": None}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    health = client.get("/health").json()
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+                elapsed = time.perf_counter() - start
+                if result["first_response_s"] is None:
+                    result["first_response_s"] = round(elapsed, 3)
+                    result["first_status"] = health["status"]
+                result["final_status"] = health["status"]
+                if health["status"] != "warming":
+                    result["ready_s"] = round(elapsed, 3)
+                    break
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+def process_tree(pid):
+    """pid and all of its descendants"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return [pid]
+    return [pid] + [descendant for child in children for descendant in process_tree(child)]
+
+def process_memory_kb(pid):
+    """Rss and Pss of one process in kB (zero if it has exited)"""
+    memory = {"Rss": 0, "Pss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in memory:
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+def measure_memory(workers, compiled, timeout):
+    """Total RSS and PSS (MB) of a `uvicorn --workers N` server after its workers have loaded the model"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, "MODEL_WATCH_INTERVAL": "0", "MODEL_COMPILED_INFERENCE": "1" if compiled else "0"},
+        cwd=APP_DIR
+    )
+    start = time.perf_counter()
+    ready_responses = 0
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            # Requests land on arbitrary workers; many ready answers in a row means all have loaded
+            while ready_responses < 10 * workers and time.perf_counter() - start < timeout:
+                try:
+                    status = client.get("/health").json()["status"]
+                except httpx.TransportError:
+                    status = None
+                ready_responses = ready_responses + 1 if status not in (None, "warming") else 0
+                time.sleep(0.01)
+        memory = [process_memory_kb(pid) for pid in process_tree(server.pid)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "workers": workers,
+        "compiled_inference": compiled,
+        "ready": ready_responses >= 10 * workers,
+        "rss_mb": round(sum(m["Rss"] for m in memory) / 1024, 1),
+        "pss_mb": round(sum(m["Pss"] for m in memory) / 1024, 1),
+    }
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "median_s": round(statistics.median(values), 3),
+        "min_s": round(min(values), 3),
+        "max_s": round(max(values), 3),
+    }
+
+def run(args):
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_server(args.timeout) for _ in range(args.runs)]
+    report = {
+        "benchmark": "ml_api_startup",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "import_app": summarize([probe["seconds"] for probe in imports]),
+        "heavy_modules_imported": imports[0]["modules"],
+        "first_health_response": summarize([server["first_response_s"] for server in servers]),
+        "model_ready": summarize([server["ready_s"] for server in servers]),
+        "servers": servers,
+    }
+    if args.workers:
+        report["memory"] = [
+            measure_memory(workers, compiled, args.timeout)
+            for compiled in (False, True)
+            for workers in args.workers
+        ]
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for each server to become ready")
+    parser.add_argument("--workers", type=int, nargs="*", default=[],
+                        help="Worker counts to measure server memory for, e.g. --workers 1 2 4")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    output = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Compiled tree-ensemble inference
+
+Flattens every tree of a fitted ensemble into contiguous NumPy node arrays
+(feature, threshold, left, right, value) and evaluates all trees for a
+whole batch with vectorized array indexing. Predictions are bit-identical
+to the original estimator: inputs are cast to float32 and split/accumulate
+order follows scikit-learn and XGBoost exactly.
+
+Supported: DecisionTreeRegressor, RandomForestRegressor, ExtraTreesRegressor,
+GradientBoostingRegressor and XGBRegressor (gbtree, identity-link objectives).
+
+Prediction intervals come from the same traversal: forests use the spread
+of their per-tree predictions, boosted models get lower/upper quantile
+models whose trees are stacked after the point model's trees.
+"""
+
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "value", "default_left", "roots")
+META_FILENAME = "meta.json"
+
+# XGBoost objectives whose prediction is the raw margin
+XGB_IDENTITY_OBJECTIVES = {"reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror"}
+
+# Central coverage of prediction intervals
+DEFAULT_COVERAGE = 0.95
+
+class CompiledTreeEnsemble:
+    """
+    All nodes of all trees in flat arrays; leaves point to themselves.
+
+    aggregation is "mean" (random forests), "boosting" (scikit-learn GBM:
+    base + scale * sum, in float64) or "xgboost" (base + sum, in float32).
+    The first point_trees trees are the model; bounds maps "lower"/"upper"
+    to the tree range and base/scale of a stacked quantile model.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots,
+                 n_features: int, max_depth: int, aggregation: str,
+                 base_score: float = 0.0, scale: float = 1.0, source: str = "",
+                 point_trees: Optional[int] = None, bounds: Optional[Dict] = None,
+                 coverage: float = DEFAULT_COVERAGE):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.default_left = default_left
+        self.roots = roots
+        self.n_features = n_features
+        self.max_depth = max_depth
+        self.aggregation = aggregation
+        self.base_score = base_score
+        self.scale = scale
+        self.source = source
+        self.point_trees = len(roots) if point_trees is None else point_trees
+        self.bounds = bounds or {}
+        self.coverage = coverage
+
+    @property
+    def n_trees(self) -> int:
+        return self.point_trees
+
+    @property
+    def has_interval(self) -> bool:
+        return bool(self.bounds) or self.aggregation == "mean"
+
+    def leaf_values(self, X, n_trees: Optional[int] = None) -> np.ndarray:
+        """Leaf values of the first n_trees trees (default: all) for every row, shape (trees, rows)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        roots = np.asarray(self.roots[:n_trees])
+        nodes = np.repeat(roots[:, None], X.shape[0], axis=1)
+
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            if self.aggregation == "xgboost":
+                # XGBoost: strict float32 comparison, NaN follows the default branch
+                go_left = x < self.threshold[nodes]
+                missing = np.isnan(x)
+                if missing.any():
+                    go_left = np.where(missing, self.default_left[nodes], go_left)
+            else:
+                # scikit-learn: float32 input compared against float64 thresholds
+                go_left = x <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes]
+
+    def predict(self, X) -> np.ndarray:
+        return self.aggregate(self.leaf_values(X, self.point_trees))
+
+    def predict_with_interval(self, X) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """Point prediction (identical to predict) and interval bounds from one traversal"""
+        leaf_values = self.leaf_values(X)
+        point_values = leaf_values[:self.point_trees]
+        point = self.aggregate(point_values)
+
+        if self.bounds:
+            lower, upper = (
+                self.aggregate(
+                    leaf_values[slice(*self.bounds[name]["trees"])],
+                    self.bounds[name]["base_score"], self.bounds[name]["scale"]
+                )
+                for name in ("lower", "upper")
+            )
+        elif self.aggregation == "mean":
+            tail = (1 - self.coverage) / 2
+            lower, upper = np.quantile(point_values, [tail, 1 - tail], axis=0)
+        else:
+            return point, None, None
+
+        # Independently fitted quantile models can cross the point estimate
+        return point, np.minimum(lower, point), np.maximum(upper, point)
+
+    def aggregate(self, leaf_values: np.ndarray, base_score: Optional[float] = None,
+                  scale: Optional[float] = None) -> np.ndarray:
+        """Combine per-tree values in the estimator's own order and precision"""
+        base_score = self.base_score if base_score is None else base_score
+        scale = self.scale if scale is None else scale
+        n_rows = leaf_values.shape[1]
+        if self.aggregation == "mean":
+            out = np.zeros(n_rows, dtype=np.float64)
+            for tree_values in leaf_values:
+                out += tree_values
+            out /= len(leaf_values)
+        elif self.aggregation == "boosting":
+            out = np.full(n_rows, base_score, dtype=np.float64)
+            for tree_values in leaf_values:
+                out += scale * tree_values
+        else:
+            out = np.full(n_rows, base_score, dtype=np.float32)
+            for tree_values in leaf_values:
+                out += tree_values
+        return out
+
+    def with_bounds(self, lower: "CompiledTreeEnsemble", upper: "CompiledTreeEnsemble",
+                    coverage: float = DEFAULT_COVERAGE) -> "CompiledTreeEnsemble":
+        """This model with quantile models' trees stacked after its own, for one-pass intervals"""
+        parts = [self, lower, upper]
+        if len({part.aggregation for part in parts}) != 1:
+            raise ValueError("Interval models must be the same kind of ensemble as the point model")
+        node_offsets = np.cumsum([0] + [len(part.feature) for part in parts[:-1]])
+        tree_offsets = np.cumsum([0] + [len(part.roots) for part in parts])
+        return CompiledTreeEnsemble(
+            feature=np.concatenate([part.feature for part in parts]),
+            threshold=np.concatenate([part.threshold for part in parts]),
+            left=np.concatenate([part.left + offset for part, offset in zip(parts, node_offsets)]).astype(np.int32),
+            right=np.concatenate([part.right + offset for part, offset in zip(parts, node_offsets)]).astype(np.int32),
+            value=np.concatenate([part.value for part in parts]),
+            default_left=np.concatenate([part.default_left for part in parts]),
+            roots=np.concatenate([part.roots + offset for part, offset in zip(parts, node_offsets)]).astype(np.int32),
+            n_features=self.n_features,
+            max_depth=max(part.max_depth for part in parts),
+            aggregation=self.aggregation,
+            base_score=self.base_score,
+            scale=self.scale,
+            source=self.source,
+            point_trees=self.point_trees,
+            bounds={
+                name: {
+                    "trees": [int(tree_offsets[i]), int(tree_offsets[i + 1])],
+                    "base_score": part.base_score,
+                    "scale": part.scale,
+                }
+                for i, (name, part) in enumerate((("lower", lower), ("upper", upper)), start=1)
+            },
+            coverage=coverage,
+        )
+
+    def save(self, directory: str):
+        """Write one uncompressed .npy per array so loads can be memory-mapped"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        meta = {
+            "n_features": self.n_features,
+            "max_depth": self.max_depth,
+            "aggregation": self.aggregation,
+            "base_score": self.base_score,
+            "scale": self.scale,
+            "source": self.source,
+            "point_trees": self.point_trees,
+            "bounds": self.bounds,
+            "coverage": self.coverage,
+        }
+        with open(os.path.join(directory, META_FILENAME), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "CompiledTreeEnsemble":
+        with open(os.path.join(directory, META_FILENAME)) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        return cls(**arrays, **meta)
+
+def _flatten(trees, value_dtype, threshold_dtype):
+    """
+    Concatenate per-tree node arrays into global ones.
+
+    trees yields (left, right, feature, threshold, value, default_left) with
+    -1 children marking leaves.
+    """
+    parts = {name: [] for name in ARRAY_NAMES if name != "roots"}
+    roots = []
+    max_depth = 0
+    offset = 0
+
+    for left, right, feature, threshold, value, default_left in trees:
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        n_nodes = len(left)
+        index = np.arange(n_nodes)
+        is_leaf = left < 0
+
+        parts["left"].append(np.where(is_leaf, index, left) + offset)
+        parts["right"].append(np.where(is_leaf, index, right) + offset)
+        parts["feature"].append(np.where(is_leaf, 0, feature))
+        parts["threshold"].append(np.where(is_leaf, 0, threshold))
+        parts["value"].append(value)
+        parts["default_left"].append(np.asarray(default_left, dtype=bool))
+        roots.append(offset)
+
+        # Depth of the deepest leaf bounds the number of traversal steps
+        depth = np.zeros(n_nodes, dtype=np.int64)
+        for node in range(n_nodes):
+            if not is_leaf[node]:
+                depth[left[node]] = depth[node] + 1
+                depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += n_nodes
+
+    return {
+        "feature": np.concatenate(parts["feature"]).astype(np.int32),
+        "threshold": np.concatenate(parts["threshold"]).astype(threshold_dtype),
+        "left": np.concatenate(parts["left"]).astype(np.int32),
+        "right": np.concatenate(parts["right"]).astype(np.int32),
+        "value": np.concatenate(parts["value"]).astype(value_dtype),
+        "default_left": np.concatenate(parts["default_left"]),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }, max_depth
+
+def _sklearn_trees(estimators):
+    for estimator in estimators:
+        tree = estimator.tree_
+        yield (
+            tree.children_left, tree.children_right, tree.feature, tree.threshold,
+            tree.value[:, 0, 0], np.zeros(tree.node_count, dtype=bool)
+        )
+
+def _compile_xgboost(model) -> Optional[CompiledTreeEnsemble]:
+    booster = model.get_booster()
+    learner = json.loads(bytes(booster.save_raw("json")))["learner"]
+    gradient_booster = learner["gradient_booster"]
+    if gradient_booster["name"] != "gbtree" or learner["objective"]["name"] not in XGB_IDENTITY_OBJECTIVES:
+        return None
+    if int(learner["learner_model_param"].get("num_target", 1)) != 1:
+        return None
+
+    trees = gradient_booster["model"]["trees"]
+    try:
+        # Early-stopped models predict with the best iteration only
+        parallel = int(gradient_booster["model"]["gbtree_model_param"]["num_parallel_tree"])
+        trees = trees[:(model.best_iteration + 1) * parallel]
+    except (AttributeError, KeyError):
+        pass
+
+    arrays, max_depth = _flatten(
+        (
+            (
+                tree["left_children"], tree["right_children"], tree["split_indices"],
+                # split_conditions holds the leaf value for leaf nodes
+                tree["split_conditions"], tree["split_conditions"], tree["default_left"],
+            )
+            for tree in trees
+        ),
+        value_dtype=np.float32,
+        threshold_dtype=np.float32,
+    )
+    return CompiledTreeEnsemble(
+        **arrays,
+        n_features=int(learner["learner_model_param"]["num_feature"]),
+        max_depth=max_depth,
+        aggregation="xgboost",
+        base_score=float(np.float32(learner["learner_model_param"]["base_score"])),
+        source=type(model).__name__,
+    )
+
+def compile_ensemble(model) -> Optional[CompiledTreeEnsemble]:
+    """Flatten a fitted tree ensemble; None for models this module cannot compile"""
+    from sklearn.ensemble import (
+        ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+    )
+    from sklearn.tree import DecisionTreeRegressor
+
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor, DecisionTreeRegressor)):
+        estimators = model.estimators_ if hasattr(model, "estimators_") else [model]
+        if getattr(model, "n_outputs_", 1) != 1:
+            return None
+        arrays, max_depth = _flatten(
+            _sklearn_trees(estimators), value_dtype=np.float64, threshold_dtype=np.float64
+        )
+        return CompiledTreeEnsemble(
+            **arrays, n_features=model.n_features_in_, max_depth=max_depth,
+            aggregation="mean", source=type(model).__name__,
+        )
+
+    if isinstance(model, GradientBoostingRegressor):
+        if model.init_ == "zero":
+            base_score = 0.0
+        else:
+            base_score = float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+        arrays, max_depth = _flatten(
+            _sklearn_trees(model.estimators_[:, 0]), value_dtype=np.float64, threshold_dtype=np.float64
+        )
+        return CompiledTreeEnsemble(
+            **arrays, n_features=model.n_features_in_, max_depth=max_depth,
+            aggregation="boosting", base_score=base_score, scale=float(model.learning_rate),
+            source=type(model).__name__,
+        )
+
+    try:
+        import xgboost as xgb
+    except ImportError:
+        return None
+    if isinstance(model, xgb.XGBRegressor):
+        return _compile_xgboost(model)
+
+    return None
+
+def fit_quantile_models(model, X, y, coverage: float = DEFAULT_COVERAGE):
+    """(lower, upper) quantile models with the point model's hyperparameters; None if unsupported"""
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    tail = (1 - coverage) / 2
+    params = model.get_params()
+    if isinstance(model, GradientBoostingRegressor):
+        return tuple(
+            GradientBoostingRegressor(**{**params, "loss": "quantile", "alpha": alpha, "warm_start": False}).fit(X, y)
+            for alpha in (tail, 1 - tail)
+        )
+
+    try:
+        import xgboost as xgb
+    except ImportError:
+        return None
+    if isinstance(model, xgb.XGBRegressor):
+        return tuple(
+            xgb.XGBRegressor(**{
+                **params, "objective": "reg:quantileerror", "quantile_alpha": alpha, "early_stopping_rounds": None
+            }).fit(X, y)
+            for alpha in (tail, 1 - tail)
+        )
+    return None
+
+def compile_with_interval(model, quantile_models=None, coverage: float = DEFAULT_COVERAGE) -> Optional[CompiledTreeEnsemble]:
+    """
+    compile_ensemble plus interval support: forests need nothing extra,
+    boosted models get their fitted (lower, upper) quantile models stacked in.
+    """
+    compiled = compile_ensemble(model)
+    if compiled is None or compiled.aggregation == "mean" or quantile_models is None:
+        return compiled
+    lower, upper = (compile_ensemble(quantile_model) for quantile_model in quantile_models)
+    if lower is None or upper is None:
+        return compiled
+    return compiled.with_bounds(lower, upper, coverage)
@@ -1,18 +1,82 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
 import joblib
 
+CATEGORICAL_COLUMNS = [
+    'Country', 'Attack Type', 'Target Industry', 'Attack Source',
+    'Security Vulnerability Type', 'Defense Mechanism Used'
+]
+NUMERICAL_COLUMNS = ['Year', 'Financial Loss (in Million $)', 'Number of Affected Users']
+
+# Prepared data, one directory per source file content; bump the format when preparation changes
+DATA_CACHE_DIR = os.environ.get('DATA_CACHE_DIR', os.path.join('.training_cache', 'data'))
+DATA_CACHE_FORMAT = 2
+CACHE_META_FILENAME = 'meta.json'
+CACHE_PREPROCESSOR_FILENAME = 'preprocessor.joblib'
+
+class CategoryEncoder:
+    """
+    Category -> code lookup with an explicit code for values unseen at fit time.
+    
+    Codes follow the sorted categories (the same codes LabelEncoder assigns).
+    Unseen values get unknown_code, the code of the most frequent training
+    category, chosen at fit time; nothing raises while serving.
+    """
+    
+    def __init__(self, categories, unknown_code=0):
+        self.categories = pd.Index(categories)
+        self.unknown_code = int(unknown_code)
+        self.codes = {category: code for code, category in enumerate(self.categories)}
+    
+    @classmethod
+    def fit(cls, values):
+        """Encoder for the observed values (strings or a categorical Series)"""
+        values = pd.Series(values).astype(str).astype('category')
+        codes = values.cat.codes.to_numpy()
+        return cls(values.cat.categories, unknown_code=np.bincount(codes).argmax() if len(codes) else 0)
+    
+    def transform(self, values) -> np.ndarray:
+        """Codes for a batch of values in one vectorized hash lookup"""
+        codes = pd.Categorical(np.asarray(values, dtype=object).astype(str), categories=self.categories).codes
+        return np.where(codes < 0, self.unknown_code, codes).astype(np.int64)
+    
+    def encode(self, value) -> int:
+        """Code for a single value"""
+        return self.codes.get(str(value), self.unknown_code)
+    
+    def to_dict(self):
+        return {'categories': self.categories.tolist(), 'unknown_code': self.unknown_code}
+    
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['categories'], state['unknown_code'])
+
 class ThreatDataPreprocessor:
     def __init__(self):
-        self.label_encoders = {}
+        self.category_encoders = {}
         self.scaler = StandardScaler()
         self.feature_columns = []
         self.target_column = 'Incident Resolution Time (in Hours)'
         
-    def load_and_preprocess_data(self, file_path):
+    def load_and_preprocess_data(self, file_path, cache_dir=DATA_CACHE_DIR):
         """Load and preprocess the cybersecurity threat data"""
+        cache_path = self._cache_path(file_path, cache_dir) if cache_dir else None
+        if cache_path and os.path.exists(os.path.join(cache_path, CACHE_META_FILENAME)):
+            try:
+                start = time.perf_counter()
+                X_scaled, y, df = self._load_cache(cache_path)
+                print(f"Loaded prepared data from {cache_path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+                return X_scaled, y, df
+            except Exception as e:
+                print(f"Ignoring unreadable data cache {cache_path}: {e}")
+        
         # Load the data
         df = pd.read_csv(file_path)
         
@@ -22,26 +86,16 @@ class ThreatDataPreprocessor:
         # Handle missing values
         df = df.dropna()
         
-        # Define categorical and numerical columns
-        categorical_columns = [
-            'Country', 'Attack Type', 'Target Industry', 'Attack Source',
-            'Security Vulnerability Type', 'Defense Mechanism Used'
-        ]
-        
-        numerical_columns = [
-            'Year', 'Financial Loss (in Million $)', 'Number of Affected Users'
-        ]
-        
-        # Encode categorical variables
-        for col in categorical_columns:
+        # Encode categorical variables; the category dtype's codes are the encoder's codes
+        for col in CATEGORICAL_COLUMNS:
             if col in df.columns:
-                le = LabelEncoder()
-                df[col + '_encoded'] = le.fit_transform(df[col].astype(str))
-                self.label_encoders[col] = le
+                df[col] = df[col].astype(str).astype('category')
+                self.category_encoders[col] = CategoryEncoder.fit(df[col])
+                df[col + '_encoded'] = df[col].cat.codes.astype(np.int64)
         
         # Prepare feature columns
-        encoded_categorical = [col + '_encoded' for col in categorical_columns if col in df.columns]
-        self.feature_columns = numerical_columns + encoded_categorical
+        encoded_categorical = [col + '_encoded' for col in CATEGORICAL_COLUMNS if col in df.columns]
+        self.feature_columns = NUMERICAL_COLUMNS + encoded_categorical
         
         # Prepare features and target
         X = df[self.feature_columns]
@@ -49,53 +103,125 @@ class ThreatDataPreprocessor:
         
         # Scale numerical features
         X_scaled = X.copy()
-        X_scaled[numerical_columns] = self.scaler.fit_transform(X[numerical_columns])
+        X_scaled[NUMERICAL_COLUMNS] = self.scaler.fit_transform(X[NUMERICAL_COLUMNS])
+        
+        if cache_path:
+            try:
+                self._save_cache(cache_path, X_scaled, y, df)
+            except OSError as e:
+                print(f"Could not write data cache {cache_path}: {e}")
+        
+        return X_scaled, y, df
+    
+    def _cache_path(self, file_path, cache_dir):
+        """Cache directory for the current content of file_path"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        config = json.dumps([DATA_CACHE_FORMAT, CATEGORICAL_COLUMNS, NUMERICAL_COLUMNS, self.target_column])
+        digest.update(config.encode())
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(cache_dir, f"{name}-{digest.hexdigest()[:16]}")
+    
+    def _save_cache(self, cache_path, X_scaled, y, df):
+        """Write each column as an .npy file (categoricals as codes + categories) and swap it in"""
+        cache_dir = os.path.dirname(cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=cache_dir, prefix='.staging-')
+        try:
+            def save_column(prefix, position, series):
+                filename = f"{prefix}-{position}.npy"
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    np.save(os.path.join(staging, filename), series.cat.codes.to_numpy())
+                    return {'name': series.name, 'file': filename, 'categories': series.cat.categories.tolist()}
+                np.save(os.path.join(staging, filename), series.to_numpy())
+                return {'name': series.name, 'file': filename}
+            
+            np.save(os.path.join(staging, 'index.npy'), df.index.to_numpy())
+            meta = {
+                'format': DATA_CACHE_FORMAT,
+                'rows': len(df),
+                'features': [save_column('X', i, X_scaled[col]) for i, col in enumerate(X_scaled.columns)],
+                'target': save_column('y', 0, y),
+                'frame': [save_column('df', i, df[col]) for i, col in enumerate(df.columns)],
+            }
+            self.save_preprocessor(os.path.join(staging, CACHE_PREPROCESSOR_FILENAME))
+            with open(os.path.join(staging, CACHE_META_FILENAME), 'w') as f:
+                json.dump(meta, f, indent=2)
+            
+            # Entries for older versions of the same source are stale
+            name = os.path.basename(cache_path).rsplit('-', 1)[0]
+            for entry in os.listdir(cache_dir):
+                if entry.rsplit('-', 1)[0] == name and entry != os.path.basename(cache_path):
+                    shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+            if os.path.exists(cache_path):
+                shutil.rmtree(cache_path)
+            os.rename(staging, cache_path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    
+    def _load_cache(self, cache_path):
+        """Rebuild (X_scaled, y, df) from memory-mapped column files and the fitted encoders"""
+        with open(os.path.join(cache_path, CACHE_META_FILENAME)) as f:
+            meta = json.load(f)
+        index = pd.Index(np.load(os.path.join(cache_path, 'index.npy')))
+        
+        def load_column(column):
+            values = np.load(os.path.join(cache_path, column['file']), mmap_mode='r')
+            if 'categories' in column:
+                values = pd.Categorical.from_codes(values, categories=column['categories'])
+            return pd.Series(values, index=index, name=column['name'])
         
+        X_scaled = pd.DataFrame({column['name']: load_column(column) for column in meta['features']})
+        y = load_column(meta['target'])
+        df = pd.DataFrame({column['name']: load_column(column) for column in meta['frame']})
+        self.load_preprocessor(os.path.join(cache_path, CACHE_PREPROCESSOR_FILENAME))
         return X_scaled, y, df
     
-    def transform_new_data(self, data_dict):
-        """Transform new data for prediction"""
-        # Create a DataFrame from the input dictionary
-        df = pd.DataFrame([data_dict])
+    def transform_new_data(self, data):
+        """Transform new data for prediction (one record dict or a list of them)"""
+        # Create a DataFrame from the input record(s)
+        records = data if isinstance(data, list) else [data]
+        df = pd.DataFrame(records)
         
         # Encode categorical variables using fitted encoders
-        categorical_columns = [
-            'Country', 'Attack Type', 'Target Industry', 'Attack Source',
-            'Security Vulnerability Type', 'Defense Mechanism Used'
-        ]
-        
-        for col in categorical_columns:
-            if col in df.columns and col in self.label_encoders:
-                # Handle unseen categories by using the most frequent category
-                try:
-                    df[col + '_encoded'] = self.label_encoders[col].transform(df[col].astype(str))
-                except ValueError:
-                    # If category not seen during training, use mode (most frequent)
-                    df[col + '_encoded'] = 0  # Default to first category
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and col in self.category_encoders:
+                # Unseen categories map to the encoder's unknown code, per value
+                df[col + '_encoded'] = self.category_encoders[col].transform(df[col])
         
         # Prepare features
         X = df[self.feature_columns]
         
         # Scale numerical features
-        numerical_columns = ['Year', 'Financial Loss (in Million $)', 'Number of Affected Users']
         X_scaled = X.copy()
-        X_scaled[numerical_columns] = self.scaler.transform(X[numerical_columns])
+        X_scaled[NUMERICAL_COLUMNS] = self.scaler.transform(X[NUMERICAL_COLUMNS])
         
         return X_scaled
     
     def save_preprocessor(self, path):
         """Save the preprocessor components"""
         joblib.dump({
-            'label_encoders': self.label_encoders,
+            'category_encoders': {col: encoder.to_dict() for col, encoder in self.category_encoders.items()},
             'scaler': self.scaler,
             'feature_columns': self.feature_columns,
             'target_column': self.target_column
-        }, path)
+        }, path, compress=0)  # uncompressed so arrays can be memory-mapped
     
-    def load_preprocessor(self, path):
+    def load_preprocessor(self, path, mmap_mode=None):
         """Load the preprocessor components"""
-        components = joblib.load(path)
-        self.label_encoders = components['label_encoders']
+        components = joblib.load(path, mmap_mode=mmap_mode)
+        if 'category_encoders' in components:
+            self.category_encoders = {
+                col: CategoryEncoder.from_dict(state) for col, state in components['category_encoders'].items()
+            }
+        else:
+            # Artifacts saved before CategoryEncoder hold fitted LabelEncoders
+            self.category_encoders = {
+                col: CategoryEncoder(encoder.classes_) for col, encoder in components['label_encoders'].items()
+            }
         self.scaler = components['scaler']
         self.feature_columns = components['feature_columns']
         self.target_column = components['target_column']
\ No newline at end of file
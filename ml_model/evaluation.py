@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Evaluation stage for a trained threat model, separate from training
+
+Computes model comparisons, residual statistics and permutation importance
+(in parallel across features) and writes them as data files:
+
+    evaluation/
+        evaluation.json             summary: best model, comparison, residual stats, importance
+        model_comparison.parquet    one row per candidate model
+        feature_importance.parquet  permutation importance of the saved model
+        residuals.parquet           actual, predicted and residual per hold-out row
+
+Tables are written as Parquet when pyarrow or fastparquet is installed and as
+CSV otherwise. Plots are an optional, headless step that reads these files:
+
+    python evaluation.py --plots    # render evaluation/model_analysis.png
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+EVALUATION_DIR = os.environ.get('EVALUATION_DIR', 'evaluation')
+SUMMARY_FILENAME = 'evaluation.json'
+PLOT_FILENAME = 'model_analysis.png'
+# Shuffles per feature for permutation importance
+PERMUTATION_REPEATS = int(os.environ.get('PERMUTATION_REPEATS', 10))
+
+def parquet_available():
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            continue
+    return False
+
+def write_table(df, output_dir, name):
+    """Write df as <name>.parquet, or <name>.csv without a Parquet engine; returns the file name"""
+    if parquet_available():
+        filename = f'{name}.parquet'
+        df.to_parquet(os.path.join(output_dir, filename), index=False)
+    else:
+        filename = f'{name}.csv'
+        df.to_csv(os.path.join(output_dir, filename), index=False)
+    return filename
+
+def read_table(output_dir, filename):
+    path = os.path.join(output_dir, filename)
+    return pd.read_parquet(path) if filename.endswith('.parquet') else pd.read_csv(path)
+
+def residual_stats(y_true, y_pred) -> Dict[str, float]:
+    """Error metrics and the distribution of actual - predicted"""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    residuals = y_true - y_pred
+    q05, q25, q50, q75, q95 = np.percentile(residuals, [5, 25, 50, 75, 95])
+    # Whether errors grow with the prediction (heteroscedasticity)
+    spread_corr = float(np.corrcoef(np.abs(residuals), y_pred)[0, 1]) if np.std(y_pred) > 0 else 0.0
+    return {
+        'r2': float(r2_score(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'bias': float(residuals.mean()),
+        'residual_std': float(residuals.std()),
+        'residual_p05': float(q05),
+        'residual_p25': float(q25),
+        'residual_median': float(q50),
+        'residual_p75': float(q75),
+        'residual_p95': float(q95),
+        'abs_residual_prediction_corr': spread_corr,
+    }
+
+def compare_models(results, y_test):
+    """One row per candidate: training-time scores plus residual statistics on the hold-out split"""
+    rows = []
+    for name in results:
+        model_stats = residual_stats(y_test, results[name]['y_pred_test'])
+        rows.append({
+            'model': name,
+            'train_r2': float(results[name]['train_r2']),
+            'train_rmse': float(results[name]['train_rmse']),
+            'cv_mean': float(results[name]['cv_mean']),
+            'cv_std': float(results[name]['cv_std']),
+            **{f'test_{key}': value for key, value in model_stats.items()},
+        })
+    return pd.DataFrame(rows).sort_values('test_r2', ascending=False, ignore_index=True)
+
+def feature_importance(model, X_test, y_test, n_repeats=PERMUTATION_REPEATS, n_jobs=-1):
+    """Permutation importance (R² drop), parallel across features, plus the model's own importances if any"""
+    result = permutation_importance(
+        model, X_test, y_test, scoring='r2', n_repeats=n_repeats, random_state=42, n_jobs=n_jobs
+    )
+    importance = pd.DataFrame({
+        'feature': list(X_test.columns),
+        'permutation_importance': result.importances_mean,
+        'permutation_importance_std': result.importances_std,
+    })
+    if hasattr(model, 'feature_importances_'):
+        importance['model_importance'] = model.feature_importances_
+    return importance.sort_values('permutation_importance', ascending=False, ignore_index=True)
+
+def run_evaluation(model, model_name, X_test, y_test, results=None, output_dir=EVALUATION_DIR, n_jobs=-1):
+    """Evaluate the saved model (and compare the training candidates); returns the summary"""
+    os.makedirs(output_dir, exist_ok=True)
+    y_pred = model.predict(X_test)
+    residuals = pd.DataFrame({
+        'actual': np.asarray(y_test, dtype=float),
+        'predicted': np.asarray(y_pred, dtype=float),
+    })
+    residuals['residual'] = residuals['actual'] - residuals['predicted']
+    importance = feature_importance(model, X_test, y_test, n_jobs=n_jobs)
+
+    summary = {
+        'model_name': model_name,
+        'test_rows': len(X_test),
+        'residual_stats': residual_stats(y_test, y_pred),
+        'feature_importance': importance.to_dict('records'),
+        'files': {
+            'feature_importance': write_table(importance, output_dir, 'feature_importance'),
+            'residuals': write_table(residuals, output_dir, 'residuals'),
+        },
+    }
+    if results:
+        comparison = compare_models(results, y_test)
+        summary['model_comparison'] = comparison.to_dict('records')
+        summary['files']['model_comparison'] = write_table(comparison, output_dir, 'model_comparison')
+
+    with open(os.path.join(output_dir, SUMMARY_FILENAME), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def render_plots(output_dir=EVALUATION_DIR) -> Optional[str]:
+    """Render the analysis figure from written evaluation files, without a display"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    with open(os.path.join(output_dir, SUMMARY_FILENAME)) as f:
+        summary = json.load(f)
+    residuals = read_table(output_dir, summary['files']['residuals'])
+    importance = pd.DataFrame(summary['feature_importance']).head(10)
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+
+    # Model comparison
+    if summary.get('model_comparison'):
+        comparison = pd.DataFrame(summary['model_comparison'])
+        axes[0, 0].bar(comparison['model'], comparison['test_r2'])
+        axes[0, 0].tick_params(axis='x', rotation=45)
+    axes[0, 0].set_title('Model Comparison - Test R² Scores')
+    axes[0, 0].set_ylabel('R² Score')
+
+    # Permutation importance
+    axes[0, 1].barh(importance['feature'], importance['permutation_importance'],
+                    xerr=importance['permutation_importance_std'])
+    axes[0, 1].invert_yaxis()
+    axes[0, 1].set_title('Top 10 Permutation Importance')
+    axes[0, 1].set_xlabel('R² drop when shuffled')
+
+    # Actual vs predicted
+    low, high = residuals['actual'].min(), residuals['actual'].max()
+    axes[1, 0].scatter(residuals['actual'], residuals['predicted'], alpha=0.6)
+    axes[1, 0].plot([low, high], [low, high], 'r--', lw=2)
+    axes[1, 0].set_xlabel('Actual Resolution Time (hours)')
+    axes[1, 0].set_ylabel('Predicted Resolution Time (hours)')
+    axes[1, 0].set_title(f"{summary['model_name']} - Actual vs Predicted")
+
+    # Residuals
+    axes[1, 1].scatter(residuals['predicted'], residuals['residual'], alpha=0.6)
+    axes[1, 1].axhline(y=0, color='r', linestyle='--')
+    axes[1, 1].set_xlabel('Predicted Resolution Time (hours)')
+    axes[1, 1].set_ylabel('Residuals')
+    axes[1, 1].set_title('Residual Plot')
+
+    fig.tight_layout()
+    path = os.path.join(output_dir, PLOT_FILENAME)
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Render plots from a written evaluation")
+    parser.add_argument("--output-dir", default=EVALUATION_DIR)
+    parser.add_argument("--plots", action="store_true", help="Render model_analysis.png (headless)")
+    args = parser.parse_args()
+    if args.plots:
+        print(f"Plots saved to {render_plots(args.output_dir)}")
+    else:
+        with open(os.path.join(args.output_dir, SUMMARY_FILENAME)) as f:
+            print(json.dumps(json.load(f)['residual_stats'], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,113 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import asyncio
 import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from api_models import ThreatPredictionRequest, ThreatPredictionResponse, HealthResponse
-from prediction_service import ThreatPredictionService
+from api_models import (
+    ThreatPredictionRequest, ThreatPredictionResponse, HealthResponse,
+    BatchPredictionRequest, BatchPredictionResponse, ModelReloadRequest, TrainingDataRequest,
+    request_to_record
+)
+from training_data import TARGET_COLUMN, TrainingDataStore
+import metrics
+
+# The prediction service (numpy, pandas, scikit-learn, the model itself) and the
+# retraining code are imported lazily, so the server starts answering /health at once
+IMPORTED_AT = time.perf_counter()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global prediction service instance
+# Global prediction service instance, set once the background load finishes
 prediction_service = None
+startup_error = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    global prediction_service
+# Seconds between checks of the registry's CURRENT pointer (0 disables hot reload)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 10))
+# Optional shared secret for the model management endpoints
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN")
+
+# Retraining runs in a separate process so it never competes with requests for the GIL
+retrain_executor = None
+retrain_future = None
+last_retrain = {"status": "idle"}
+
+async def watch_model_registry():
+    """Hot-reload whenever the registry's active version changes (e.g. from another worker)"""
+    failed_version = None
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        current = prediction_service.registry.current_version()
+        if current is None or current in (prediction_service.model_version, failed_version):
+            continue
+        if current in prediction_service.rejected_versions:
+            continue
+        try:
+            logger.info(f"Registry points at model version {current}, reloading")
+            # Load in a worker thread; requests keep using the old model until the swap
+            await run_in_threadpool(prediction_service.reload, current)
+        except Exception as e:
+            failed_version = current
+            logger.error(f"Model hot reload failed, keeping version {prediction_service.model_version}: {e}")
+
+def create_prediction_service():
+    from prediction_service import ThreatPredictionService
+    return ThreatPredictionService()
+
+async def start_prediction_service():
+    """Import the serving stack and load the model in a worker thread, then start the registry watcher"""
+    global prediction_service, startup_error
     try:
-        prediction_service = ThreatPredictionService()
-        logger.info("Prediction service initialized successfully")
+        service = await run_in_threadpool(create_prediction_service)
     except Exception as e:
-        logger.error(f"Failed to initialize prediction service: {e}")
-        prediction_service = ThreatPredictionService.__new__(ThreatPredictionService)
-        prediction_service.is_loaded = False
+        startup_error = str(e)
+        logger.error(f"Prediction service failed to start: {e}")
+        return
+    
+    prediction_service = service
+    metrics.STARTUP_SECONDS.set(time.perf_counter() - IMPORTED_AT)
+    if prediction_service.is_loaded:
+        logger.info(f"Prediction service initialized in {time.perf_counter() - IMPORTED_AT:.2f}s")
+    else:
+        logger.error("Prediction service started without a model")
+    
+    if MODEL_WATCH_INTERVAL > 0:
+        await watch_model_registry()
+
+def get_prediction_service():
+    """The prediction service, or 503 while it is still warming up"""
+    if prediction_service is None:
+        raise HTTPException(status_code=503, detail="Prediction service is warming up")
+    return prediction_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: accept requests immediately, /health reports "warming" until the model is ready
+    startup = asyncio.create_task(start_prediction_service())
     
     yield
     
     # Shutdown
+    startup.cancel()
+    if retrain_executor is not None:
+        retrain_executor.shutdown(wait=False, cancel_futures=True)
     logger.info("Application shutting down")
 
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Guard model management endpoints when MODEL_ADMIN_TOKEN is set"""
+    if MODEL_ADMIN_TOKEN and x_admin_token != MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 # Create FastAPI app
 app = FastAPI(
     title="Cybersecurity Threat Intelligence API",
@@ -51,6 +127,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and measure their latency per route"""
+    metrics.IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.IN_FLIGHT.dec()
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.REQUESTS.inc(method=request.method, endpoint=endpoint, status=status_code)
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information"""
@@ -60,7 +153,12 @@ async def root():
         "description": "AI-powered prediction of cybersecurity incident resolution times",
         "endpoints": {
             "predict": "/predict",
+            "predict_batch": "/predict/batch",
             "health": "/health",
+            "metrics": "/metrics",
+            "model_versions": "/model/versions",
+            "training_data": "/training-data",
+            "retrain": "/retrain",
             "docs": "/docs"
         }
     }
@@ -71,9 +169,15 @@ async def health_check():
     global prediction_service
     
     if prediction_service is None:
+        if startup_error is None:
+            return HealthResponse(
+                status="warming",
+                message="Loading the model",
+                model_loaded=False
+            )
         return HealthResponse(
             status="unhealthy",
-            message="Prediction service not initialized",
+            message=f"Prediction service failed to start: {startup_error}",
             model_loaded=False
         )
     
@@ -91,9 +195,8 @@ async def predict_resolution_time(request: ThreatPredictionRequest):
     This endpoint uses machine learning to predict how long it will take to resolve
     a cybersecurity incident based on various threat parameters.
     """
-    global prediction_service
-    
-    if prediction_service is None or not prediction_service.is_loaded:
+    service = get_prediction_service()
+    if not service.is_loaded:
         raise HTTPException(
             status_code=503,
             detail="Prediction service unavailable. Model not loaded."
@@ -103,7 +206,7 @@ async def predict_resolution_time(request: ThreatPredictionRequest):
         logger.info(f"Received prediction request for {request.attack_type.value} attack")
         
         # Make prediction
-        result = prediction_service.predict(request)
+        result = service.predict(request)
         
         logger.info(f"Prediction successful: {result.predicted_resolution_time} hours")
         return result
@@ -115,30 +218,139 @@ async def predict_resolution_time(request: ThreatPredictionRequest):
         logger.error(f"Unexpected error during prediction: {e}")
         raise HTTPException(status_code=500, detail="Internal server error during prediction")
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_resolution_time_batch(request: BatchPredictionRequest):
+    """
+    Predict resolution times for many threats in one call.
+    
+    All items share one preprocessing pass and one model invocation.
+    """
+    service = get_prediction_service()
+    if not service.is_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Prediction service unavailable. Model not loaded."
+        )
+    
+    try:
+        logger.info(f"Received batch prediction request with {len(request.items)} items")
+        predictions = service.predict_batch(request.items)
+        return BatchPredictionResponse(predictions=predictions)
+        
+    except ValueError as e:
+        logger.error(f"Batch prediction error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error during batch prediction: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error during prediction")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics for request rates, latency per stage, cache and model"""
+    metrics.update_process_memory()
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/model-info", response_model=dict)
 async def get_model_info():
     """Get information about the loaded ML model"""
-    global prediction_service
-    
-    if prediction_service is None:
-        raise HTTPException(status_code=503, detail="Prediction service not initialized")
+    return get_prediction_service().get_model_info()
+
+@app.get("/model/versions", response_model=dict)
+async def list_model_versions():
+    """Published model versions and which one this worker is serving"""
+    service = get_prediction_service()
+    return {
+        "active": service.model_version,
+        "previous": service.get_model_info()["previous_version"],
+        "registry_current": service.registry.current_version(),
+        "versions": service.registry.list_versions(),
+    }
+
+@app.post("/model/reload", response_model=dict, dependencies=[Depends(require_admin_token)])
+async def reload_model(request: Optional[ModelReloadRequest] = None):
+    """
+    Load a model version in the background and swap it in without dropping requests.
     
-    return prediction_service.get_model_info()
+    Without a version, reloads whatever the registry's CURRENT pointer names.
+    A given version is also made current so every worker picks it up.
+    """
+    version = request.version if request else None
+    service = get_prediction_service()
+    try:
+        return await run_in_threadpool(service.reload, version, version is not None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Model reload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+@app.post("/model/rollback", response_model=dict, dependencies=[Depends(require_admin_token)])
+async def rollback_model():
+    """Swap back to the previously served model version"""
+    service = get_prediction_service()
+    try:
+        return await run_in_threadpool(service.rollback)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-@app.post("/retrain", response_model=dict)
-async def trigger_retrain(background_tasks: BackgroundTasks):
+@app.get("/training-data", response_model=dict)
+async def training_data_status():
+    """Watermark per source, so exporters only send rows resolved after it"""
+    return TrainingDataStore().state()
+
+@app.post("/training-data", response_model=dict, dependencies=[Depends(require_admin_token)])
+async def append_training_data(request: TrainingDataRequest):
+    """Append labeled rows from resolved alerts/incidents to the training data store"""
+    rows = [
+        {
+            **request_to_record(row),
+            TARGET_COLUMN: row.resolution_time_hours,
+            "Source": row.source,
+            "Record ID": row.record_id,
+            "Resolved At": row.resolved_at.isoformat(),
+        }
+        for row in request.rows
+    ]
+    store = TrainingDataStore()
+    appended = await run_in_threadpool(store.append, rows)
+    logger.info(f"Appended {appended} of {len(rows)} training rows")
+    return {"appended": appended, **store.state()}
+
+def _retrain_finished(future):
+    global last_retrain
+    try:
+        last_retrain = {**future.result(), "finished_at": time.time()}
+    except Exception as e:
+        last_retrain = {"status": "failed", "error": str(e), "finished_at": time.time()}
+    metrics.MODEL_RETRAINS.inc(status=last_retrain["status"])
+    logger.info(f"Retraining finished: {last_retrain}")
+
+@app.post("/retrain", response_model=dict, dependencies=[Depends(require_admin_token)])
+async def trigger_retrain():
     """
-    Trigger model retraining (placeholder for production implementation)
-    In production, this would trigger a background job to retrain the model
+    Retrain on the rows appended since the active version was trained.
+    
+    Runs in a background process; a version that passes validation is published
+    and activated in the registry, which every worker then hot-reloads.
     """
-    def retrain_model():
-        logger.info("Model retraining triggered (placeholder)")
-        # In production, implement actual retraining logic here
-        pass
+    global retrain_executor, retrain_future
+    if retrain_future is not None and not retrain_future.done():
+        return {"message": "Model retraining already running", "status": "running"}
+    
+    import retraining
     
-    background_tasks.add_task(retrain_model)
+    if retrain_executor is None:
+        retrain_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    retrain_future = retrain_executor.submit(retraining.run_exclusive)
+    retrain_future.add_done_callback(_retrain_finished)
     return {"message": "Model retraining triggered", "status": "accepted"}
 
+@app.get("/retrain", response_model=dict)
+async def retrain_status():
+    """Outcome of the last retraining run started by this worker"""
+    running = retrain_future is not None and not retrain_future.done()
+    return {"running": running, "last_run": last_retrain}
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
@@ -0,0 +1,206 @@
+"""
+Minimal Prometheus metrics for the prediction API
+
+Counters, gauges and histograms live in one in-process registry and are
+rendered in the Prometheus text exposition format by the /metrics endpoint.
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        yield from self._samples()
+
+    def _samples(self):
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], list] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self):
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets, self._counts[key]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(self._sums[key])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "ml_api_requests_total", "HTTP requests handled", ["method", "endpoint", "status"]
+))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "ml_api_request_duration_seconds", "End-to-end HTTP request latency", ["endpoint"]
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "ml_api_requests_in_flight", "HTTP requests currently being handled"
+))
+IN_FLIGHT.set(0)
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "ml_prediction_stage_duration_seconds",
+    "Time spent per prediction stage (preprocessing, inference, recommendation)",
+    ["stage"]
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "ml_prediction_batch_size", "Number of items per prediction call", buckets=BATCH_SIZE_BUCKETS
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "ml_prediction_cache_requests_total", "Prediction cache lookups", ["result"]
+))
+PREDICTIONS = REGISTRY.register(Counter(
+    "ml_predictions_total", "Predictions served", ["attack_type", "risk_level"]
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    "ml_model_load_seconds", "Time taken by the last model load"
+))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "ml_startup_seconds", "Time from the app being imported until its first model was ready to serve"
+))
+MODEL_RELOADS = REGISTRY.register(Counter(
+    "ml_model_reloads_total", "Model reload attempts", ["result"]
+))
+MODEL_RETRAINS = REGISTRY.register(Counter(
+    "ml_model_retrains_total", "Retraining runs by outcome", ["status"]
+))
+MODEL_INFO = REGISTRY.register(Gauge(
+    "ml_model_info", "Currently loaded model (value is always 1)", ["model_name", "version"]
+))
+
+PROCESS_MEMORY = REGISTRY.register(Gauge(
+    "ml_process_memory_bytes",
+    "Memory of this worker; 'shared' includes memory-mapped model pages shared with other workers",
+    ["kind"]
+))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def update_process_memory():
+    """Refresh PROCESS_MEMORY from /proc (Linux only; a no-op elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            _, resident, shared = (int(value) for value in f.read().split()[:3])
+    except (OSError, ValueError):
+        return
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    PROCESS_MEMORY.set(resident * page_size, kind="resident")
+    PROCESS_MEMORY.set(shared * page_size, kind="shared")
+    PROCESS_MEMORY.set((resident - shared) * page_size, kind="private")
+
+def render() -> str:
+    """Current metrics in the Prometheus text exposition format"""
+    return REGISTRY.render()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Versioned model registry on the local filesystem
+
+    models/
+        CURRENT                     name of the active version
+        20240601-120000-1a2b3c4d/
+            model.joblib
+            model.compiled/         flattened tree arrays (tree ensembles only)
+            model.intervals.joblib  quantile models behind the intervals (boosted models only)
+            model.holdout.csv       rows held out for validation, trained on by the next retraining run
+            preprocessor.joblib
+            metadata.json
+
+Versions are immutable once published. Activating a version only rewrites
+CURRENT (atomically), which every API worker polls to hot-reload.
+
+    python model_registry.py publish --activate
+    python model_registry.py list
+    python model_registry.py activate 20240601-120000-1a2b3c4d
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+MODEL_FILENAME = "model.joblib"
+PREPROCESSOR_FILENAME = "preprocessor.joblib"
+METADATA_FILENAME = "metadata.json"
+CURRENT_POINTER = "CURRENT"
+
+def compiled_artifact_path(model_path: str) -> str:
+    """Directory holding the compiled tree arrays that belong to a model file"""
+    return os.path.splitext(model_path)[0] + ".compiled"
+
+def interval_models_path(model_path: str) -> str:
+    """File holding the (lower, upper) quantile models that belong to a model file"""
+    return os.path.splitext(model_path)[0] + ".intervals.joblib"
+
+def holdout_rows_path(model_path: str) -> str:
+    """CSV of the exported rows a retrained model was validated on but not trained on"""
+    return os.path.splitext(model_path)[0] + ".holdout.csv"
+
+def file_digest(path: str) -> str:
+    """sha256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelRegistry:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.environ.get("MODEL_REGISTRY_DIR", "models")
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def paths(self, version: str) -> Tuple[str, str]:
+        """(model_path, preprocessor_path) of a published version"""
+        version_dir = self._version_dir(version)
+        return (
+            os.path.join(version_dir, MODEL_FILENAME),
+            os.path.join(version_dir, PREPROCESSOR_FILENAME),
+        )
+
+    def exists(self, version: str) -> bool:
+        model_path, preprocessor_path = self.paths(version)
+        return os.path.exists(model_path) and os.path.exists(preprocessor_path)
+
+    def metadata(self, version: str) -> Dict:
+        path = os.path.join(self._version_dir(version), METADATA_FILENAME)
+        if not os.path.exists(path):
+            return {"version": version}
+        with open(path) as f:
+            return json.load(f)
+
+    def list_versions(self) -> List[Dict]:
+        """Metadata of every published version, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        versions = sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith(".") and self.exists(name)
+        )
+        return [self.metadata(version) for version in versions]
+
+    def current_version(self) -> Optional[str]:
+        """Version named by the CURRENT pointer, if any"""
+        try:
+            with open(os.path.join(self.root, CURRENT_POINTER)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and self.exists(version) else None
+
+    def activate(self, version: str):
+        """Point CURRENT at a published version; readers never see a partial write"""
+        if not self.exists(version):
+            raise ValueError(f"Unknown model version: {version}")
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".current-")
+        with os.fdopen(fd, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_POINTER))
+
+    def publish(self, model_path: str, preprocessor_path: str,
+                metadata: Optional[Dict] = None, activate: bool = False) -> str:
+        """Copy a trained model + preprocessor (and compiled trees, interval models and held-out rows, if any) into a new immutable version"""
+        model_digest = file_digest(model_path)
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{model_digest[:8]}"
+
+        # Stage in a hidden directory and rename, so a version is never half-written
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".staging-")
+        try:
+            shutil.copy2(model_path, os.path.join(staging, MODEL_FILENAME))
+            shutil.copy2(preprocessor_path, os.path.join(staging, PREPROCESSOR_FILENAME))
+            compiled_path = compiled_artifact_path(model_path)
+            if os.path.isdir(compiled_path):
+                shutil.copytree(compiled_path, compiled_artifact_path(os.path.join(staging, MODEL_FILENAME)))
+            intervals_path = interval_models_path(model_path)
+            if os.path.exists(intervals_path):
+                shutil.copy2(intervals_path, interval_models_path(os.path.join(staging, MODEL_FILENAME)))
+            holdout_path = holdout_rows_path(model_path)
+            if os.path.exists(holdout_path):
+                shutil.copy2(holdout_path, holdout_rows_path(os.path.join(staging, MODEL_FILENAME)))
+            info = {
+                "version": version,
+                "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "model_sha256": model_digest,
+                **(metadata or {}),
+            }
+            with open(os.path.join(staging, METADATA_FILENAME), "w") as f:
+                json.dump(info, f, indent=2)
+            os.rename(staging, self._version_dir(version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage published model versions")
+    parser.add_argument("--root", help="Registry directory (default: $MODEL_REGISTRY_DIR or ./models)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="Publish a trained model as a new version")
+    publish.add_argument("--model", default="best_threat_model.joblib")
+    publish.add_argument("--preprocessor", default="preprocessor.joblib")
+    publish.add_argument("--activate", action="store_true", help="Make it the active version")
+
+    subparsers.add_parser("list", help="List published versions")
+
+    activate = subparsers.add_parser("activate", help="Make a published version active")
+    activate.add_argument("version")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.command == "publish":
+        version = registry.publish(args.model, args.preprocessor, activate=args.activate)
+        print(f"Published model version {version}" + (" (active)" if args.activate else ""))
+    elif args.command == "list":
+        current = registry.current_version()
+        for info in registry.list_versions():
+            marker = "*" if info["version"] == current else " "
+            print(f"{marker} {info['version']}  {info.get('published_at', '')}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Activated model version {args.version}")
+
+if __name__ == "__main__":
+    main()
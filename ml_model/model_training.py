@@ -1,32 +1,118 @@
+import hashlib
+import json
+import tempfile
+import time
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, HalvingGridSearchCV, HalvingRandomSearchCV, KFold
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression, Ridge, Lasso
 from sklearn.svm import SVR
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-import xgboost as xgb
 import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
-from data_preprocessing import ThreatDataPreprocessor
+import os
+import shutil
+from data_preprocessing import DATA_CACHE_DIR, ThreatDataPreprocessor
+from compiled_trees import compile_with_interval, fit_quantile_models
+from model_registry import compiled_artifact_path, interval_models_path
+from evaluation import EVALUATION_DIR, render_plots, run_evaluation
+
+# Fitted fold results, reused across runs while data and hyperparameters are unchanged
+DEFAULT_CACHE_DIR = os.environ.get('TRAINING_CACHE_DIR', '.training_cache')
+
+def dataset_digest(X, y):
+    """Content hash of the feature matrix and target"""
+    digest = hashlib.sha256()
+    digest.update(','.join(map(str, X.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=True).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    return digest.hexdigest()
+
+def split_indices(n_samples, test_size=0.2, random_state=42, cv=5):
+    """Hold-out split and CV folds as positional indices, computed once and shared by every model"""
+    train_index, test_index = train_test_split(
+        np.arange(n_samples), test_size=test_size, random_state=random_state
+    )
+    # Same folds as cross_val_score(cv=5) on the training split, mapped back to rows of X
+    folds = [
+        (train_index[fold_train], train_index[fold_test])
+        for fold_train, fold_test in KFold(n_splits=cv).split(train_index)
+    ]
+    return train_index, test_index, folds
+
+class FoldCache:
+    """On-disk results of fitting one model configuration on one fold of one dataset"""
+    
+    def __init__(self, directory):
+        self.directory = directory
+    
+    def key(self, model, data_digest, fold):
+        import xgboost as xgb
+        
+        params = json.dumps(model.get_params(), sort_keys=True, default=repr)
+        parts = [
+            data_digest, fold, f"{type(model).__module__}.{type(model).__qualname__}", params,
+            sklearn.__version__, xgb.__version__
+        ]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+    
+    def get(self, key):
+        if not self.directory:
+            return None
+        path = os.path.join(self.directory, f"{key}.joblib")
+        try:
+            return joblib.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable fold cache entry {path}: {e}")
+            return None
+    
+    def put(self, key, value):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.fold-')
+        os.close(fd)
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, f"{key}.joblib"))
+
+def evaluate_fold(model, X, y, train_index, test_index, keep_model=False):
+    """Fit a fresh copy of model on one split; the hold-out split also keeps the model and predictions"""
+    model = clone(model)
+    X_train, y_train = X.iloc[train_index], y.iloc[train_index]
+    model.fit(X_train, y_train)
+    y_pred_test = model.predict(X.iloc[test_index])
+    result = {'score': r2_score(y.iloc[test_index], y_pred_test)}
+    if keep_model:
+        result.update(model=model, y_pred_train=model.predict(X_train), y_pred_test=y_pred_test)
+    return result
 
 class ThreatPredictionModel:
     def __init__(self):
         self.models = {}
         self.best_model = None
         self.best_model_name = None
+        self.split = None
+        self.search_report = None
         self.preprocessor = ThreatDataPreprocessor()
         
-    def train_multiple_models(self, X, y):
+    def train_multiple_models(self, X, y, n_jobs=-1, cache_dir=DEFAULT_CACHE_DIR):
         """Train multiple models and select the best one"""
         
-        # Split the data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        # Split once; every model and fold reuses the same indices
+        train_index, test_index, folds = split_indices(len(X))
+        self.split = (train_index, test_index, folds)
+        X_test = X.iloc[test_index]
+        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
         
         # Define models to try
+        import xgboost as xgb
+        
         models_to_try = {
             'XGBoost': xgb.XGBRegressor(
                 n_estimators=100,
@@ -50,20 +136,46 @@ class ThreatPredictionModel:
             'SVR': SVR(kernel='rbf', C=1.0, gamma='scale')
         }
         
-        results = {}
+        # One task per (model, split): the hold-out fit plus each CV fold
+        cache = FoldCache(cache_dir)
+        split_digest = hashlib.sha256(
+            b''.join(index.tobytes() for fold in folds for index in fold) + test_index.tobytes()
+        ).hexdigest()
+        data_digest = dataset_digest(X, y) + split_digest
+        splits = [('holdout', train_index, test_index)] + [
+            (f'cv{fold}', fold_train, fold_test) for fold, (fold_train, fold_test) in enumerate(folds)
+        ]
+        outcomes = {}
+        pending = []
+        for name, model in models_to_try.items():
+            for split_name, split_train, split_test in splits:
+                key = cache.key(model, data_digest, split_name)
+                cached = cache.get(key)
+                if cached is not None:
+                    outcomes[name, split_name] = cached
+                else:
+                    pending.append((name, split_name, key, model, split_train, split_test))
         
         print("Training and evaluating models...")
+        print(f"{len(pending)} fits to run, {len(outcomes)} reused from {cache_dir or 'no cache'}")
         print("-" * 50)
         
-        for name, model in models_to_try.items():
-            print(f"Training {name}...")
-            
-            # Train the model
-            model.fit(X_train, y_train)
-            
-            # Make predictions
-            y_pred_train = model.predict(X_train)
-            y_pred_test = model.predict(X_test)
+        start = time.perf_counter()
+        fitted = Parallel(n_jobs=n_jobs)(
+            delayed(evaluate_fold)(model, X, y, split_train, split_test, keep_model=split_name == 'holdout')
+            for _, split_name, _, model, split_train, split_test in pending
+        )
+        for (name, split_name, key, *_), outcome in zip(pending, fitted):
+            cache.put(key, outcome)
+            outcomes[name, split_name] = outcome
+        print(f"Model selection fits took {time.perf_counter() - start:.1f}s")
+        print()
+        
+        results = {}
+        for name in models_to_try:
+            holdout = outcomes[name, 'holdout']
+            y_pred_train = holdout['y_pred_train']
+            y_pred_test = holdout['y_pred_test']
             
             # Calculate metrics
             train_r2 = r2_score(y_train, y_pred_train)
@@ -73,12 +185,12 @@ class ThreatPredictionModel:
             test_mae = mean_absolute_error(y_test, y_pred_test)
             
             # Cross-validation score
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='r2')
+            cv_scores = np.array([outcomes[name, f'cv{fold}']['score'] for fold in range(len(folds))])
             cv_mean = cv_scores.mean()
             cv_std = cv_scores.std()
             
             results[name] = {
-                'model': model,
+                'model': holdout['model'],
                 'train_r2': train_r2,
                 'test_r2': test_r2,
                 'train_rmse': train_rmse,
@@ -89,6 +201,7 @@ class ThreatPredictionModel:
                 'y_pred_test': y_pred_test
             }
             
+            print(f"{name}")
             print(f"  Test R²: {test_r2:.4f}")
             print(f"  Test RMSE: {test_rmse:.4f}")
             print(f"  Test MAE: {test_mae:.4f}")
@@ -106,44 +219,64 @@ class ThreatPredictionModel:
         
         return X_test, y_test, results
     
-    def optimize_best_model(self, X, y):
-        """Optimize the best model with hyperparameter tuning"""
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+    def optimize_best_model(self, X, y, budget=None, n_jobs=-1):
+        """
+        Optimize the best model with successive halving over the number of trees.
+        
+        Every candidate starts with a few trees; each round keeps the best third
+        and triples their trees, so weak settings stop early. budget caps the
+        number of candidates sampled from the grid (None searches all of it).
+        """
+        if self.split is not None:
+            train_index, test_index, _ = self.split
+            X_train, X_test = X.iloc[train_index], X.iloc[test_index]
+            y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42
+            )
         
+        # n_estimators is the halving resource, so it is not part of the grid
         if self.best_model_name == 'XGBoost':
             param_grid = {
-                'n_estimators': [100, 200],
                 'max_depth': [4, 6, 8],
                 'learning_rate': [0.05, 0.1, 0.15],
                 'subsample': [0.8, 0.9, 1.0]
             }
+            max_trees = 200
+            import xgboost as xgb
             model = xgb.XGBRegressor(random_state=42)
             
         elif self.best_model_name == 'Random Forest':
             param_grid = {
-                'n_estimators': [100, 200, 300],
                 'max_depth': [8, 10, 12, None],
                 'min_samples_split': [2, 5, 10],
                 'min_samples_leaf': [1, 2, 4]
             }
+            max_trees = 300
             model = RandomForestRegressor(random_state=42)
             
         else:
             # For other models, use the current best model
             return self.best_model
         
-        print(f"Optimizing {self.best_model_name} with GridSearchCV...")
-        
-        # Perform grid search
-        grid_search = GridSearchCV(
-            model, param_grid, cv=5, scoring='r2', n_jobs=-1, verbose=1
+        grid_size = int(np.prod([len(values) for values in param_grid.values()]))
+        options = dict(
+            resource='n_estimators', max_resources=max_trees, factor=3,
+            cv=5, scoring='r2', n_jobs=n_jobs, random_state=42, verbose=1
         )
-        grid_search.fit(X_train, y_train)
+        if budget is not None and budget < grid_size:
+            search = HalvingRandomSearchCV(model, param_grid, n_candidates=budget, min_resources='exhaust', **options)
+        else:
+            search = HalvingGridSearchCV(model, param_grid, min_resources='exhaust', **options)
+        
+        print(f"Optimizing {self.best_model_name} with successive halving...")
+        start = time.perf_counter()
+        search.fit(X_train, y_train)
+        elapsed = time.perf_counter() - start
         
         # Update best model
-        self.best_model = grid_search.best_estimator_
+        self.best_model = search.best_estimator_
         
         # Evaluate optimized model
         y_pred_test = self.best_model.predict(X_test)
@@ -151,27 +284,81 @@ class ThreatPredictionModel:
         test_rmse = np.sqrt(mean_squared_error(y_test, y_pred_test))
         
         print(f"Optimized {self.best_model_name} - Test R²: {test_r2:.4f}, RMSE: {test_rmse:.4f}")
-        print(f"Best parameters: {grid_search.best_params_}")
+        print(f"Best parameters: {search.best_params_}")
+        
+        self.search_report = self._search_report(search, grid_size, max_trees, elapsed)
+        print(
+            f"Search: {self.search_report['fits']} fits in {elapsed:.1f}s; "
+            f"the full grid at {max_trees} trees would take ~{self.search_report['estimated_grid_seconds']:.1f}s "
+            f"(~{self.search_report['estimated_seconds_saved']:.1f}s saved)"
+        )
         
         return self.best_model
     
-    def get_feature_importance(self, feature_names):
-        """Get feature importance from the best model"""
-        if hasattr(self.best_model, 'feature_importances_'):
-            importance = self.best_model.feature_importances_
-            feature_importance = pd.DataFrame({
-                'feature': feature_names,
-                'importance': importance
-            }).sort_values('importance', ascending=False)
-            return feature_importance
-        return None
+    def _search_report(self, search, grid_size, max_trees, elapsed):
+        """Cost of the halving search against an exhaustive grid search at full size, in trees fitted"""
+        cv = search.n_splits_
+        trees_fitted = sum(
+            candidates * resources * cv
+            for candidates, resources in zip(search.n_candidates_, search.n_resources_)
+        )
+        grid_trees = grid_size * max_trees * cv
+        # Fitting time scales with the number of trees, so extrapolate from this run
+        estimated_grid_seconds = elapsed * grid_trees / trees_fitted
+        return {
+            'strategy': type(search).__name__,
+            'rounds': [
+                {'candidates': int(candidates), 'trees': int(resources)}
+                for candidates, resources in zip(search.n_candidates_, search.n_resources_)
+            ],
+            'fits': int(sum(search.n_candidates_)) * cv,
+            'trees_fitted': int(trees_fitted),
+            'grid_trees': int(grid_trees),
+            'seconds': elapsed,
+            'estimated_grid_seconds': estimated_grid_seconds,
+            'estimated_seconds_saved': estimated_grid_seconds - elapsed,
+            'best_params': {**search.best_params_, 'n_estimators': int(search.best_estimator_.n_estimators)},
+        }
     
-    def save_model(self, model_path, preprocessor_path):
-        """Save the trained model and preprocessor"""
-        joblib.dump(self.best_model, model_path)
+    def save_model(self, model_path, preprocessor_path, X=None, y=None):
+        """Save the trained model and preprocessor (X, y: training data for interval models)"""
+        # Uncompressed, so the API can memory-map the model's arrays (shared by all workers)
+        joblib.dump(self.best_model, model_path, compress=0)
         self.preprocessor.save_preprocessor(preprocessor_path)
         print(f"Model saved to {model_path}")
         print(f"Preprocessor saved to {preprocessor_path}")
+        self.export_compiled_model(model_path, X, y)
+    
+    def export_compiled_model(self, model_path, X=None, y=None):
+        """Flatten a tree-ensemble best model (and its interval models) into node arrays for the prediction service"""
+        compiled_path = compiled_artifact_path(model_path)
+        intervals_path = interval_models_path(model_path)
+        # Never leave arrays or interval models from an earlier model next to a new one
+        if os.path.isdir(compiled_path):
+            shutil.rmtree(compiled_path)
+        if os.path.exists(intervals_path):
+            os.remove(intervals_path)
+        
+        quantile_models = None
+        if X is not None:
+            if self.split is not None:
+                # Quantile models see the same rows as the point model
+                train_index = self.split[0]
+                X, y = X.iloc[train_index], y.iloc[train_index]
+            quantile_models = fit_quantile_models(self.best_model, X, y)
+        compiled = compile_with_interval(self.best_model, quantile_models)
+        if compiled is None:
+            print(f"{self.best_model_name} is not a tree ensemble; serving will use the model directly")
+            return None
+        
+        compiled.save(compiled_path)
+        if compiled.bounds:
+            # Kept so retraining can grow them alongside the model
+            joblib.dump(quantile_models, intervals_path, compress=0)
+        print(f"Compiled {compiled.n_trees} trees (max depth {compiled.max_depth}) to {compiled_path}")
+        if compiled.bounds:
+            print(f"Stacked {compiled.coverage:.0%} quantile models for prediction intervals")
+        return compiled_path
     
     def load_model(self, model_path, preprocessor_path):
         """Load the trained model and preprocessor"""
@@ -179,78 +366,44 @@ class ThreatPredictionModel:
         self.preprocessor.load_preprocessor(preprocessor_path)
         print("Model and preprocessor loaded successfully")
 
-def main():
+def main(n_jobs=-1, cache_dir=DEFAULT_CACHE_DIR, search_budget=None, data_cache_dir=DATA_CACHE_DIR,
+         evaluate=True, plots=False, evaluation_dir=EVALUATION_DIR):
     """Main training pipeline"""
     # Initialize the model
     threat_model = ThreatPredictionModel()
     
     # Load and preprocess data
     print("Loading and preprocessing data...")
-    X, y, df = threat_model.preprocessor.load_and_preprocess_data('Global_Cybersecurity_Threats_2015-2024.csv')
+    X, y, df = threat_model.preprocessor.load_and_preprocess_data(
+        'Global_Cybersecurity_Threats_2015-2024.csv', cache_dir=data_cache_dir
+    )
     
     print(f"Features: {threat_model.preprocessor.feature_columns}")
     print(f"Target: {threat_model.preprocessor.target_column}")
     print(f"Data shape: {X.shape}")
     
     # Train multiple models
-    X_test, y_test, results = threat_model.train_multiple_models(X, y)
+    X_test, y_test, results = threat_model.train_multiple_models(X, y, n_jobs=n_jobs, cache_dir=cache_dir)
     
     # Optimize the best model
-    optimized_model = threat_model.optimize_best_model(X, y)
-    
-    # Get feature importance
-    feature_importance = threat_model.get_feature_importance(threat_model.preprocessor.feature_columns)
-    if feature_importance is not None:
-        print("\nTop 10 Most Important Features:")
-        print(feature_importance.head(10))
+    optimized_model = threat_model.optimize_best_model(X, y, budget=search_budget, n_jobs=n_jobs)
     
     # Save the model
-    threat_model.save_model('best_threat_model.joblib', 'preprocessor.joblib')
-    
-    # Create a simple visualization
-    plt.figure(figsize=(12, 8))
+    threat_model.save_model('best_threat_model.joblib', 'preprocessor.joblib', X, y)
     
-    # Plot model comparison
-    plt.subplot(2, 2, 1)
-    model_names = list(results.keys())
-    test_r2_scores = [results[name]['test_r2'] for name in model_names]
-    plt.bar(model_names, test_r2_scores)
-    plt.title('Model Comparison - Test R² Scores')
-    plt.xticks(rotation=45)
-    plt.ylabel('R² Score')
-    
-    # Plot feature importance
-    if feature_importance is not None:
-        plt.subplot(2, 2, 2)
-        top_features = feature_importance.head(10)
-        plt.barh(top_features['feature'], top_features['importance'])
-        plt.title('Top 10 Feature Importance')
-        plt.xlabel('Importance')
-    
-    # Plot actual vs predicted for best model
-    plt.subplot(2, 2, 3)
-    best_results = results[threat_model.best_model_name]
-    plt.scatter(y_test, best_results['y_pred_test'], alpha=0.6)
-    plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', lw=2)
-    plt.xlabel('Actual Resolution Time (hours)')
-    plt.ylabel('Predicted Resolution Time (hours)')
-    plt.title(f'{threat_model.best_model_name} - Actual vs Predicted')
-    
-    # Plot residuals
-    plt.subplot(2, 2, 4)
-    residuals = y_test - best_results['y_pred_test']
-    plt.scatter(best_results['y_pred_test'], residuals, alpha=0.6)
-    plt.axhline(y=0, color='r', linestyle='--')
-    plt.xlabel('Predicted Resolution Time (hours)')
-    plt.ylabel('Residuals')
-    plt.title('Residual Plot')
-    
-    plt.tight_layout()
-    plt.savefig('model_analysis.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    # Evaluate separately from training; plots are optional and never need a display
+    if evaluate:
+        summary = run_evaluation(
+            threat_model.best_model, threat_model.best_model_name, X_test, y_test,
+            results=results, output_dir=evaluation_dir, n_jobs=n_jobs
+        )
+        print("\nTop 10 Most Important Features (permutation):")
+        print(pd.DataFrame(summary['feature_importance']).head(10).to_string(index=False))
+        print(f"Evaluation written to {evaluation_dir}/")
+        if plots:
+            print(f"Model analysis plot saved as '{render_plots(evaluation_dir)}'")
     
     print(f"\nTraining completed! Best model: {threat_model.best_model_name}")
-    print("Model analysis plot saved as 'model_analysis.png'")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Incremental retraining from the append-only training data store
+
+Reads only the chunks appended since the active model version was trained,
+grows the model on them and publishes a new registry version if it passes
+validation. Tree ensembles keep their trees and add new ones fitted on the
+new rows (XGBoost continues boosting from the current booster, forests and
+gradient boosting use warm_start), so the cost scales with the new data.
+The quantile models behind a boosted model's prediction intervals are grown
+the same way.
+Models without an incremental path are refit on the original CSV plus all
+exported rows. The most recently resolved share of the new rows is held out
+to validate the candidate; the published version keeps those rows and the
+next run trains on them together with its own new rows.
+
+    python retraining.py            # one run, e.g. from cron
+    POST /retrain                   # same run in a background process of the API
+"""
+
+import argparse
+import copy
+import fcntl
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from compiled_trees import compile_with_interval, fit_quantile_models
+from data_preprocessing import ThreatDataPreprocessor
+from model_registry import ModelRegistry, compiled_artifact_path, holdout_rows_path, interval_models_path
+from training_data import TARGET_COLUMN, TrainingDataStore
+
+BASE_DATA_FILE = os.environ.get("TRAINING_BASE_DATA", "Global_Cybersecurity_Threats_2015-2024.csv")
+# Fewer new rows than this is not worth a new version
+RETRAIN_MIN_ROWS = int(os.environ.get("RETRAIN_MIN_ROWS", 50))
+# Trees added per retraining run
+RETRAIN_EXTRA_TREES = int(os.environ.get("RETRAIN_EXTRA_TREES", 20))
+# Share of the new rows (most recently resolved) held out for validation
+RETRAIN_VALIDATION_SHARE = float(os.environ.get("RETRAIN_VALIDATION_SHARE", 0.2))
+# Allowed relative MAE increase on the reference data, guarding against forgetting
+RETRAIN_MAX_REGRESSION = float(os.environ.get("RETRAIN_MAX_REGRESSION", 0.05))
+
+LOCK_FILENAME = ".retrain.lock"
+
+def grow_model(model, X, y):
+    """Copy of model with trees added on (X, y); None if it has no incremental path"""
+    try:
+        import xgboost as xgb
+    except ImportError:
+        xgb = None
+
+    if xgb is not None and isinstance(model, xgb.XGBRegressor):
+        booster = model.get_booster()
+        params = {**model.get_params(), "n_estimators": RETRAIN_EXTRA_TREES, "early_stopping_rounds": None}
+        grown = xgb.XGBRegressor(**params)
+        grown.fit(X, y, xgb_model=booster)
+        # n_estimators counted only the added rounds; record the total so a model refit from these params is full size
+        grown.set_params(n_estimators=booster.num_boosted_rounds() + RETRAIN_EXTRA_TREES)
+        return grown
+
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor, GradientBoostingRegressor)):
+        # Memory-mapped arrays are read-only; warm_start fits only the added trees
+        grown = copy.deepcopy(model)
+        grown.set_params(warm_start=True, n_estimators=model.n_estimators + RETRAIN_EXTRA_TREES)
+        grown.fit(X, y)
+        return grown
+
+    return None
+
+def _errors(model, X, y) -> Dict[str, float]:
+    predictions = model.predict(X)
+    if not np.all(np.isfinite(predictions)):
+        return {"mae": float("inf"), "rmse": float("inf")}
+    return {
+        "mae": float(mean_absolute_error(y, predictions)),
+        "rmse": float(np.sqrt(mean_squared_error(y, predictions))),
+    }
+
+def _features(preprocessor: ThreatDataPreprocessor, rows: pd.DataFrame):
+    """Encode raw rows with the model's own fitted preprocessor"""
+    return preprocessor.transform_new_data(rows.to_dict("records")), rows[TARGET_COLUMN].astype(float)
+
+def retrain(registry: Optional[ModelRegistry] = None, store: Optional[TrainingDataStore] = None,
+            model_path: str = "best_threat_model.joblib", preprocessor_path: str = "preprocessor.joblib",
+            min_rows: int = RETRAIN_MIN_ROWS) -> Dict:
+    """One retraining run; returns a summary with status published, rejected or skipped"""
+    registry = registry or ModelRegistry()
+    store = store or TrainingDataStore()
+    started = time.perf_counter()
+
+    parent_version = registry.current_version()
+    trained_through = None
+    if parent_version is not None:
+        model_path, preprocessor_path = registry.paths(parent_version)
+        trained_through = registry.metadata(parent_version).get("trained_through_chunk")
+
+    new_chunks = store.chunks(after=trained_through)
+    new_rows = store.load(new_chunks)
+    summary = {"parent_version": parent_version, "new_chunks": len(new_chunks), "new_rows": len(new_rows)}
+    if len(new_rows) < min_rows:
+        return {**summary, "status": "skipped", "reason": f"fewer than {min_rows} new rows"}
+
+    # Rows the parent was validated on but never trained on
+    holdout_path = holdout_rows_path(model_path)
+    if os.path.exists(holdout_path):
+        new_rows = pd.concat([pd.read_csv(holdout_path), new_rows], ignore_index=True)
+    summary["carried_rows"] = len(new_rows) - summary["new_rows"]
+
+    # Validate on the most recently resolved rows; train on the rest
+    new_rows = new_rows.sort_values(["Resolved At", "Record ID"], ignore_index=True)
+    split = int(len(new_rows) * (1 - RETRAIN_VALIDATION_SHARE))
+    if not 0 < split < len(new_rows):
+        return {**summary, "status": "skipped", "reason": f"{len(new_rows)} rows cannot be split for validation"}
+    held_out = new_rows.iloc[split:]
+
+    model = joblib.load(model_path)
+    intervals_path = interval_models_path(model_path)
+    quantile_models = joblib.load(intervals_path) if os.path.exists(intervals_path) else None
+    preprocessor = ThreatDataPreprocessor()
+    preprocessor.load_preprocessor(preprocessor_path)
+    base_rows = pd.read_csv(BASE_DATA_FILE).dropna() if os.path.exists(BASE_DATA_FILE) else None
+
+    X_train, y_train = _features(preprocessor, new_rows.iloc[:split])
+    X_valid, y_valid = _features(preprocessor, held_out)
+
+    candidate = grow_model(model, X_train, y_train)
+    strategy = "added_trees"
+    if candidate is not None and quantile_models is not None:
+        quantile_models = tuple(grow_model(quantile_model, X_train, y_train) for quantile_model in quantile_models)
+    if candidate is None:
+        if base_rows is None:
+            return {**summary, "status": "skipped", "reason": f"{type(model).__name__} needs {BASE_DATA_FILE} to refit"}
+        # No incremental path: refit on the full history with the same hyperparameters
+        exported = store.load(store.chunks())
+        keys = ["Source", "Record ID"]
+        held_out_keys = pd.MultiIndex.from_frame(held_out[keys])
+        exported = exported[~pd.MultiIndex.from_frame(exported[keys]).isin(held_out_keys)]
+        history = pd.concat([base_rows, exported], ignore_index=True)
+        X_history, y_history = _features(preprocessor, history)
+        candidate = clone(model).fit(X_history, y_history)
+        quantile_models = fit_quantile_models(candidate, X_history, y_history)
+        strategy = "refit"
+
+    # The candidate must beat the current model on new data without forgetting the reference data
+    validation = {"current": _errors(model, X_valid, y_valid), "candidate": _errors(candidate, X_valid, y_valid)}
+    passed = validation["candidate"]["mae"] <= validation["current"]["mae"]
+    if base_rows is not None:
+        X_reference, y_reference = _features(preprocessor, base_rows)
+        validation["reference_current"] = _errors(model, X_reference, y_reference)
+        validation["reference_candidate"] = _errors(candidate, X_reference, y_reference)
+        passed = passed and (
+            validation["reference_candidate"]["mae"]
+            <= validation["reference_current"]["mae"] * (1 + RETRAIN_MAX_REGRESSION)
+        )
+
+    summary.update(strategy=strategy, validation=validation)
+    if not passed:
+        return {**summary, "status": "rejected", "seconds": time.perf_counter() - started}
+
+    with tempfile.TemporaryDirectory() as staging:
+        staged_model = os.path.join(staging, "model.joblib")
+        joblib.dump(candidate, staged_model, compress=0)
+        compiled = compile_with_interval(candidate, quantile_models)
+        if compiled is not None:
+            compiled.save(compiled_artifact_path(staged_model))
+            if compiled.bounds:
+                joblib.dump(quantile_models, interval_models_path(staged_model), compress=0)
+        held_out.to_csv(holdout_rows_path(staged_model), index=False)
+        version = registry.publish(
+            staged_model, preprocessor_path,
+            metadata={
+                "model_name": type(candidate).__name__,
+                "parent_version": parent_version,
+                "trained_through_chunk": new_chunks[-1],
+                "retrain_strategy": strategy,
+                "new_rows": summary["new_rows"],
+                "carried_rows": summary["carried_rows"],
+                "validation": validation,
+            },
+            activate=True,
+        )
+    return {**summary, "status": "published", "version": version, "seconds": time.perf_counter() - started}
+
+def run_exclusive(**kwargs) -> Dict:
+    """retrain() unless another process (e.g. another API worker) is already retraining"""
+    registry = kwargs.get("registry") or ModelRegistry()
+    os.makedirs(registry.root, exist_ok=True)
+    with open(os.path.join(registry.root, LOCK_FILENAME), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return {"status": "skipped", "reason": "another retraining run is in progress"}
+        try:
+            return retrain(**{**kwargs, "registry": registry})
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the model on newly exported resolved alerts and incidents")
+    parser.add_argument("--min-rows", type=int, default=RETRAIN_MIN_ROWS)
+    args = parser.parse_args()
+    print(json.dumps(run_exclusive(min_rows=args.min_rows), indent=2))
+
+if __name__ == "__main__":
+    main()
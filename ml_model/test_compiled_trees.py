@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Parity tests: compiled tree arrays must reproduce model.predict bit for bit
+
+    python -m unittest test_compiled_trees
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Lasso
+from sklearn.tree import DecisionTreeRegressor
+
+from compiled_trees import CompiledTreeEnsemble, compile_ensemble, compile_with_interval, fit_quantile_models
+
+DATA_FILE = "Global_Cybersecurity_Threats_2015-2024.csv"
+
+def synthetic_data(n_rows=600, n_features=9, seed=0):
+    """Mix of continuous and integer-coded columns, so many rows sit exactly on split thresholds"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features))
+    X[:, 3:] = rng.integers(0, 10, size=(n_rows, n_features - 3))
+    y = 3 * X[:, 0] - 2 * X[:, 1] ** 2 + X[:, 3] * X[:, 4] + rng.normal(scale=0.5, size=n_rows)
+    return X, y
+
+class CompiledTreeParityTests(unittest.TestCase):
+    def setUp(self):
+        self.X, self.y = synthetic_data()
+        self.X_eval, _ = synthetic_data(n_rows=2000, seed=1)
+
+    def assertParity(self, model, X=None):
+        X = self.X_eval if X is None else X
+        compiled = compile_ensemble(model)
+        self.assertIsNotNone(compiled)
+        expected = model.predict(X)
+        actual = compiled.predict(X)
+        self.assertEqual(actual.dtype, expected.dtype)
+        np.testing.assert_array_equal(actual, expected)
+        return compiled
+
+    def test_decision_tree(self):
+        self.assertParity(DecisionTreeRegressor(random_state=0).fit(self.X, self.y))
+
+    def test_random_forest(self):
+        self.assertParity(RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42).fit(self.X, self.y))
+
+    def test_extra_trees(self):
+        self.assertParity(ExtraTreesRegressor(n_estimators=30, random_state=0).fit(self.X, self.y))
+
+    def test_gradient_boosting(self):
+        model = GradientBoostingRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42)
+        self.assertParity(model.fit(self.X, self.y))
+
+    def test_gradient_boosting_zero_init_and_huber(self):
+        self.assertParity(GradientBoostingRegressor(init="zero", n_estimators=40, random_state=0).fit(self.X, self.y))
+        self.assertParity(GradientBoostingRegressor(loss="huber", n_estimators=40, random_state=0).fit(self.X, self.y))
+
+    def test_xgboost(self):
+        try:
+            import xgboost as xgb
+        except ImportError:
+            self.skipTest("xgboost is not installed")
+
+        model = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42)
+        self.assertParity(model.fit(self.X, self.y))
+
+        # Missing values follow each split's default direction
+        X_missing = self.X_eval.copy()
+        X_missing[::7, 0] = np.nan
+        X_missing[::11, 4] = np.nan
+        self.assertParity(model, X_missing)
+
+    def test_xgboost_early_stopping(self):
+        try:
+            import xgboost as xgb
+        except ImportError:
+            self.skipTest("xgboost is not installed")
+
+        model = xgb.XGBRegressor(n_estimators=300, learning_rate=0.3, early_stopping_rounds=5, random_state=0)
+        model.fit(self.X[:400], self.y[:400], eval_set=[(self.X[400:], self.y[400:])], verbose=False)
+        compiled = self.assertParity(model)
+        self.assertEqual(compiled.n_trees, model.best_iteration + 1)
+
+    def test_save_and_memory_mapped_load(self):
+        model = RandomForestRegressor(n_estimators=20, random_state=0).fit(self.X, self.y)
+        compiled = compile_ensemble(model)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.compiled")
+            compiled.save(path)
+            loaded = CompiledTreeEnsemble.load(path, mmap_mode="r")
+            self.assertIsInstance(loaded.value, np.memmap)
+            np.testing.assert_array_equal(loaded.predict(self.X_eval), model.predict(self.X_eval))
+
+    def test_forest_interval_is_per_tree_spread(self):
+        model = RandomForestRegressor(n_estimators=50, random_state=0).fit(self.X, self.y)
+        compiled = compile_with_interval(model)
+        point, lower, upper = compiled.predict_with_interval(self.X_eval)
+        np.testing.assert_array_equal(point, model.predict(self.X_eval))
+        per_tree = np.stack([tree.predict(self.X_eval.astype(np.float32)) for tree in model.estimators_])
+        expected_lower, expected_upper = np.quantile(per_tree, [0.025, 0.975], axis=0)
+        np.testing.assert_allclose(lower, np.minimum(expected_lower, point))
+        np.testing.assert_allclose(upper, np.maximum(expected_upper, point))
+
+    def test_boosting_interval_from_stacked_quantile_models(self):
+        model = GradientBoostingRegressor(n_estimators=40, random_state=0).fit(self.X, self.y)
+        lower_model, upper_model = fit_quantile_models(model, self.X, self.y)
+        compiled = compile_with_interval(model, (lower_model, upper_model))
+        self.assertEqual(compiled.n_trees, 40)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.compiled")
+            compiled.save(path)
+            loaded = CompiledTreeEnsemble.load(path, mmap_mode="r")
+            point, lower, upper = loaded.predict_with_interval(self.X_eval)
+            np.testing.assert_array_equal(loaded.predict(self.X_eval), model.predict(self.X_eval))
+
+        np.testing.assert_array_equal(point, model.predict(self.X_eval))
+        np.testing.assert_array_equal(lower, np.minimum(lower_model.predict(self.X_eval), point))
+        np.testing.assert_array_equal(upper, np.maximum(upper_model.predict(self.X_eval), point))
+
+    def test_retraining_grows_quantile_models(self):
+        from retraining import RETRAIN_EXTRA_TREES, grow_model
+
+        model = GradientBoostingRegressor(n_estimators=40, random_state=0).fit(self.X, self.y)
+        quantile_models = fit_quantile_models(model, self.X, self.y)
+        X_new, y_new = synthetic_data(n_rows=100, seed=2)
+        grown = grow_model(model, X_new, y_new)
+        grown_quantiles = tuple(grow_model(quantile_model, X_new, y_new) for quantile_model in quantile_models)
+        for quantile_model, grown_quantile in zip(quantile_models, grown_quantiles):
+            self.assertEqual(grown_quantile.loss, "quantile")
+            self.assertEqual(grown_quantile.alpha, quantile_model.alpha)
+            self.assertEqual(grown_quantile.n_estimators_, 40 + RETRAIN_EXTRA_TREES)
+            # The original trees are kept, not refit
+            np.testing.assert_array_equal(
+                grown_quantile.estimators_[0, 0].tree_.value, quantile_model.estimators_[0, 0].tree_.value
+            )
+
+        compiled = compile_with_interval(grown, grown_quantiles)
+        point, lower, upper = compiled.predict_with_interval(self.X_eval)
+        np.testing.assert_array_equal(point, grown.predict(self.X_eval))
+        np.testing.assert_array_equal(lower, np.minimum(grown_quantiles[0].predict(self.X_eval), point))
+
+    def test_non_tree_model_is_not_compiled(self):
+        self.assertIsNone(compile_ensemble(Lasso(alpha=1.0).fit(self.X, self.y)))
+
+    @unittest.skipUnless(os.path.exists(DATA_FILE), "training data not available")
+    def test_training_data(self):
+        """Models trained like model_training.py, evaluated on the real feature matrix"""
+        from data_preprocessing import ThreatDataPreprocessor
+
+        X, y, _ = ThreatDataPreprocessor().load_and_preprocess_data(DATA_FILE, cache_dir=None)
+        self.assertParity(RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42).fit(X, y), X)
+        self.assertParity(
+            GradientBoostingRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42).fit(X, y), X
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for categorical encoding shared by training and serving
+
+    python -m unittest test_data_preprocessing
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data_preprocessing import CategoryEncoder, ThreatDataPreprocessor
+
+class CategoryEncoderTests(unittest.TestCase):
+    def setUp(self):
+        self.encoder = CategoryEncoder.fit(["USA", "China", "USA", "India", "USA", "China"])
+
+    def test_codes_follow_sorted_categories(self):
+        self.assertEqual(self.encoder.categories.tolist(), ["China", "India", "USA"])
+        np.testing.assert_array_equal(self.encoder.transform(["India", "USA", "China"]), [1, 2, 0])
+
+    def test_unseen_values_only_affect_their_rows(self):
+        # The unknown code is the most frequent training category (USA)
+        self.assertEqual(self.encoder.unknown_code, 2)
+        codes = self.encoder.transform(pd.Series(["China", "Atlantis", "India", None]))
+        np.testing.assert_array_equal(codes, [0, 2, 1, 2])
+        self.assertEqual(self.encoder.encode("Atlantis"), 2)
+        self.assertEqual(self.encoder.encode("India"), 1)
+
+    def test_round_trips_through_the_preprocessor_artifact(self):
+        preprocessor = ThreatDataPreprocessor()
+        preprocessor.category_encoders = {"Country": self.encoder}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "preprocessor.joblib")
+            preprocessor.save_preprocessor(path)
+            loaded = ThreatDataPreprocessor()
+            loaded.load_preprocessor(path)
+
+        restored = loaded.category_encoders["Country"]
+        self.assertEqual(restored.to_dict(), self.encoder.to_dict())
+        np.testing.assert_array_equal(restored.transform(["USA", "Mars"]), [2, 2])
+
+if __name__ == "__main__":
+    unittest.main()
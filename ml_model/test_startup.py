@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Importing the API must stay cheap: the model and its libraries load in the background
+
+    python -m unittest test_startup
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class StartupImportTests(unittest.TestCase):
+    def test_app_import_skips_model_training_and_plotting_libraries(self):
+        probe = (
+            "import json, sys; import main; "
+            "print(json.dumps(sorted(m.split('.')[0] for m in sys.modules)))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", probe], check=True, capture_output=True, text=True, cwd=APP_DIR
+        ).stdout
+        modules = set(json.loads(output.strip().splitlines()[-1]))
+        for heavy in ("pandas", "sklearn", "xgboost", "matplotlib", "seaborn", "model_training", "retraining"):
+            self.assertNotIn(heavy, modules)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,11 +4,40 @@ Script to train the cybersecurity threat prediction model
 Run this script to train the model before starting the API
 """
 
+import argparse
 import sys
 import os
-from model_training import main as train_main
+from data_preprocessing import DATA_CACHE_DIR
+from evaluation import EVALUATION_DIR
+from model_training import DEFAULT_CACHE_DIR, main as train_main
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the cybersecurity threat prediction model")
+    parser.add_argument("--jobs", type=int, default=-1,
+                        help="Worker processes for model selection (-1: all cores, 1: sequential)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory of cached fold results (default: $TRAINING_CACHE_DIR or .training_cache)")
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None,
+                        help="Fit every model and fold from scratch")
+    parser.add_argument("--data-cache-dir", default=DATA_CACHE_DIR,
+                        help="Directory of prepared columnar data (default: $DATA_CACHE_DIR or .training_cache/data)")
+    parser.add_argument("--no-data-cache", dest="data_cache_dir", action="store_const", const=None,
+                        help="Parse the CSV and refit the encoders even if a prepared copy exists")
+    parser.add_argument("--search-budget", type=int, default=None,
+                        help="Hyperparameter candidates to sample for the successive-halving search (default: whole grid)")
+    parser.add_argument("--evaluation-dir", default=EVALUATION_DIR,
+                        help="Directory for evaluation results (default: $EVALUATION_DIR or evaluation)")
+    parser.add_argument("--no-evaluation", dest="evaluate", action="store_false",
+                        help="Skip permutation importance, residual statistics and model comparison")
+    parser.add_argument("--plots", action="store_true",
+                        help="Also render the analysis plots (headless, written to the evaluation directory)")
+    args = parser.parse_args()
+    if args.plots and not args.evaluate:
+        parser.error("--plots renders the evaluation results and cannot be combined with --no-evaluation")
+    return args
 
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting cybersecurity threat prediction model training...")
     print("=" * 60)
     
@@ -20,13 +49,21 @@ if __name__ == "__main__":
     
     try:
         # Run the training
-        train_main()
+        train_main(
+            n_jobs=args.jobs, cache_dir=args.cache_dir,
+            search_budget=args.search_budget, data_cache_dir=args.data_cache_dir,
+            evaluate=args.evaluate, plots=args.plots, evaluation_dir=args.evaluation_dir
+        )
         print("\n" + "=" * 60)
         print("Model training completed successfully!")
         print("Files created:")
         print("- best_threat_model.joblib (trained model)")
+        print("- best_threat_model.compiled/ (flattened trees, tree-ensemble models only)")
         print("- preprocessor.joblib (data preprocessor)")
-        print("- model_analysis.png (analysis plots)")
+        if args.evaluate:
+            print(f"- {args.evaluation_dir}/ (model comparison, residual statistics, permutation importance)")
+        if args.plots:
+            print(f"- {args.evaluation_dir}/model_analysis.png (analysis plots)")
         print("\nYou can now start the API server with: python main.py")
         
     except Exception as e:
@@ -0,0 +1,131 @@
+"""
+Append-only store of labeled rows exported from resolved alerts and incidents
+
+    training_data/
+        state.json                          watermark per source, row counts
+        chunk-20240601-120000-000001.csv    one immutable file per append
+
+Rows use the column names of the original training CSV plus Source,
+Record ID and Resolved At. Chunks are never rewritten, so a retraining run
+can record the last chunk it saw and later read only the newer ones.
+"""
+
+import csv
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STATE_FILENAME = "state.json"
+LOCK_FILENAME = ".lock"
+
+FEATURE_COLUMNS = [
+    "Country", "Year", "Attack Type", "Target Industry", "Financial Loss (in Million $)",
+    "Number of Affected Users", "Attack Source", "Security Vulnerability Type", "Defense Mechanism Used",
+]
+TARGET_COLUMN = "Incident Resolution Time (in Hours)"
+ROW_COLUMNS = FEATURE_COLUMNS + [TARGET_COLUMN, "Source", "Record ID", "Resolved At"]
+
+def row_position(resolved_at: str, record_id) -> Tuple[datetime, int]:
+    """Comparable (Resolved At in UTC, Record ID); ISO strings with different offsets do not sort correctly"""
+    moment = datetime.fromisoformat(resolved_at)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc), int(record_id)
+
+def chunk_sequence(name: str) -> int:
+    """Append order of a chunk, from the counter at the end of its name"""
+    return int(name.rsplit("-", 1)[1].split(".")[0])
+
+class TrainingDataStore:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.environ.get("TRAINING_DATA_DIR", "training_data")
+
+    @contextmanager
+    def _locked(self):
+        """Serialize appends across API workers"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILENAME), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def state(self) -> Dict:
+        try:
+            with open(os.path.join(self.root, STATE_FILENAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"watermarks": {}, "rows": 0, "chunks": 0}
+
+    def _write_atomic(self, filename: str, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "w", newline="") as f:
+            write(f)
+        os.replace(tmp_path, os.path.join(self.root, filename))
+
+    def append(self, rows: List[Dict]) -> int:
+        """
+        Write rows newer than each source's watermark as a new chunk.
+
+        The watermark is the (Resolved At, Record ID) of the last row stored
+        per source, so re-sending an overlapping batch appends nothing twice.
+        """
+        with self._locked():
+            state = self.state()
+            watermarks = state["watermarks"]
+            fresh = []
+            for row in sorted(rows, key=lambda r: row_position(r["Resolved At"], r["Record ID"])):
+                mark = watermarks.get(row["Source"])
+                position = row_position(row["Resolved At"], row["Record ID"])
+                if mark is not None and position <= row_position(*mark):
+                    continue
+                watermarks[row["Source"]] = [row["Resolved At"], row["Record ID"]]
+                fresh.append(row)
+
+            if not fresh:
+                return 0
+
+            state["chunks"] += 1
+            chunk_name = f"chunk-{time.strftime('%Y%m%d-%H%M%S')}-{state['chunks']:06d}.csv"
+
+            def write_chunk(f):
+                writer = csv.DictWriter(f, fieldnames=ROW_COLUMNS)
+                writer.writeheader()
+                writer.writerows(fresh)
+
+            self._write_atomic(chunk_name, write_chunk)
+            state["rows"] += len(fresh)
+            state["last_chunk"] = chunk_name
+            self._write_atomic(STATE_FILENAME, lambda f: json.dump(state, f, indent=2))
+            return len(fresh)
+
+    def chunks(self, after: Optional[str] = None) -> List[str]:
+        """Chunk file names in append order, optionally only those after a given chunk"""
+        if not os.path.isdir(self.root):
+            return []
+        names = sorted(
+            (name for name in os.listdir(self.root) if name.startswith("chunk-") and name.endswith(".csv")),
+            key=chunk_sequence
+        )
+        if after is not None:
+            names = [name for name in names if chunk_sequence(name) > chunk_sequence(after)]
+        return names
+
+    def load(self, chunk_names: List[str]) -> "pd.DataFrame":
+        """Concatenate the given chunks (an empty frame with the row columns if none)"""
+        # Only retraining reads chunks; the API's append path stays free of pandas
+        import pandas as pd
+
+        frames = [pd.read_csv(os.path.join(self.root, name)) for name in chunk_names]
+        if not frames:
+            return pd.DataFrame(columns=ROW_COLUMNS)
+        return pd.concat(frames, ignore_index=True)